@@ -29,6 +29,65 @@ class Settings(BaseSettings):
     
     # Open AI API Key
     OPENAI_API_KEY: str = os.getenv("OPENAI_API_KEY", "")
+    OPENAI_TIMEOUT_SECONDS: float = float(os.getenv("OPENAI_TIMEOUT_SECONDS", "60"))
+    OPENAI_MAX_CONNECTIONS: int = int(os.getenv("OPENAI_MAX_CONNECTIONS", "20"))
+    OPENAI_MAX_CONCURRENCY: int = int(os.getenv("OPENAI_MAX_CONCURRENCY", "8"))
+    
+    # Images sent to vision models are downscaled and re-encoded first
+    VISION_IMAGE_MAX_EDGE: int = int(os.getenv("VISION_IMAGE_MAX_EDGE", "1536"))
+    VISION_IMAGE_FORMAT: str = os.getenv("VISION_IMAGE_FORMAT", "JPEG")
+    VISION_IMAGE_QUALITY: int = int(os.getenv("VISION_IMAGE_QUALITY", "85"))
+    
+    # Image storage: "s3" (AWS S3 or an S3-compatible server such as MinIO) or "local"
+    STORAGE_BACKEND: str = os.getenv("STORAGE_BACKEND", "s3")
+    S3_ENDPOINT_URL: Optional[str] = os.getenv("S3_ENDPOINT_URL")
+    S3_PUBLIC_BASE_URL: Optional[str] = os.getenv("S3_PUBLIC_BASE_URL")
+    STORAGE_MAX_POOL_CONNECTIONS: int = int(os.getenv("STORAGE_MAX_POOL_CONNECTIONS", "20"))
+    STORAGE_MULTIPART_THRESHOLD: int = int(os.getenv("STORAGE_MULTIPART_THRESHOLD", str(8 * 1024 * 1024)))
+    STORAGE_CHUNK_SIZE: int = int(os.getenv("STORAGE_CHUNK_SIZE", str(8 * 1024 * 1024)))
+    LOCAL_STORAGE_DIR: str = os.getenv("LOCAL_STORAGE_DIR", os.path.join("app", "data", "media"))
+    LOCAL_STORAGE_BASE_URL: str = os.getenv("LOCAL_STORAGE_BASE_URL", "/media")
+    
+    # Number of images of one upload batch stored concurrently
+    IMAGE_UPLOAD_CONCURRENCY: int = int(os.getenv("IMAGE_UPLOAD_CONCURRENCY", "4"))
+    
+    # Uploads whose perceptual hash differs from an existing image of the same
+    # landlord in at most this many bits reuse that image (0 = exact matches only)
+    IMAGE_DUPLICATE_MAX_DISTANCE: int = int(os.getenv("IMAGE_DUPLICATE_MAX_DISTANCE", "4"))
+    # Distances up to 4 are looked up through indexed hash bands; larger ones
+    # compare against the landlord's most recent images, at most this many
+    IMAGE_DUPLICATE_SCAN_LIMIT: int = int(os.getenv("IMAGE_DUPLICATE_SCAN_LIMIT", "5000"))
+    
+    # Number of background workers analyzing uploaded property images
+    IMAGE_ANALYSIS_WORKERS: int = int(os.getenv("IMAGE_ANALYSIS_WORKERS", "4"))
+    # Seconds a claimed job stays with its worker without a heartbeat before another worker may retry it
+    IMAGE_ANALYSIS_LEASE_SECONDS: float = float(os.getenv("IMAGE_ANALYSIS_LEASE_SECONDS", "120"))
+    
+    # Vision analysis result cache (in-memory LRU + on-disk tier)
+    ANALYSIS_CACHE_DIR: str = os.getenv("ANALYSIS_CACHE_DIR", os.path.join("app", "data", "analysis_cache"))
+    ANALYSIS_CACHE_MEMORY_ENTRIES: int = int(os.getenv("ANALYSIS_CACHE_MEMORY_ENTRIES", "1024"))
+    ANALYSIS_CACHE_TTL_SECONDS: float = float(os.getenv("ANALYSIS_CACHE_TTL_SECONDS", str(30 * 24 * 3600)))
+    
+    # Rows per chunk streamed by the ML dataset extractors (one Parquet partition each)
+    ML_EXTRACT_CHUNK_SIZE: int = int(os.getenv("ML_EXTRACT_CHUNK_SIZE", "5000"))
+    # Seconds below an updated_at high-water mark re-read by each run, for transactions that commit late
+    ML_EXTRACT_OVERLAP_SECONDS: float = float(os.getenv("ML_EXTRACT_OVERLAP_SECONDS", "300"))
+    
+    # Memory-mapped property architectural feature vectors written by the ML pipeline
+    FEATURE_STORE_DIR: str = os.getenv("FEATURE_STORE_DIR", os.path.join("app", "data", "feature_store"))
+    
+    # Seconds between the (count, max id) checks of in-process search indexes for writes bypassing the ORM
+    DERIVED_INDEX_CHECK_SECONDS: float = float(os.getenv("DERIVED_INDEX_CHECK_SECONDS", "10"))
+    
+    # Nearest-neighbour search for similar listings: "brute" (BLAS matrix-vector product) or "ball_tree"
+    SIMILAR_PROPERTIES_ALGORITHM: str = os.getenv("SIMILAR_PROPERTIES_ALGORITHM", "brute")
+    
+    # Collaborative filtering factors trained from interactions, and their share of the recommendation score
+    COLLABORATIVE_MODEL_PATH: str = os.getenv("COLLABORATIVE_MODEL_PATH", os.path.join("app", "data", "collaborative_model.npz"))
+    COLLABORATIVE_BLEND_WEIGHT: float = float(os.getenv("COLLABORATIVE_BLEND_WEIGHT", "0.3"))
+    
+    # Real-time message fan-out: "memory" (single worker) or "postgres" (LISTEN/NOTIFY across workers)
+    MESSAGE_BROKER: str = os.getenv("MESSAGE_BROKER", "memory")
     
     class Config:
         env_file = ".env"
@@ -0,0 +1,38 @@
+"""add property search indexes
+
+Revision ID: 2c9e4b7f05a1
+Revises: e7b15c3a9d40
+Create Date: 2026-10-17 15:48:31.907215
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '2c9e4b7f05a1'
+down_revision: Union[str, None] = 'e7b15c3a9d40'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_index('ix_properties_active_price_id', 'properties', ['is_active', 'price', 'id'], unique=False)
+    op.create_index('ix_properties_active_created_at_id', 'properties', ['is_active', 'created_at', 'id'], unique=False)
+    op.create_index('ix_properties_active_distance_id', 'properties', ['is_active', 'distance_to_core', 'id'], unique=False)
+    op.create_index('ix_properties_city_price_id', 'properties', ['city', 'price', 'id'], unique=False)
+    op.create_index('ix_properties_type_price_id', 'properties', ['property_type', 'price', 'id'], unique=False)
+    op.create_index('ix_properties_bedrooms_bathrooms', 'properties', ['bedrooms', 'bathrooms'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_properties_bedrooms_bathrooms', table_name='properties')
+    op.drop_index('ix_properties_type_price_id', table_name='properties')
+    op.drop_index('ix_properties_city_price_id', table_name='properties')
+    op.drop_index('ix_properties_active_distance_id', table_name='properties')
+    op.drop_index('ix_properties_active_created_at_id', table_name='properties')
+    op.drop_index('ix_properties_active_price_id', table_name='properties')
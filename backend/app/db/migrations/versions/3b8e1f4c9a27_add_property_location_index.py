@@ -0,0 +1,28 @@
+"""add property location index
+
+Revision ID: 3b8e1f4c9a27
+Revises: f57b7c43516c
+Create Date: 2026-10-17 09:12:40.118502
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '3b8e1f4c9a27'
+down_revision: Union[str, None] = 'f57b7c43516c'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_index('ix_properties_lat_lng', 'properties', ['latitude', 'longitude'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_properties_lat_lng', table_name='properties')
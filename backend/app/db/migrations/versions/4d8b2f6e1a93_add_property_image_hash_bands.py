@@ -0,0 +1,44 @@
+"""add property image hash bands
+
+Revision ID: 4d8b2f6e1a93
+Revises: 7a1c5e9f2d34
+Create Date: 2026-10-17 18:41:09.512734
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '4d8b2f6e1a93'
+down_revision: Union[str, None] = '7a1c5e9f2d34'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Hex digits per band, see app.utils.image_utils.HASH_BAND_WIDTHS
+HASH_BAND_WIDTHS = (4, 3, 3, 3, 3)
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    for i in range(len(HASH_BAND_WIDTHS)):
+        op.add_column('property_images', sa.Column(f'hash_band_{i}', sa.String(length=4), nullable=True))
+        op.create_index(op.f(f'ix_property_images_hash_band_{i}'), 'property_images', [f'hash_band_{i}'], unique=False)
+
+    # Backfill the bands of already hashed images
+    start = 1
+    for i, width in enumerate(HASH_BAND_WIDTHS):
+        op.execute(
+            f"UPDATE property_images SET hash_band_{i} = substr(perceptual_hash, {start}, {width}) "
+            "WHERE perceptual_hash IS NOT NULL"
+        )
+        start += width
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    for i in reversed(range(len(HASH_BAND_WIDTHS))):
+        op.drop_index(op.f(f'ix_property_images_hash_band_{i}'), table_name='property_images')
+        op.drop_column('property_images', f'hash_band_{i}')
@@ -0,0 +1,43 @@
+"""add image analysis jobs
+
+Revision ID: 5e2a9c7d1f08
+Revises: c61f0d8b2e94
+Create Date: 2026-10-17 13:41:52.118304
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5e2a9c7d1f08'
+down_revision: Union[str, None] = 'c61f0d8b2e94'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('image_analysis_jobs',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('property_image_id', sa.Integer(), nullable=False),
+    sa.Column('status', sa.String(), nullable=False),
+    sa.Column('attempts', sa.Integer(), nullable=False),
+    sa.Column('error', sa.Text(), nullable=True),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.Column('updated_at', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['property_image_id'], ['property_images.id'], ),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('property_image_id')
+    )
+    op.create_index(op.f('ix_image_analysis_jobs_id'), 'image_analysis_jobs', ['id'], unique=False)
+    op.create_index(op.f('ix_image_analysis_jobs_status'), 'image_analysis_jobs', ['status'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(op.f('ix_image_analysis_jobs_status'), table_name='image_analysis_jobs')
+    op.drop_index(op.f('ix_image_analysis_jobs_id'), table_name='image_analysis_jobs')
+    op.drop_table('image_analysis_jobs')
@@ -0,0 +1,33 @@
+"""add image analysis job leases
+
+Revision ID: 7a1c5e9f2d34
+Revises: d92f1a6c4e83
+Create Date: 2026-10-18 09:12:41.208336
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '7a1c5e9f2d34'
+down_revision: Union[str, None] = 'd92f1a6c4e83'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Running jobs without a lease count as expired and are retried by the next sweep
+    op.add_column('image_analysis_jobs', sa.Column('lease_expires_at', sa.DateTime(), nullable=True))
+    op.create_index(
+        'ix_image_analysis_jobs_status_lease', 'image_analysis_jobs', ['status', 'lease_expires_at'], unique=False
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_image_analysis_jobs_status_lease', table_name='image_analysis_jobs')
+    op.drop_column('image_analysis_jobs', 'lease_expires_at')
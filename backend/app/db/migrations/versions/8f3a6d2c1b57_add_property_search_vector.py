@@ -0,0 +1,43 @@
+"""add property search vector
+
+Revision ID: 8f3a6d2c1b57
+Revises: 2c9e4b7f05a1
+Create Date: 2026-10-17 17:12:05.418306
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+from app.models import PROPERTY_SEARCH_VECTOR_TRIGGER
+
+
+# revision identifiers, used by Alembic.
+revision: str = '8f3a6d2c1b57'
+down_revision: Union[str, None] = '2c9e4b7f05a1'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    if op.get_bind().dialect.name != 'postgresql':
+        # Other databases use the in-process index of app.services.property_text_search
+        op.add_column('properties', sa.Column('search_vector', sa.Text(), nullable=True))
+        return
+    op.add_column('properties', sa.Column('search_vector', postgresql.TSVECTOR(), nullable=True))
+    op.create_index('ix_properties_search_vector', 'properties', ['search_vector'], unique=False, postgresql_using='gin')
+    op.execute(PROPERTY_SEARCH_VECTOR_TRIGGER)
+    # Fire the trigger once for existing rows
+    op.execute('UPDATE properties SET title = title')
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    if op.get_bind().dialect.name == 'postgresql':
+        op.execute('DROP TRIGGER IF EXISTS properties_search_vector_trigger ON properties')
+        op.execute('DROP FUNCTION IF EXISTS properties_search_vector_update()')
+        op.drop_index('ix_properties_search_vector', table_name='properties', postgresql_using='gin')
+    op.drop_column('properties', 'search_vector')
@@ -0,0 +1,31 @@
+"""add property distance_to_core
+
+Revision ID: 9d4c2a71e5b3
+Revises: 3b8e1f4c9a27
+Create Date: 2026-10-17 10:03:17.542961
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '9d4c2a71e5b3'
+down_revision: Union[str, None] = '3b8e1f4c9a27'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('properties', sa.Column('distance_to_core', sa.Float(), nullable=True))
+    op.create_index(op.f('ix_properties_distance_to_core'), 'properties', ['distance_to_core'], unique=False)
+    # Backfill existing rows with app.utils.geo_utils.update_cmu_distances
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(op.f('ix_properties_distance_to_core'), table_name='properties')
+    op.drop_column('properties', 'distance_to_core')
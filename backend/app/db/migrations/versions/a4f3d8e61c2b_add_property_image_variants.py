@@ -0,0 +1,28 @@
+"""add property image variants
+
+Revision ID: a4f3d8e61c2b
+Revises: 5e2a9c7d1f08
+Create Date: 2026-10-17 14:26:09.635127
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a4f3d8e61c2b'
+down_revision: Union[str, None] = '5e2a9c7d1f08'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('property_images', sa.Column('variants', sa.JSON(), nullable=True))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('property_images', 'variants')
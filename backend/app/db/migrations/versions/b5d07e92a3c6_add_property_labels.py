@@ -0,0 +1,55 @@
+"""add property labels
+
+Revision ID: b5d07e92a3c6
+Revises: 8f3a6d2c1b57
+Create Date: 2026-10-17 18:03:47.220914
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.orm import Session
+
+from app.services.property_labels import rebuild_property_labels
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b5d07e92a3c6'
+down_revision: Union[str, None] = '8f3a6d2c1b57'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('property_labels',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('property_id', sa.Integer(), nullable=False),
+    sa.Column('name', sa.String(), nullable=False),
+    sa.Column('value', sa.String(), nullable=True),
+    sa.Column('confidence', sa.Float(), nullable=True),
+    sa.Column('type', sa.String(), nullable=True),
+    sa.Column('source_image_id', sa.Integer(), nullable=True),
+    sa.ForeignKeyConstraint(['property_id'], ['properties.id'], ondelete='CASCADE'),
+    sa.ForeignKeyConstraint(['source_image_id'], ['property_images.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_property_labels_name_confidence', 'property_labels', ['name', 'confidence', 'property_id'], unique=False)
+    op.create_index('ix_property_labels_name_value', 'property_labels', ['name', 'value', 'property_id'], unique=False)
+    op.create_index('ix_property_labels_property_id', 'property_labels', ['property_id'], unique=False)
+    op.create_index('ix_property_labels_source_image_id', 'property_labels', ['source_image_id'], unique=False)
+    
+    # Fill the table from the existing JSON labels
+    session = Session(bind=op.get_bind())
+    rebuild_property_labels(session)
+    session.flush()
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_property_labels_source_image_id', table_name='property_labels')
+    op.drop_index('ix_property_labels_property_id', table_name='property_labels')
+    op.drop_index('ix_property_labels_name_value', table_name='property_labels')
+    op.drop_index('ix_property_labels_name_confidence', table_name='property_labels')
+    op.drop_table('property_labels')
@@ -0,0 +1,30 @@
+"""add message inbox indexes
+
+Revision ID: c61f0d8b2e94
+Revises: 9d4c2a71e5b3
+Create Date: 2026-10-17 11:26:05.873214
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c61f0d8b2e94'
+down_revision: Union[str, None] = '9d4c2a71e5b3'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_index('ix_messages_sender_receiver_timestamp', 'messages', ['sender_id', 'receiver_id', 'timestamp'], unique=False)
+    op.create_index('ix_messages_receiver_is_read', 'messages', ['receiver_id', 'is_read'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_messages_receiver_is_read', table_name='messages')
+    op.drop_index('ix_messages_sender_receiver_timestamp', table_name='messages')
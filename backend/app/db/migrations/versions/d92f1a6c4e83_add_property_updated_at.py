@@ -0,0 +1,31 @@
+"""add property updated_at
+
+Revision ID: d92f1a6c4e83
+Revises: b5d07e92a3c6
+Create Date: 2026-10-17 19:26:10.553817
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd92f1a6c4e83'
+down_revision: Union[str, None] = 'b5d07e92a3c6'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('properties', sa.Column('updated_at', sa.DateTime(), nullable=True))
+    op.execute('UPDATE properties SET updated_at = coalesce(created_at, CURRENT_TIMESTAMP)')
+    op.create_index('ix_properties_updated_at_id', 'properties', ['updated_at', 'id'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_properties_updated_at_id', table_name='properties')
+    op.drop_column('properties', 'updated_at')
@@ -0,0 +1,30 @@
+"""add property image perceptual hash
+
+Revision ID: e7b15c3a9d40
+Revises: a4f3d8e61c2b
+Create Date: 2026-10-17 15:02:44.281967
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e7b15c3a9d40'
+down_revision: Union[str, None] = 'a4f3d8e61c2b'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('property_images', sa.Column('perceptual_hash', sa.String(length=16), nullable=True))
+    op.create_index(op.f('ix_property_images_perceptual_hash'), 'property_images', ['perceptual_hash'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(op.f('ix_property_images_perceptual_hash'), table_name='property_images')
+    op.drop_column('property_images', 'perceptual_hash')
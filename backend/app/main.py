@@ -1,9 +1,15 @@
+import os
+
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.staticfiles import StaticFiles
 
 from app.config import settings
 from app.routes import auth, users, properties, profile, messages
 from app.database import engine, Base
+from app.services.message_broker import broker
+from app.services.openai_client import openai_client
+from app.services.analysis_jobs import analysis_workers
 
 from app.routes import image_analysis, chat_ai, recommendations,chat
 
@@ -88,6 +94,23 @@ app.include_router(
 #     tags=["Map"]
 # )
 
+# Serve uploaded images when they are stored on the local filesystem
+if settings.STORAGE_BACKEND == "local":
+    os.makedirs(settings.LOCAL_STORAGE_DIR, exist_ok=True)
+    app.mount(settings.LOCAL_STORAGE_BASE_URL, StaticFiles(directory=settings.LOCAL_STORAGE_DIR), name="media")
+
+@app.on_event("startup")
+async def start_analysis_workers():
+    """Start image analysis workers and resume unfinished jobs"""
+    await analysis_workers.start()
+
+@app.on_event("shutdown")
+async def shutdown_message_broker():
+    """Close the message broker, analysis workers and OpenAI connections"""
+    await broker.stop()
+    await analysis_workers.stop()
+    await openai_client.close()
+
 @app.get("/")
 def root():
     """
@@ -1,5 +1,6 @@
-from sqlalchemy import Boolean, Column, DateTime, ForeignKey, Integer, String, Text, Float, Table, JSON
-from sqlalchemy.orm import relationship
+from sqlalchemy import Boolean, Column, DateTime, ForeignKey, Integer, String, Text, Float, Table, JSON, Index, DDL, event
+from sqlalchemy.dialects.postgresql import TSVECTOR
+from sqlalchemy.orm import deferred, relationship
 from datetime import datetime
 
 from app.database import Base
@@ -130,6 +131,7 @@ class Property(Base):
     
     landlord_id = Column(Integer, ForeignKey("landlord_profiles.id"), nullable=True)
     created_at = Column(DateTime, default=datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     is_active = Column(Boolean, default=True)
     
     # Property details
@@ -147,6 +149,10 @@ class Property(Base):
     address = Column(String, nullable=True)
     city = Column(String, nullable=True)
     postal_code = Column(String, nullable=True)
+    distance_to_core = Column(Float, nullable=True, index=True)  # miles to the CMU anchor, see geo_utils
+    
+    # Full-text search document, maintained by a trigger on Postgres (see PROPERTY_SEARCH_VECTOR_TRIGGER)
+    search_vector = deferred(Column(TSVECTOR().with_variant(Text(), "sqlite"), nullable=True))
     
     # Relationships
     landlord = relationship("LandlordProfile", back_populates="listed_properties")
@@ -161,6 +167,64 @@ class Property(Base):
         back_populates="recommended_properties"
     )
     
+    __table_args__ = (
+        # Bounding-box prefilter for radius searches
+        Index("ix_properties_lat_lng", "latitude", "longitude"),
+        # Keyset pagination of property search, see app.services.property_search
+        Index("ix_properties_active_price_id", "is_active", "price", "id"),
+        Index("ix_properties_active_created_at_id", "is_active", "created_at", "id"),
+        Index("ix_properties_active_distance_id", "is_active", "distance_to_core", "id"),
+        Index("ix_properties_city_price_id", "city", "price", "id"),
+        Index("ix_properties_type_price_id", "property_type", "price", "id"),
+        Index("ix_properties_bedrooms_bathrooms", "bedrooms", "bathrooms"),
+        # Incremental ML extraction, see app.services.ml_data_pipeline
+        Index("ix_properties_updated_at_id", "updated_at", "id"),
+        # Full-text search, see app.services.property_search
+        Index("ix_properties_search_vector", "search_vector", postgresql_using="gin"),
+    )
+    
+    @property
+    def image_variants(self):
+        """Resized variant URLs of the primary image, see PropertyImage.variants"""
+        for image in self.images:
+            if image.is_primary:
+                return image.variants
+        return None
+    
+# Keeps properties.search_vector in sync on Postgres: title (A), address and
+# label names/values (B), description (C)
+PROPERTY_SEARCH_VECTOR_TRIGGER = """
+CREATE OR REPLACE FUNCTION properties_search_vector_update() RETURNS trigger AS $$
+DECLARE
+    label_text text := '';
+BEGIN
+    IF json_typeof(NEW.labels::json) = 'array' THEN
+        SELECT coalesce(string_agg(concat_ws(' ', label->>'name', label->>'value'), ' '), '')
+        INTO label_text
+        FROM json_array_elements(NEW.labels::json) AS label
+        WHERE json_typeof(label) = 'object';
+    END IF;
+    NEW.search_vector :=
+        setweight(to_tsvector('english', coalesce(NEW.title, '')), 'A') ||
+        setweight(to_tsvector('english', coalesce(NEW.address, '')), 'B') ||
+        setweight(to_tsvector('english', label_text), 'B') ||
+        setweight(to_tsvector('english', coalesce(NEW.description, '')), 'C');
+    RETURN NEW;
+END
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER properties_search_vector_trigger
+BEFORE INSERT OR UPDATE OF title, description, address, labels ON properties
+FOR EACH ROW EXECUTE FUNCTION properties_search_vector_update();
+"""
+
+event.listen(
+    Property.__table__,
+    "after_create",
+    DDL(PROPERTY_SEARCH_VECTOR_TRIGGER).execute_if(dialect="postgresql")
+)
+
+
 class PropertyImage(Base):
     """property image model"""
     __tablename__ = "property_images"
@@ -170,10 +234,82 @@ class PropertyImage(Base):
     image_url = Column(String, nullable=False)
     is_primary = Column(Boolean, default=False)  # whether it is the primary image
     labels = Column(JSON, nullable=True)  # image analysis labels
+    variants = Column(JSON, nullable=True)  # {"thumbnail": {"webp": url, "jpeg": url}, "card": ..., "full": ...}
+    perceptual_hash = Column(String(16), nullable=True, index=True)  # dHash, see image_utils.compute_dhash
+    # Bands of perceptual_hash for near-duplicate lookups, see image_utils.hash_bands
+    hash_band_0 = Column(String(4), nullable=True, index=True)
+    hash_band_1 = Column(String(4), nullable=True, index=True)
+    hash_band_2 = Column(String(4), nullable=True, index=True)
+    hash_band_3 = Column(String(4), nullable=True, index=True)
+    hash_band_4 = Column(String(4), nullable=True, index=True)
     created_at = Column(DateTime, default=datetime.utcnow)
     
     # relationship
     property = relationship("Property", back_populates="images")
+    analysis_job = relationship(
+        "ImageAnalysisJob",
+        back_populates="property_image",
+        uselist=False,
+        cascade="all, delete-orphan"
+    )
+
+class PropertyLabel(Base):
+    """
+    Normalized property feature label
+
+    One row per entry of Property.labels (source_image_id is NULL) or of a
+    PropertyImage.labels (source_image_id is the image). The JSON columns stay
+    the source of truth and are mirrored here on flush, see
+    app.services.property_labels.
+    """
+    __tablename__ = "property_labels"
+    
+    id = Column(Integer, primary_key=True)
+    property_id = Column(Integer, ForeignKey("properties.id", ondelete="CASCADE"), nullable=False)
+    name = Column(String, nullable=False)
+    value = Column(String, nullable=True)
+    confidence = Column(Float, nullable=True)
+    type = Column(String, nullable=True)  # primary_attribute, additional_feature
+    source_image_id = Column(Integer, ForeignKey("property_images.id", ondelete="CASCADE"), nullable=True)
+    
+    # relationship
+    property = relationship("Property")
+    source_image = relationship("PropertyImage")
+    
+    __table_args__ = (
+        # "Properties with feature X above confidence Y"
+        Index("ix_property_labels_name_confidence", "name", "confidence", "property_id"),
+        # Attribute values, e.g. architectural_style = craftsman
+        Index("ix_property_labels_name_value", "name", "value", "property_id"),
+        Index("ix_property_labels_property_id", "property_id"),
+        Index("ix_property_labels_source_image_id", "source_image_id"),
+    )
+
+
+class ImageAnalysisJob(Base):
+    """
+    Background analysis job of a property image, processed by the worker pool
+    in app.services.analysis_jobs
+    """
+    __tablename__ = "image_analysis_jobs"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    property_image_id = Column(Integer, ForeignKey("property_images.id"), nullable=False, unique=True)
+    status = Column(String, nullable=False, default="pending", index=True)  # 'pending', 'running', 'done', 'failed'
+    attempts = Column(Integer, nullable=False, default=0)
+    # A running job belongs to its worker until then; the worker renews it while it works
+    lease_expires_at = Column(DateTime, nullable=True)
+    error = Column(Text, nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    # relationship
+    property_image = relationship("PropertyImage", back_populates="analysis_job")
+    
+    __table_args__ = (
+        # Expired leases are found by the recovery sweep
+        Index("ix_image_analysis_jobs_status_lease", "status", "lease_expires_at"),
+    )
 
 class Interaction(Base):
     """
@@ -207,6 +343,13 @@ class Message(Base):
     # Relationships
     sender = relationship("User", foreign_keys=[sender_id], back_populates="sent_messages")
     receiver = relationship("User", foreign_keys=[receiver_id], back_populates="received_messages")
+    
+    __table_args__ = (
+        # Conversation history and latest-message lookups
+        Index("ix_messages_sender_receiver_timestamp", "sender_id", "receiver_id", "timestamp"),
+        # Unread counts per receiver
+        Index("ix_messages_receiver_is_read", "receiver_id", "is_read"),
+    )
 
 class Comment(Base):
     """
@@ -1,17 +1,21 @@
 # app/recommendations.py
 from typing import List, Tuple, Optional, Dict, Any
-from sqlalchemy.orm import Session
+from sqlalchemy.orm import Session, joinedload
 import numpy as np
-from sklearn.metrics.pairwise import cosine_similarity
 
+from app.config import settings
 from app.models import User, Property, UserPreference, TenantProfile, Interaction
 from app import schemas
+from app.services.collaborative_filtering import CollaborativeFilteringModel, collaborative_model_store
+from app.services.roommate_matching import roommate_index
 
 class RecommendationEngine:
     """Housing recommendation engine that implements collaborative filtering and content-based algorithms"""
     
-    def __init__(self, db: Session):
+    def __init__(self, db: Session, collaborative_model: Optional[CollaborativeFilteringModel] = None):
         self.db = db
+        # Defaults to the latest model written by the training job, if any
+        self.collaborative_model = collaborative_model
     
     def get_property_recommendations_for_user(self, user_id: int, limit: int = 10) -> List[Tuple[Property, float]]:
         """
@@ -47,20 +51,28 @@ class RecommendationEngine:
         for pref in user_prefs:
             pref_map[pref.preference_key] = pref.preference_value
             
-        # Get all active properties
-        all_properties = self.db.query(Property).filter(Property.is_active == True).all()
-        
-        # Calculate scores for each property
-        property_scores = []
-        for prop in all_properties:
-            score = self._calculate_property_score(prop, tenant_profile, pref_map)
-            property_scores.append((prop, score))
-            
-        # Sort by score
-        property_scores.sort(key=lambda x: x[1], reverse=True)
+        # Load the scoring columns of all active properties as arrays
+        candidates = self._load_property_candidates()
+        if candidates["id"].size == 0:
+            return []
+        
+        # Score every candidate in one batched pass
+        scores = self._score_property_candidates(candidates, tenant_profile, pref_map)
+        scores = self._blend_collaborative_scores(user_id, candidates["id"], scores)
         
-        # Return top recommendations
-        return property_scores[:limit]
+        # Select the top-k without sorting the whole catalog
+        top_idx = self._top_k_indices(scores, limit)
+        top_ids = candidates["id"][top_idx].tolist()
+        
+        # Only materialize the selected properties as ORM objects
+        properties = self.db.query(Property).filter(Property.id.in_(top_ids)).all()
+        property_map = {prop.id: prop for prop in properties}
+        
+        return [
+            (property_map[prop_id], float(scores[i]))
+            for prop_id, i in zip(top_ids, top_idx)
+            if prop_id in property_map
+        ]
     
     def get_roommate_recommendations_for_user(self, user_id: int, limit: int = 10) -> List[Tuple[User, float]]:
         """
@@ -86,23 +98,172 @@ class RecommendationEngine:
         if not tenant_profile:
             return []
         
-        # Get all potential roommates (tenant users that are not the current user)
-        potential_roommates = self.db.query(User).filter(
-            User.user_type == "tenant",
-            User.id != user_id
+        # Compatibility with every other tenant from the cached roommate matrix
+        candidate_ids, scores = roommate_index.get_compatibility_row(self.db, user_id)
+        if candidate_ids.size == 0:
+            return []
+        
+        # Select the top-k and only materialize those users
+        top_idx = self._top_k_indices(scores, limit)
+        top_ids = candidate_ids[top_idx].tolist()
+        
+        roommates = self.db.query(User).options(joinedload(User.tenant_profile)).filter(
+            User.id.in_(top_ids),
+            User.user_type == "tenant"
         ).all()
+        roommate_map = {roommate.id: roommate for roommate in roommates}
         
-        # Calculate match scores
-        roommate_scores = []
-        for roommate in potential_roommates:
-            score = self._calculate_roommate_compatibility(user_id, roommate.id)
-            roommate_scores.append((roommate, score))
+        return [
+            (roommate_map[roommate_id], float(scores[i]))
+            for roommate_id, i in zip(top_ids, top_idx)
+            if roommate_id in roommate_map
+        ]
+    
+    def _load_property_candidates(self) -> Dict[str, np.ndarray]:
+        """
+        Load the columns used for property scoring as NumPy arrays
         
-        # Sort by score
-        roommate_scores.sort(key=lambda x: x[1], reverse=True)
+        Returns:
+            Dictionary of column name -> array, one entry per active property.
+            Text columns are lower-cased with missing values as empty strings,
+            numeric columns use NaN for missing values.
+        """
+        rows = self.db.query(
+            Property.id,
+            Property.price,
+            Property.city,
+            Property.address,
+            Property.property_type,
+            Property.bedrooms,
+            Property.bathrooms
+        ).filter(Property.is_active == True).order_by(Property.id).all()
+        
+        if not rows:
+            empty_text = np.array([], dtype=str)
+            empty_num = np.array([], dtype=float)
+            return {
+                "id": np.array([], dtype=np.int64),
+                "price": empty_num,
+                "city": empty_text,
+                "address": empty_text,
+                "property_type": empty_text,
+                "bedrooms": empty_num,
+                "bathrooms": empty_num
+            }
+        
+        ids, prices, cities, addresses, types, bedrooms, bathrooms = zip(*rows)
+        
+        def _text(values):
+            return np.char.lower(np.array([v or "" for v in values], dtype=str))
+        
+        def _numeric(values):
+            return np.array([np.nan if v is None else v for v in values], dtype=float)
         
-        # Return top recommendations
-        return roommate_scores[:limit]
+        return {
+            "id": np.array(ids, dtype=np.int64),
+            "price": _numeric(prices),
+            "city": _text(cities),
+            "address": _text(addresses),
+            "property_type": _text(types),
+            "bedrooms": _numeric(bedrooms),
+            "bathrooms": _numeric(bathrooms)
+        }
+    
+    def _score_property_candidates(self, candidates: Dict[str, np.ndarray], tenant_profile: TenantProfile,
+                                   preferences: Dict[str, Any]) -> np.ndarray:
+        """
+        Vectorized equivalent of _calculate_property_score over all candidates
+        
+        Args:
+            candidates: Column arrays from _load_property_candidates
+            tenant_profile: Profile of the tenant being scored for
+            preferences: Preference key -> value map of the tenant
+            
+        Returns:
+            Array of scores aligned with the candidate arrays
+        """
+        price = candidates["price"]
+        scores = np.zeros(price.shape[0], dtype=float)
+        
+        # Budget match (full score within budget, scaled down by budget/price above it)
+        budget = tenant_profile.budget
+        if budget:
+            safe_price = np.where(price > 0, price, 1.0)
+            price_ratio = np.where(price > 0, budget / safe_price, 0.0)
+            scores += np.where(price <= budget, 0.3, 0.3 * np.clip(price_ratio, 0, 1))
+        
+        # Location match (city equality first, then substring of the address)
+        if tenant_profile.preferred_location:
+            location = tenant_profile.preferred_location.lower()
+            city = candidates["city"]
+            address = candidates["address"]
+            has_city = city != ""
+            city_match = has_city & (city == location)
+            address_match = has_city & ~city_match & (address != "") & (np.char.find(address, location) >= 0)
+            scores += np.where(city_match, 0.3, np.where(address_match, 0.2, 0.0))
+        
+        # Property type match
+        if preferences.get('property_type'):
+            scores += np.where(candidates["property_type"] == preferences['property_type'].lower(), 0.2, 0.0)
+        
+        # Bedroom match
+        bedrooms = self._parse_numeric_preference(preferences.get('bedrooms'), int)
+        if bedrooms is not None:
+            scores += np.where(candidates["bedrooms"] == bedrooms, 0.1, 0.0)
+        
+        # Bathroom match
+        bathrooms = self._parse_numeric_preference(preferences.get('bathrooms'), float)
+        if bathrooms is not None:
+            scores += np.where(candidates["bathrooms"] == bathrooms, 0.1, 0.0)
+        
+        return scores
+    
+    def _blend_collaborative_scores(self, user_id: int, property_ids: np.ndarray, scores: np.ndarray) -> np.ndarray:
+        """
+        Mix the content scores with the collaborative filtering predictions
+        
+        Users without interactions at training time (or without a trained
+        model) keep the pure content scores.
+        """
+        model = self.collaborative_model or collaborative_model_store.get()
+        if model is None:
+            return scores
+        predicted = model.score_properties(user_id, property_ids)
+        if predicted is None:
+            return scores
+        # ALS predicts preferences around 0..1, the scale of the content scores
+        weight = settings.COLLABORATIVE_BLEND_WEIGHT
+        return (1.0 - weight) * scores + weight * np.clip(predicted, 0.0, 1.0)
+    
+    @staticmethod
+    def _parse_numeric_preference(value: Any, cast) -> Optional[float]:
+        """Parse a numeric preference value, None if missing, zero or unparseable"""
+        if not value:
+            return None
+        try:
+            parsed = cast(value)
+        except (TypeError, ValueError):
+            return None
+        # A property with 0 (falsy) bedrooms/bathrooms never matched in the scalar scorer
+        return parsed if parsed else None
+    
+    @staticmethod
+    def _top_k_indices(scores: np.ndarray, limit: int) -> np.ndarray:
+        """
+        Indices of the top `limit` scores in descending order
+        
+        Uses np.argpartition so only the selected k entries are sorted.
+        Ties keep the candidate (property id) order.
+        """
+        k = min(limit, scores.shape[0])
+        if k <= 0:
+            return np.array([], dtype=np.int64)
+        if k < scores.shape[0]:
+            top_idx = np.argpartition(-scores, k - 1)[:k]
+        else:
+            top_idx = np.arange(scores.shape[0])
+        # lexsort sorts by the last key first: score descending, then index ascending
+        return top_idx[np.lexsort((top_idx, -scores[top_idx]))]
     
     def _calculate_property_score(self, property: Property, tenant_profile: TenantProfile, 
                                  preferences: Dict[str, Any]) -> float:
@@ -1,7 +1,9 @@
 # app/routes/architectural_style.py
 from fastapi import APIRouter, UploadFile, File, Depends, HTTPException, status, Body, Form
 from sqlalchemy.orm import Session
+from sqlalchemy.orm.attributes import flag_modified
 from typing import Dict, Any, Optional, List
+import httpx
 
 from app.database import get_db
 from app.models import User, Property
@@ -35,7 +37,7 @@ async def classify_architectural_style(
     image_data = await file.read()
     
     # Classify architectural style
-    result = style_classifier.classify_architectural_style(image_data)
+    result = await style_classifier.classify_architectural_style(image_data)
     
     if result["status"] == "error":
         raise HTTPException(
@@ -73,7 +75,7 @@ async def compare_architectural_styles(
     image_data2 = await file2.read()
     
     # Compare styles
-    result = style_classifier.compare_architectural_styles(image_data1, image_data2)
+    result = await style_classifier.compare_architectural_styles(image_data1, image_data2)
     
     if result["status"] == "error":
         raise HTTPException(
@@ -98,7 +100,7 @@ async def get_style_guidelines(
         db: Database session
     """
     # Generate style guidelines
-    result = style_classifier.generate_style_guidelines(style_name)
+    result = await style_classifier.generate_style_guidelines(style_name)
     
     if result["status"] == "error":
         raise HTTPException(
@@ -137,10 +139,10 @@ async def classify_property_style(
             detail="Property has no image to classify"
         )
     
-    # Download image (simplified - in a real system, you would use proper download logic)
-    import requests
+    # Download image without blocking the event loop
     try:
-        response = requests.get(property.image_url)
+        async with httpx.AsyncClient(timeout=30.0) as http_client:
+            response = await http_client.get(property.image_url)
         image_data = response.content
     except Exception as e:
         raise HTTPException(
@@ -149,7 +151,7 @@ async def classify_property_style(
         )
     
     # Classify architectural style
-    result = style_classifier.classify_architectural_style(image_data)
+    result = await style_classifier.classify_architectural_style(image_data)
     
     if result["status"] == "error":
         raise HTTPException(
@@ -185,16 +187,16 @@ async def classify_property_style(
                 "type": "primary_attribute"
             })
         
+        # labels is a plain JSON column, in-place edits must be flagged
+        flag_modified(property, "labels")
+        
         # Save to database
         db.commit()
         
-        # Return result with updated property info
-        result["property_updated"] = True
-        return result
+        # Return result with updated property info (result may be a cached entry)
+        return {**result, "property_updated": True}
         
     except Exception as e:
         db.rollback()
         # Still return classification result even if update failed
-        result["property_updated"] = False
-        result["update_error"] = str(e)
-        return result
\ No newline at end of file
+        return {**result, "property_updated": False, "update_error": str(e)}
\ No newline at end of file
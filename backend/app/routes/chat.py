@@ -6,11 +6,10 @@ from typing import Dict
 from app.database import get_db
 from app.auth import get_current_user
 from app.models import User, UserPreference
-from openai import OpenAI
 from app.config import settings
+from app.services.openai_client import openai_client
 
 router = APIRouter()
-client = OpenAI(api_key=settings.OPENAI_API_KEY)  # Create client instance
 
 
 @router.post("/message", response_model=Dict)
@@ -25,7 +24,7 @@ async def chat_with_bot(
     # get prev convo for faster (not implement yet)
     
     # lastets OpenAPI
-    response = client.chat.completions.create(
+    response = await openai_client.create_chat_completion(
         model="gpt-4",
         messages=[
             {"role": "system", "content": "You are a real estate consultant helping users find their ideal home. Try to identify user preferences and return them in JSON format {'preferences': [{'key': 'feature_name', 'value': 'preference_level'}]}."},
@@ -26,7 +26,7 @@ async def chat_with_bot(
     user_message = message_data.message
     
     # Use chat service to process message and extract preferences
-    result = chat_service.chat_with_ai(user_message)
+    result = await chat_service.chat_with_ai(user_message)
     
     # Create preference objects and save to database
     if result["preferences"]:
@@ -56,7 +56,7 @@ async def chat_with_bot_full_response(
     user_message = message_data.message
     
     # Use chat service to process message and extract preferences
-    result = chat_service.chat_with_ai(user_message)
+    result = await chat_service.chat_with_ai(user_message)
     
     # Create preference objects and save to database
     preference_objects = []
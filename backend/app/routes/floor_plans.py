@@ -1,5 +1,6 @@
 # app/routes/floor_plans.py
 from fastapi import APIRouter, UploadFile, File, Depends, HTTPException, status
+from fastapi.concurrency import run_in_threadpool
 from sqlalchemy.orm import Session
 from typing import Dict, Any
 
@@ -35,7 +36,7 @@ async def analyze_floor_plan(
     image_data = await file.read()
     
     # Analyze floor plan
-    analysis_result = floor_plan_service.analyze_floor_plan(image_data)
+    analysis_result = await run_in_threadpool(floor_plan_service.analyze_floor_plan, image_data)
     
     if analysis_result["status"] == "error":
         raise HTTPException(
@@ -44,7 +45,7 @@ async def analyze_floor_plan(
         )
     
     # Generate optimization suggestions
-    suggestions = floor_plan_service.generate_optimization_suggestions(analysis_result["analysis"])
+    suggestions = await floor_plan_service.generate_optimization_suggestions(analysis_result["analysis"])
     
     return {
         "status": "success",
@@ -76,7 +77,7 @@ async def analyze_construction_materials(
     image_data = await file.read()
     
     # Analyze materials
-    analysis_result = floor_plan_service.analyze_construction_materials(image_data)
+    analysis_result = await floor_plan_service.analyze_construction_materials(image_data)
     
     if analysis_result["status"] == "error":
         raise HTTPException(
@@ -110,7 +111,7 @@ async def analyze_space_efficiency(
     image_data = await file.read()
     
     # Analyze floor plan for efficiency
-    analysis_result = floor_plan_service.analyze_floor_plan(image_data)
+    analysis_result = await run_in_threadpool(floor_plan_service.analyze_floor_plan, image_data)
     
     if analysis_result["status"] == "error":
         raise HTTPException(
@@ -127,7 +128,7 @@ async def analyze_space_efficiency(
     }
     
     # Generate efficiency-focused optimization suggestions
-    suggestions = floor_plan_service.generate_optimization_suggestions(analysis_result["analysis"])
+    suggestions = await floor_plan_service.generate_optimization_suggestions(analysis_result["analysis"])
     efficiency_suggestions = [s for s in suggestions if s.get("category") in ["space_efficiency", "traffic_flow"]]
     
     return {
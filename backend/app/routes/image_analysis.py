@@ -4,7 +4,6 @@ from sqlalchemy.orm import Session
 
 from app.database import get_db
 from app.services.image_analysis import SimpleImageAnalysisService
-from app.services.storage_service import S3ImageService
 from app.auth import get_current_user
 from app.models import User, UserPreference, Property, TenantProfile
 
@@ -51,9 +50,9 @@ async def analyze_image(
     
     # Perform analysis based on determined type
     if analysis_type == "tenant_preference":
-        analysis_result = image_service.analyze_tenant_preference_image(image_data)
+        analysis_result = await image_service.analyze_tenant_preference_image(image_data)
     else:  # property_listing
-        analysis_result = image_service.analyze_property_listing_image(image_data)
+        analysis_result = await image_service.analyze_property_listing_image(image_data)
     
     # Rest of your code remains the same
     if analysis_result["status"] == "error":
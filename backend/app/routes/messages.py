@@ -1,6 +1,9 @@
-from fastapi import APIRouter, Depends, HTTPException, status, Body, WebSocket, WebSocketDisconnect
+from fastapi import APIRouter, Depends, HTTPException, status, Body, Query, Response, WebSocket, WebSocketDisconnect
+from sqlalchemy import and_, case, func, or_
 from sqlalchemy.orm import Session
-from typing import List, Optional
+from typing import List, Optional, Tuple
+from datetime import datetime
+import base64
 import json
 from jose import jwt, JWTError
 
@@ -9,11 +12,10 @@ from app.models import User, Message
 from app.schemas import MessageCreate, MessageResponse, MessageUpdate
 from app.auth import get_current_user
 from app.config import settings
+from app.services.message_broker import broker
 
 router = APIRouter()
 
-active_connections = {}
-
 @router.post("/", response_model=MessageResponse)
 async def send_message(
     message: MessageCreate,
@@ -54,35 +56,65 @@ async def send_message(
         "id": db_message.id,
     }
     
-    # Send to all active connections in the room
-    if room_id in active_connections:
-        disconnected_ws = []
-        for ws in active_connections[room_id]:
-            try:
-                await ws.send_text(json.dumps(msg_data))
-                print(f"Message sent to WebSocket connection in room {room_id}")
-            except Exception as e:
-                print(f"Error sending message to WebSocket: {str(e)}")
-                disconnected_ws.append(ws)
-        
-        # Clean up disconnected WebSockets
-        for ws in disconnected_ws:
-            if ws in active_connections[room_id]:
-                active_connections[room_id].remove(ws)
-        if not active_connections[room_id]:
-            del active_connections[room_id]
+    # Fan out to every connection in the room, on any worker
+    await broker.publish(room_id, json.dumps(msg_data))
 
     return db_message
 
+def encode_message_cursor(message: Message) -> str:
+    """Opaque keyset cursor for a message position in a conversation: (timestamp, id)"""
+    raw = f"{message.timestamp.isoformat()}|{message.id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+def decode_message_cursor(cursor: str) -> Tuple[datetime, int]:
+    """Decode a cursor produced by encode_message_cursor"""
+    try:
+        timestamp, message_id = base64.urlsafe_b64decode(cursor.encode()).decode().rsplit("|", 1)
+        return datetime.fromisoformat(timestamp), int(message_id)
+    except (ValueError, UnicodeDecodeError):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid message cursor"
+        )
+
+def _before_position(timestamp: datetime, message_id: int, inclusive: bool = False):
+    """Keyset condition for messages positioned before (timestamp, id)"""
+    id_condition = Message.id <= message_id if inclusive else Message.id < message_id
+    return or_(
+        Message.timestamp < timestamp,
+        and_(Message.timestamp == timestamp, id_condition)
+    )
+
+def _after_position(timestamp: datetime, message_id: int):
+    """Keyset condition for messages positioned after (timestamp, id)"""
+    return or_(
+        Message.timestamp > timestamp,
+        and_(Message.timestamp == timestamp, Message.id > message_id)
+    )
+
 @router.get("/", response_model=List[MessageResponse])
 def get_messages(
     other_user_id: int,
+    response: Response,
+    before: Optional[str] = Query(None, description="Cursor: return messages older than this position"),
+    after: Optional[str] = Query(None, description="Cursor: return messages newer than this position"),
+    limit: int = Query(50, ge=1, le=200),
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
     """
-    Get conversation history with another user
+    Get conversation history with another user, one page at a time
+    
+    Without a cursor the latest `limit` messages are returned. Messages are
+    always ordered oldest first. The X-Before-Cursor / X-After-Cursor response
+    headers hold the cursors of the oldest / newest message of the page.
     """
+    if before and after:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Use either before or after, not both"
+        )
+    
     # Check if other user exists
     other_user = db.query(User).filter(User.id == other_user_id).first()
     if not other_user:
@@ -92,7 +124,7 @@ def get_messages(
         )
     
     # Get messages between current user and other user
-    messages = db.query(Message).filter(
+    query = db.query(Message).filter(
         (
             (Message.sender_id == current_user.id) & 
             (Message.receiver_id == other_user_id)
@@ -100,16 +132,42 @@ def get_messages(
             (Message.sender_id == other_user_id) & 
             (Message.receiver_id == current_user.id)
         )
-    ).order_by(Message.timestamp).all()
+    )
+    
+    if after:
+        # Oldest messages after the cursor
+        query = query.filter(_after_position(*decode_message_cursor(after)))
+        messages = query.order_by(Message.timestamp, Message.id).limit(limit).all()
+    else:
+        # Newest messages (before the cursor), then flipped to chronological order
+        if before:
+            query = query.filter(_before_position(*decode_message_cursor(before)))
+        messages = query.order_by(Message.timestamp.desc(), Message.id.desc()).limit(limit).all()
+        messages.reverse()
     
-    # Mark messages as read
-    for msg in messages:
-        if msg.receiver_id == current_user.id and not msg.is_read:
-            msg.is_read = True
+    if not messages:
+        return []
     
+    response.headers["X-Before-Cursor"] = encode_message_cursor(messages[0])
+    response.headers["X-After-Cursor"] = encode_message_cursor(messages[-1])
+    
+    # Serialize before the commit below expires the loaded messages
+    page = [MessageResponse.model_validate(msg) for msg in messages]
+    
+    # Mark everything received up to the newest message of this page as read in one UPDATE
+    newest = messages[-1]
+    db.query(Message).filter(
+        Message.receiver_id == current_user.id,
+        Message.sender_id == other_user_id,
+        Message.is_read == False,
+        _before_position(newest.timestamp, newest.id, inclusive=True)
+    ).update({Message.is_read: True}, synchronize_session=False)
     db.commit()
     
-    return messages
+    return [
+        msg.model_copy(update={"is_read": True}) if msg.receiver_id == current_user.id else msg
+        for msg in page
+    ]
 
 @router.get("/conversations", response_model=List[dict])
 def get_conversations(
@@ -119,60 +177,61 @@ def get_conversations(
     """
     Get list of users the current user has conversed with
     """
-    # Get all unique users the current user has exchanged messages with
-    sent_to = db.query(Message.receiver_id).filter(
-        Message.sender_id == current_user.id
-    ).distinct().all()
-    
-    received_from = db.query(Message.sender_id).filter(
-        Message.receiver_id == current_user.id
-    ).distinct().all()
-    
-    # Combine and remove duplicates
-    user_ids = set([uid[0] for uid in sent_to + received_from])
+    # The other participant of each message, used as the conversation key
+    counterpart_id = case(
+        (Message.sender_id == current_user.id, Message.receiver_id),
+        else_=Message.sender_id
+    )
     
-    # Get user details and latest message for each conversation
-    conversations = []
-    for user_id in user_ids:
-        user = db.query(User).filter(User.id == user_id).first()
-        if user:
-            # Get the latest message in this conversation
-            latest_message = db.query(Message).filter(
-                (
-                    (Message.sender_id == current_user.id) & 
-                    (Message.receiver_id == user_id)
-                ) | (
-                    (Message.sender_id == user_id) & 
-                    (Message.receiver_id == current_user.id)
-                )
-            ).order_by(Message.timestamp.desc()).first()
-            
-            # Count unread messages
-            unread_count = db.query(Message).filter(
-                Message.sender_id == user_id,
-                Message.receiver_id == current_user.id,
-                Message.is_read == False
-            ).count()
-            
-            conversations.append({
-                "user_id": user.id,
-                "username": user.username,
-                "email": user.email,
-                "latest_message": {
-                    "content": latest_message.content,
-                    "timestamp": latest_message.timestamp,
-                    "is_sent_by_me": latest_message.sender_id == current_user.id
-                },
-                "unread_count": unread_count
-            })
+    # Rank messages per conversation (newest first) and count unread ones in the same pass
+    ranked = db.query(
+        Message.content,
+        Message.timestamp,
+        Message.sender_id,
+        counterpart_id.label("counterpart_id"),
+        func.row_number().over(
+            partition_by=counterpart_id,
+            order_by=(Message.timestamp.desc(), Message.id.desc())
+        ).label("position"),
+        func.sum(
+            case(
+                (and_(Message.receiver_id == current_user.id, Message.is_read == False), 1),
+                else_=0
+            )
+        ).over(partition_by=counterpart_id).label("unread_count")
+    ).filter(
+        or_(Message.sender_id == current_user.id, Message.receiver_id == current_user.id)
+    ).subquery()
     
-    # Sort by latest message timestamp
-    conversations.sort(
-        key=lambda x: x["latest_message"]["timestamp"], 
-        reverse=True
-    )
+    # Keep the latest message of each conversation together with the counterpart
+    rows = db.query(
+        User.id,
+        User.username,
+        User.email,
+        ranked.c.content,
+        ranked.c.timestamp,
+        ranked.c.sender_id,
+        ranked.c.unread_count
+    ).join(
+        ranked, ranked.c.counterpart_id == User.id
+    ).filter(
+        ranked.c.position == 1
+    ).order_by(ranked.c.timestamp.desc()).all()
     
-    return conversations
+    return [
+        {
+            "user_id": row.id,
+            "username": row.username,
+            "email": row.email,
+            "latest_message": {
+                "content": row.content,
+                "timestamp": row.timestamp,
+                "is_sent_by_me": row.sender_id == current_user.id
+            },
+            "unread_count": int(row.unread_count or 0)
+        }
+        for row in rows
+    ]
 
 @router.put("/{message_id}", response_model=MessageResponse)
 def mark_message_as_read(
@@ -232,9 +291,7 @@ async def websocket_endpoint(websocket: WebSocket, other_user_id: int, db: Sessi
         return
     print("WebSocket auth success, user:", user.email)
     room_id = f"{min(user.id, other_user_id)}_{max(user.id, other_user_id)}"
-    if room_id not in active_connections:
-        active_connections[room_id] = []
-    active_connections[room_id].append(websocket)
+    await broker.connect(room_id, websocket)
     try:
         while True:
             try:
@@ -249,8 +306,4 @@ async def websocket_endpoint(websocket: WebSocket, other_user_id: int, db: Sessi
                 break
     finally:
         # Clean up the connection
-        if room_id in active_connections:
-            if websocket in active_connections[room_id]:
-                active_connections[room_id].remove(websocket)
-            if not active_connections[room_id]:
-                del active_connections[room_id]
\ No newline at end of file
+        await broker.disconnect(room_id, websocket)
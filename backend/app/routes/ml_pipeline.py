@@ -6,17 +6,21 @@ from typing import List, Dict, Any
 from app.database import get_db
 from app.models import User
 from app.auth import get_current_user
-from app.services.ml_data_pipeline import MLDataPipelineService
+from app.services.ml_data_pipeline import ARCHITECTURAL_FEATURE_DIM, MLDataPipelineService
 
 router = APIRouter()
 
 @router.post("/extract-property-features", response_model=Dict[str, Any])
 def extract_property_features(
+    full_refresh: bool = False,
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
     """
     Extract property features for ML model training
+    
+    Only properties created or updated since the last extraction are processed
+    unless full_refresh is set.
     """
     # Check if user has admin access
     if current_user.user_type != "admin":
@@ -30,13 +34,15 @@ def extract_property_features(
     
     # Extract property features
     try:
-        df = pipeline_service.extract_property_features_dataset()
+        update = pipeline_service.extract_property_features_dataset(full_refresh=full_refresh)
         
         return {
             "status": "success",
-            "message": f"Successfully extracted {len(df)} property records",
-            "columns": df.columns.tolist(),
-            "sample": df.head(5).to_dict(orient="records")
+            "message": f"Successfully extracted {update.rows_written} new or updated property records",
+            "path": update.path,
+            "high_water_mark": update.high_water_mark,
+            "columns": update.columns,
+            "sample": update.sample
         }
     except Exception as e:
         raise HTTPException(
@@ -82,6 +88,7 @@ def prepare_floor_plan_data(
 
 @router.post("/generate-feature-vectors", response_model=Dict[str, Any])
 def generate_feature_vectors(
+    full_refresh: bool = False,
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
@@ -100,13 +107,16 @@ def generate_feature_vectors(
     
     # Generate feature vectors
     try:
-        feature_array = pipeline_service.generate_architectural_feature_vectors()
+        update = pipeline_service.generate_architectural_feature_vectors(full_refresh=full_refresh)
         
         return {
             "status": "success",
-            "message": f"Successfully generated {feature_array.shape[0]} feature vectors with {feature_array.shape[1]} dimensions",
-            "shape": feature_array.shape,
-            "sample": feature_array[:5].tolist()
+            "message": f"Successfully generated {update.rows_written} feature vectors with {ARCHITECTURAL_FEATURE_DIM} dimensions",
+            "path": update.path,
+            "high_water_mark": update.high_water_mark,
+            "rows_written": update.rows_written,
+            "shape": (len(pipeline_service.feature_store), ARCHITECTURAL_FEATURE_DIM),
+            "sample": update.sample
         }
     except Exception as e:
         raise HTTPException(
@@ -114,6 +124,82 @@ def generate_feature_vectors(
             detail=f"Error generating feature vectors: {str(e)}"
         )
 
+@router.post("/generate-label-features", response_model=Dict[str, Any])
+def generate_label_features(
+    weighting: str = "tfidf",
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """
+    Generate the sparse style/feature/material label matrix for ML model training
+    """
+    # Check if user has admin access
+    if current_user.user_type != "admin":
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Only admin users can access ML pipeline functions"
+        )
+    
+    # Create pipeline service
+    pipeline_service = MLDataPipelineService(db)
+    
+    # Encode labels
+    try:
+        property_ids, matrix = pipeline_service.generate_label_feature_matrix(weighting=weighting)
+        
+        return {
+            "status": "success",
+            "message": f"Successfully encoded {matrix.shape[0]} properties over {matrix.shape[1]} label terms",
+            "shape": matrix.shape,
+            "nnz": int(matrix.nnz)
+        }
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Error generating label features: {str(e)}"
+        )
+
+@router.post("/train-collaborative-filtering", response_model=Dict[str, Any])
+def train_collaborative_filtering(
+    factors: int = 32,
+    iterations: int = 15,
+    regularization: float = 0.1,
+    alpha: float = 40.0,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """
+    Train the collaborative filtering recommender on user interactions
+    """
+    # Check if user has admin access
+    if current_user.user_type != "admin":
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Only admin users can access ML pipeline functions"
+        )
+    
+    # Create pipeline service
+    pipeline_service = MLDataPipelineService(db)
+    
+    # Train and persist the factor matrices
+    try:
+        model = pipeline_service.train_collaborative_filtering_model(
+            factors=factors, iterations=iterations, regularization=regularization, alpha=alpha
+        )
+        
+        return {
+            "status": "success",
+            "message": f"Successfully trained factors for {model.user_ids.shape[0]} users and {model.property_ids.shape[0]} properties",
+            "params": model.params
+        }
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Error training collaborative filtering model: {str(e)}"
+        )
+
 @router.post("/upload-floor-plan-annotation", response_model=Dict[str, Any])
 async def upload_floor_plan_annotation(
     file: UploadFile = File(...),
@@ -201,6 +287,7 @@ def audit_training_data(
 
 @router.get("/extract-user-preferences", response_model=Dict[str, Any])
 def extract_user_preferences(
+    full_refresh: bool = False,
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
@@ -219,13 +306,15 @@ def extract_user_preferences(
     
     # Extract user preferences
     try:
-        df = pipeline_service.extract_user_preferences_dataset()
+        update = pipeline_service.extract_user_preferences_dataset(full_refresh=full_refresh)
         
         return {
             "status": "success",
-            "message": f"Successfully extracted {len(df)} user preference records",
-            "columns": df.columns.tolist(),
-            "sample": df.head(5).to_dict(orient="records")
+            "message": f"Successfully extracted {update.rows_written} new user preference records",
+            "path": update.path,
+            "high_water_mark": update.high_water_mark,
+            "columns": update.columns,
+            "sample": update.sample
         }
     except Exception as e:
         raise HTTPException(
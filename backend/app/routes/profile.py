@@ -1,10 +1,10 @@
 from app import schemas
 from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
+from sqlalchemy.orm import Session, selectinload
 from typing import List, Optional
 
 from app.database import get_db
-from app.models import User, LandlordProfile, TenantProfile, UserPreference
+from app.models import User, LandlordProfile, TenantProfile, UserPreference, Property
 from app.schemas import (
     LandlordProfileCreate, LandlordProfile as LandlordProfileSchema,
     TenantProfileCreate, TenantProfile as TenantProfileSchema,
@@ -68,7 +68,10 @@ def get_my_landlord_profile(
     """
     Get the current user's landlord profile with their properties
     """
-    profile = db.query(LandlordProfile).filter(
+    # Load the properties and their images eagerly, one query each
+    profile = db.query(LandlordProfile).options(
+        selectinload(LandlordProfile.listed_properties).selectinload(Property.images)
+    ).filter(
         LandlordProfile.user_id == current_user.id
     ).first()
     
@@ -78,9 +81,6 @@ def get_my_landlord_profile(
             detail="Landlord profile not found"
         )
     
-    # Load the properties eagerly to avoid lazy-loading issues
-    db.refresh(profile)
-    
     return profile
 
 @router.put("/landlord", response_model=LandlordProfileSchema)
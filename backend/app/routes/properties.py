@@ -1,18 +1,26 @@
+import asyncio
+
 from app import schemas
-from fastapi import APIRouter, UploadFile, File, Depends, HTTPException, Form, status
-from sqlalchemy.orm import Session
-from typing import List
+from fastapi import APIRouter, UploadFile, File, Depends, HTTPException, Form, Query, status
+from sqlalchemy import insert, or_
+from sqlalchemy.orm import Session, selectinload
+from typing import Dict, List, Optional
 
+from app.config import settings
 from app.database import get_db
-from app.models import Property, PropertyImage, LandlordProfile, User
+from app.models import Property, PropertyImage, ImageAnalysisJob, LandlordProfile, User
 from app.schemas import PropertyCreate, PropertyResponse, PropertyUpdate
 from app.auth import get_current_user
-from app.services.storage_service import S3ImageService
-from app.services.image_analysis import SimpleImageAnalysisService
+from app.services.storage_service import storage_service
+from app.services.analysis_jobs import analysis_workers
+from app.services import property_search
+from app.services.property_labels import replace_labels
+from app.services.property_search import PropertySearchFilters
+from app.services.similar_properties import similar_property_index
+from app.utils.geo_utils import calculate_distance_to_core
+from app.utils.image_utils import HASH_BAND_WIDTHS, compute_dhash, hamming_distance, hash_bands
 
 router = APIRouter()
-image_service = SimpleImageAnalysisService()
-storage_service = S3ImageService()
 
 @router.post("/", response_model=schemas.PropertyResponse)
 def create_property(
@@ -38,6 +46,7 @@ def create_property(
         **property_data.dict(),
         landlord_id=landlord_profile.id
     )
+    new_property.distance_to_core = calculate_distance_to_core(new_property.latitude, new_property.longitude)
     
     db.add(new_property)
     db.commit()
@@ -52,24 +61,119 @@ def get_properties(
     db: Session = Depends(get_db)
 ):
     """Get all property listings with pagination"""
-    properties = db.query(Property).offset(skip).limit(limit).all()
+    # images of the whole page are loaded in one extra query
+    properties = db.query(Property).options(
+        selectinload(Property.images)
+    ).offset(skip).limit(limit).all()
     return properties
 
+@router.get("/search", response_model=schemas.PropertySearchResponse)
+def search_properties(
+    min_price: Optional[float] = Query(None, ge=0),
+    max_price: Optional[float] = Query(None, ge=0),
+    min_bedrooms: Optional[int] = Query(None, ge=0),
+    max_bedrooms: Optional[int] = Query(None, ge=0),
+    min_bathrooms: Optional[float] = Query(None, ge=0),
+    property_type: Optional[str] = None,
+    city: Optional[str] = None,
+    is_active: Optional[bool] = True,
+    bbox: Optional[str] = Query(None, description="Bounding box: min_lng,min_lat,max_lng,max_lat"),
+    q: Optional[str] = Query(None, max_length=200, description="Full-text query over title, address, features and description"),
+    feature: Optional[str] = Query(None, description="Label name the property or one of its images must have"),
+    feature_value: Optional[str] = Query(None, description="Required value of the feature label"),
+    min_confidence: Optional[float] = Query(None, ge=0, le=1, description="Minimum confidence of the feature label"),
+    sort: Optional[str] = Query(None, pattern="^(-?(price|created_at|distance_to_core)|relevance)$"),
+    cursor: Optional[str] = Query(None, description="next_cursor of the previous page"),
+    limit: int = Query(20, ge=1, le=100),
+    db: Session = Depends(get_db)
+):
+    """
+    Search property listings with filters, one keyset-paginated page at a time
+    
+    Results are ordered by `sort` (prefix with '-' for descending) and then id.
+    With `q` only listings matching all its words are returned, best match
+    first unless another sort is given.
+    Pass the returned next_cursor to get the following page.
+    """
+    if sort is None:
+        sort = property_search.RELEVANCE if q and q.strip() else "price"
+
+    bounds = None
+    if bbox:
+        try:
+            bounds = tuple(float(value) for value in bbox.split(","))
+        except ValueError:
+            bounds = ()
+        if len(bounds) != 4:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="bbox must be min_lng,min_lat,max_lng,max_lat"
+            )
+    
+    filters = PropertySearchFilters(
+        min_price=min_price,
+        max_price=max_price,
+        min_bedrooms=min_bedrooms,
+        max_bedrooms=max_bedrooms,
+        min_bathrooms=min_bathrooms,
+        property_type=property_type,
+        city=city,
+        is_active=is_active,
+        bbox=bounds,
+        feature=feature,
+        feature_value=feature_value,
+        min_feature_confidence=min_confidence
+    )
+    try:
+        items, next_cursor = property_search.search_properties(
+            db, filters, sort=sort, cursor=cursor, limit=limit, text=q
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    
+    return {"items": items, "next_cursor": next_cursor}
+
 @router.get("/{property_id}", response_model=PropertyResponse)
 def get_property(
     property_id: int,
     db: Session = Depends(get_db)
 ):
     """Get a specific property by ID with all its images"""
-    property = db.query(Property).filter(Property.id == property_id).first()
+    property = db.query(Property).options(
+        selectinload(Property.images)
+    ).filter(Property.id == property_id).first()
     if property is None:
         raise HTTPException(status_code=404, detail="Property not found")
     
-    # All images
-    db.refresh(property)
-    
     return property
 
+@router.get("/{property_id}/similar", response_model=List[schemas.SimilarPropertyResponse])
+def get_similar_properties(
+    property_id: int,
+    limit: int = Query(10, ge=1, le=50),
+    db: Session = Depends(get_db)
+):
+    """Active listings most similar to a property by attributes, style, features and materials"""
+    neighbours = similar_property_index.similar(db, property_id, limit=limit)
+    if neighbours is None:
+        raise HTTPException(status_code=404, detail="Property not found")
+    if not neighbours:
+        return []
+
+    properties = {
+        p.id: p for p in db.query(Property).options(
+            selectinload(Property.images)
+        ).filter(Property.id.in_([pid for pid, _ in neighbours]))
+    }
+    results = []
+    for pid, similarity in neighbours:
+        if pid in properties:
+            results.append(schemas.SimilarPropertyResponse(
+                **PropertyResponse.model_validate(properties[pid]).model_dump(),
+                similarity=round(similarity, 4)
+            ))
+    return results
+
 @router.put("/{property_id}", response_model=PropertyResponse)
 def update_property(
     property_id: int,
@@ -95,6 +199,9 @@ def update_property(
     for key, value in property_data.dict(exclude_unset=True).items():
         setattr(property, key, value)
     
+    # keep the anchor distance in sync with the coordinates
+    property.distance_to_core = calculate_distance_to_core(property.latitude, property.longitude)
+    
     db.commit()
     db.refresh(property)
     return property
@@ -122,6 +229,63 @@ def delete_property(
     db.commit()
     return None
 
+_HASH_BAND_COLUMNS = [
+    PropertyImage.hash_band_0, PropertyImage.hash_band_1, PropertyImage.hash_band_2,
+    PropertyImage.hash_band_3, PropertyImage.hash_band_4
+]
+
+def _hash_band_values(image_hash: Optional[str]) -> Dict[str, Optional[str]]:
+    return {column.key: band for column, band in zip(_HASH_BAND_COLUMNS, hash_bands(image_hash))}
+
+def _find_duplicate_images(db: Session, landlord_id: int, hashes: List[Optional[str]]) -> Dict[str, PropertyImage]:
+    """
+    Map perceptual hashes to an existing image of the landlord that looks the same
+
+    Exact matches use the perceptual_hash index. Near matches within
+    IMAGE_DUPLICATE_MAX_DISTANCE <= 4 bits share a hash band with the upload,
+    so only images with an equal band (indexed) are compared. Larger distances
+    compare against the landlord's IMAGE_DUPLICATE_SCAN_LIMIT most recent
+    hashed images, so the cost per upload is bounded by that limit.
+    """
+    wanted = {image_hash for image_hash in hashes if image_hash}
+    if not wanted:
+        return {}
+    
+    landlord_images = db.query(PropertyImage).join(
+        Property, Property.id == PropertyImage.property_id
+    ).filter(Property.landlord_id == landlord_id)
+    
+    # exact matches use the perceptual_hash index
+    candidates = landlord_images.filter(PropertyImage.perceptual_hash.in_(wanted)).order_by(PropertyImage.id).all()
+    
+    missing = wanted - {c.perceptual_hash for c in candidates}
+    if settings.IMAGE_DUPLICATE_MAX_DISTANCE > 0 and missing:
+        if settings.IMAGE_DUPLICATE_MAX_DISTANCE < len(HASH_BAND_WIDTHS):
+            near = landlord_images.filter(or_(*(
+                column == band
+                for image_hash in missing
+                for column, band in zip(_HASH_BAND_COLUMNS, hash_bands(image_hash))
+            )))
+        else:
+            near = landlord_images.filter(PropertyImage.perceptual_hash.isnot(None))
+        near = near.order_by(PropertyImage.id.desc()).limit(settings.IMAGE_DUPLICATE_SCAN_LIMIT).all()
+        candidates = sorted({c.id: c for c in candidates + near}.values(), key=lambda c: c.id)
+    
+    matches = {}
+    for image_hash in wanted:
+        best = None
+        for candidate in candidates:
+            distance = hamming_distance(image_hash, candidate.perceptual_hash)
+            if distance > settings.IMAGE_DUPLICATE_MAX_DISTANCE:
+                continue
+            # prefer the closest image, then one that was already analyzed
+            key = (distance, not candidate.labels)
+            if best is None or key < best[0]:
+                best = (key, candidate)
+        if best is not None:
+            matches[image_hash] = best[1]
+    return matches
+
 @router.post("/{property_id}/images", response_model=dict)
 async def upload_property_images(
     property_id: int,
@@ -144,69 +308,133 @@ async def upload_property_images(
     if not landlord_profile or property.landlord_id != landlord_profile.id:
         raise HTTPException(status_code=403, detail="You are not the landlord of this properties")
     
-    uploaded_images = []
+    # perceptual hashes find photos the landlord already uploaded
+    hashes = await asyncio.gather(*(asyncio.to_thread(compute_dhash, file.file) for file in files))
+    existing = _find_duplicate_images(db, landlord_profile.id, hashes)
+    
+    # copies within the batch reuse the upload of their first occurrence
+    batch_sources = {}
+    for i, image_hash in enumerate(hashes):
+        if image_hash is None or image_hash in existing:
+            continue
+        for j in range(i):
+            if j not in batch_sources and hashes[j] is not None and hashes[j] not in existing \
+                    and hamming_distance(image_hash, hashes[j]) <= settings.IMAGE_DUPLICATE_MAX_DISTANCE:
+                batch_sources[i] = j
+                break
+    to_upload = [
+        i for i, image_hash in enumerate(hashes)
+        if image_hash not in existing and i not in batch_sources
+    ]
     
-    # process multiple images upload
-    for i, file in enumerate(files):
-        try:
-            # read image data for analysis
-            image_data = await file.read()
-            await file.seek(0)  # reset file pointer
-            
-            # analyze image features
-            analysis_result = image_service.analyze_property_listing_image(image_data)
-            
-            # upload to S3
-            image_url = await storage_service.upload_image(file, property_id, landlord_profile.id)
-            
-            # if it's the first image and is_primary is True, or it's the first image of the property, set it as primary
-            set_as_primary = False
-            if i == 0 and is_primary:  # the first image and is_primary is True
-                # set the previous primary image to non-primary
-                existing_primary = db.query(PropertyImage).filter(
-                    PropertyImage.property_id == property_id,
-                    PropertyImage.is_primary == True
-                ).first()
-                
-                if existing_primary:
-                    existing_primary.is_primary = False
-                    
-                set_as_primary = True
-            elif db.query(PropertyImage).filter(PropertyImage.property_id == property_id).count() == 0:
-                # if it's the first image of the property, set it as primary
-                set_as_primary = True
-            
-            # create new image record
-            property_image = PropertyImage(
-                property_id=property_id,
-                image_url=image_url,
-                is_primary=set_as_primary,
-                labels=analysis_result.get("features", [])
-            )
-            
-            db.add(property_image)
-            db.flush()  # get ID but not commit
-            
-            # if it's primary, update the property's primary image URL
-            if set_as_primary:
-                property.image_url = image_url
-            
-            uploaded_images.append({
-                "id": property_image.id,
-                "image_url": image_url,
-                "is_primary": set_as_primary,
-                "analysis": analysis_result.get("features", [])
-            })
-        
-        except Exception as e:
+    semaphore = asyncio.Semaphore(settings.IMAGE_UPLOAD_CONCURRENCY)
+    
+    async def store_image(file: UploadFile):
+        async with semaphore:
+            return await storage_service.upload_image(file, property_id, landlord_profile.id)
+    
+    # stream new files to storage concurrently
+    results = await asyncio.gather(
+        *(store_image(files[i]) for i in to_upload),
+        return_exceptions=True
+    )
+    for result in results:
+        if isinstance(result, Exception):
             db.rollback()
             raise HTTPException(
                 status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-                detail=f"上传图片失败: {str(e)}"
+                detail=f"上传图片失败: {str(result)}"
             )
     
-    # commit all changes
-    db.commit()
+    image_urls = dict(zip(to_upload, results))
+    for i, j in batch_sources.items():
+        image_urls[i] = image_urls[j]
+    duplicate_of = {}
+    for i, image_hash in enumerate(hashes):
+        if image_hash in existing:
+            image_urls[i] = existing[image_hash].image_url
+            duplicate_of[i] = existing[image_hash]
+    
+    # decide primary image once per batch: the first image becomes primary if
+    # requested, or if the property has no images yet
+    primary_index = None
+    if files and is_primary:
+        db.query(PropertyImage).filter(
+            PropertyImage.property_id == property_id,
+            PropertyImage.is_primary == True
+        ).update({PropertyImage.is_primary: False}, synchronize_session=False)
+        primary_index = 0
+    elif files and not db.query(
+        db.query(PropertyImage.id).filter(PropertyImage.property_id == property_id).exists()
+    ).scalar():
+        primary_index = 0
+    
+    rows = []
+    for i, image_hash in enumerate(hashes):
+        source = duplicate_of.get(i)
+        rows.append({
+            "property_id": property_id,
+            "image_url": image_urls[i],
+            "is_primary": i == primary_index,
+            # duplicates of analyzed images reuse their results, the others
+            # are filled in by the analysis job
+            "labels": source.labels if source is not None and source.labels else None,
+            "variants": source.variants if source is not None and source.labels else None,
+            "perceptual_hash": image_hash,
+            **_hash_band_values(image_hash)
+        })
+    
+    try:
+        # insert all image records and their analysis jobs in one statement each
+        image_ids = db.scalars(
+            insert(PropertyImage).returning(PropertyImage.id, sort_by_parameter_order=True),
+            rows
+        ).all() if rows else []
+        # the bulk insert bypasses the ORM flush hooks, index reused labels here
+        replace_labels(db, [
+            (property_id, image_id, row["labels"])
+            for image_id, row in zip(image_ids, rows) if row["labels"]
+        ])
+        # copies within the batch get the results of their source's job
+        pending_ids = [
+            image_id for i, (image_id, row) in enumerate(zip(image_ids, rows))
+            if row["labels"] is None and i not in batch_sources
+        ]
+        job_ids = db.scalars(
+            insert(ImageAnalysisJob).returning(ImageAnalysisJob.id, sort_by_parameter_order=True),
+            [{"property_image_id": image_id, "status": "pending", "attempts": 0} for image_id in pending_ids]
+        ).all() if pending_ids else []
+        
+        # update the property's primary image URL
+        if primary_index is not None:
+            property.image_url = rows[primary_index]["image_url"]
+        
+        db.commit()
+    except Exception as e:
+        db.rollback()
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"上传图片失败: {str(e)}"
+        )
+    
+    # analyze in the background, labels are written when each job completes
+    for job_id in job_ids:
+        analysis_workers.enqueue(job_id)
+    
+    image_jobs = dict(zip(pending_ids, job_ids))
+    for i, j in batch_sources.items():
+        image_jobs[image_ids[i]] = image_jobs.get(image_ids[j])
+    uploaded_images = [
+        {
+            "id": image_id,
+            "image_url": row["image_url"],
+            "is_primary": row["is_primary"],
+            "duplicate_of": duplicate_of[i].id if i in duplicate_of else None,
+            "analysis_job_id": image_jobs.get(image_id),
+            "analysis_status": "pending" if image_jobs.get(image_id) else "done"
+        }
+        for i, (image_id, row) in enumerate(zip(image_ids, rows))
+    ]
     
     return {
         "status": "success",
@@ -214,6 +442,38 @@ async def upload_property_images(
         "images": uploaded_images
     }
 
+# add an endpoint to get the analysis status of property images
+@router.get("/{property_id}/images/analysis", response_model=List[dict])
+async def get_property_image_analysis_status(
+    property_id: int,
+    db: Session = Depends(get_db)
+):
+    """Get the background analysis status ('pending', 'running', 'done' or 'failed') of property images"""
+    property = db.query(Property).filter(Property.id == property_id).first()
+    if not property:
+        raise HTTPException(status_code=404, detail= f"Property {property_id} not exists")
+    
+    rows = db.query(PropertyImage, ImageAnalysisJob).outerjoin(
+        ImageAnalysisJob, ImageAnalysisJob.property_image_id == PropertyImage.id
+    ).filter(
+        PropertyImage.property_id == property_id
+    ).order_by(PropertyImage.id).all()
+    # copies within an upload batch share the stored object and the job of their source
+    url_jobs = {image.image_url: job for image, job in rows if job is not None}
+    rows = [(image, job or url_jobs.get(image.image_url)) for image, job in rows]
+    
+    return [
+        {
+            "image_id": image.id,
+            # images uploaded before background analysis have no job
+            "status": job.status if job else "done",
+            "attempts": job.attempts if job else 0,
+            "error": job.error if job else None,
+            "labels": image.labels
+        }
+        for image, job in rows
+    ]
+
 # add an endpoint to get all property images
 @router.get("/{property_id}/images", response_model=List[dict])
 async def get_property_images(
@@ -234,7 +494,8 @@ async def get_property_images(
             "id": image.id,
             "image_url": image.image_url,
             "is_primary": image.is_primary,
-            "labels": image.labels
+            "labels": image.labels,
+            "variants": image.variants
         }
         for image in images
     ]
@@ -96,6 +96,7 @@ class PropertyImageResponse(BaseModel):
     image_url: str
     is_primary: bool
     labels: Optional[List[Dict[str, Any]]] = None
+    variants: Optional[Dict[str, Dict[str, str]]] = None  # size -> format -> URL
     
     class Config:
         from_attributes = True
@@ -105,11 +106,20 @@ class PropertyResponse(PropertyBase):
     landlord_id: int 
     created_at: datetime
     is_active: bool
+    distance_to_core: Optional[float] = None  # miles to the CMU anchor
+    image_variants: Optional[Dict[str, Dict[str, str]]] = None  # variants of the primary image
     images: List[PropertyImageResponse] = []
     
     class Config:
         from_attributes = True
 
+class SimilarPropertyResponse(PropertyResponse):
+    similarity: float  # cosine similarity to the reference property, -1 to 1
+
+class PropertySearchResponse(BaseModel):
+    items: List[PropertyResponse]
+    next_cursor: Optional[str] = None  # pass as cursor to get the next page
+
 
 # Tenant Profile schemas - Updated to match models.py
 class TenantProfileBase(BaseModel):
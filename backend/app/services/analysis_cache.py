@@ -0,0 +1,172 @@
+# app/services/analysis_cache.py
+import asyncio
+import copy
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from app.config import settings
+
+
+def prompt_version(prompt: str) -> str:
+    """Short digest of a prompt, so editing a prompt invalidates its cached results"""
+    return hashlib.sha256(prompt.encode("utf-8")).hexdigest()[:12]
+
+
+class AnalysisCache:
+    """
+    Content-addressed cache for image analysis results
+
+    Results are keyed by the SHA-256 of the image bytes plus the analysis type
+    and prompt version, so the same photo analyzed the same way is only sent
+    to the vision model once. Lookups go through an in-memory LRU tier first
+    and then a persistent on-disk tier (one JSON file per key) that survives
+    restarts and is shared by all workers on the host. Entries expire after
+    ttl_seconds. Only successful results should be stored. Results are copied
+    in and out, so callers may modify what they get back.
+    """
+
+    def __init__(
+        self,
+        cache_dir: Optional[str] = None,
+        max_memory_entries: Optional[int] = None,
+        ttl_seconds: Optional[float] = None
+    ):
+        self.cache_dir = cache_dir or settings.ANALYSIS_CACHE_DIR
+        self.max_memory_entries = max_memory_entries or settings.ANALYSIS_CACHE_MEMORY_ENTRIES
+        self.ttl_seconds = ttl_seconds or settings.ANALYSIS_CACHE_TTL_SECONDS
+        self._memory: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.stores = 0
+
+    @staticmethod
+    def make_key(image_bytes: bytes, analysis_type: str, version: str) -> str:
+        """Cache key for an image analyzed with a given analysis type and prompt version"""
+        digest = hashlib.sha256(image_bytes).hexdigest()
+        return f"{analysis_type}:{version}:{digest}"
+
+    def _path(self, key: str) -> str:
+        name = hashlib.sha256(key.encode("utf-8")).hexdigest()
+        # Shard by prefix to keep directories small
+        return os.path.join(self.cache_dir, name[:2], f"{name}.json")
+
+    def _expired(self, entry: Dict[str, Any]) -> bool:
+        return time.time() - entry["created_at"] > self.ttl_seconds
+
+    def _remember(self, key: str, entry: Dict[str, Any]):
+        with self._lock:
+            self._memory[key] = entry
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.max_memory_entries:
+                self._memory.popitem(last=False)
+
+    def get(self, key: str) -> Optional[Any]:
+        """Get a cached result, or None on a miss"""
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                if not self._expired(entry):
+                    self._memory.move_to_end(key)
+                    self.memory_hits += 1
+                    return copy.deepcopy(entry["result"])
+                del self._memory[key]
+
+        path = self._path(key)
+        try:
+            with open(path, "r") as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            entry = None
+
+        if entry is not None and entry.get("key") == key and not self._expired(entry):
+            self._remember(key, entry)
+            with self._lock:
+                self.disk_hits += 1
+            return copy.deepcopy(entry["result"])
+
+        if entry is not None:
+            # Expired or colliding entry
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def set(self, key: str, result: Any):
+        """Store a result in both tiers"""
+        entry = {"key": key, "created_at": time.time(), "result": copy.deepcopy(result)}
+        self._remember(key, entry)
+
+        path = self._path(key)
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            # Write then rename so readers never see a partial file
+            tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(tmp_path, "w") as f:
+                json.dump(entry, f)
+            os.replace(tmp_path, path)
+        except (OSError, TypeError, ValueError) as e:
+            print(f"Analysis cache write failed: {e}")
+
+        with self._lock:
+            self.stores += 1
+
+    async def get_or_compute(
+        self,
+        image_bytes: bytes,
+        analysis_type: str,
+        version: str,
+        compute: Callable[[], Awaitable[Dict[str, Any]]]
+    ) -> Dict[str, Any]:
+        """
+        Return the cached result for an image analysis, computing and caching it on a miss
+
+        Args:
+            image_bytes: Image data the analysis is based on
+            analysis_type: Name of the analysis (e.g. 'property_listing')
+            version: Prompt version, see prompt_version()
+            compute: Coroutine function performing the analysis
+
+        Returns:
+            The analysis result; results whose status is not 'success' are not cached
+        """
+        key = self.make_key(image_bytes, analysis_type, version)
+        cached = await asyncio.to_thread(self.get, key)
+        if cached is not None:
+            return cached
+
+        result = await compute()
+        if isinstance(result, dict) and result.get("status") == "success":
+            await asyncio.to_thread(self.set, key, result)
+        return result
+
+    def stats(self) -> Dict[str, Any]:
+        """Hit/miss counters of the cache"""
+        with self._lock:
+            lookups = self.memory_hits + self.disk_hits + self.misses
+            return {
+                "memory_hits": self.memory_hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "stores": self.stores,
+                "hit_rate": (self.memory_hits + self.disk_hits) / lookups if lookups else 0.0,
+                "memory_entries": len(self._memory)
+            }
+
+    def clear_memory(self):
+        """Drop the in-memory tier (the disk tier is kept)"""
+        with self._lock:
+            self._memory.clear()
+
+
+analysis_cache = AnalysisCache()
@@ -0,0 +1,271 @@
+# app/services/analysis_jobs.py
+import asyncio
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from sqlalchemy import or_
+
+from app.config import settings
+from app.database import SessionLocal
+from app.models import ImageAnalysisJob, PropertyImage
+from app.services.image_analysis import SimpleImageAnalysisService
+from app.services.storage_service import storage_service
+from app.utils.image_utils import generate_image_variants
+
+
+class ImageAnalysisWorkerPool:
+    """
+    In-process worker pool for background property image processing
+
+    Jobs live in the image_analysis_jobs table, so an upload only has to
+    store its images and enqueue their jobs. A fixed number of asyncio
+    workers pick jobs from the queue, create the resized display variants,
+    run the vision analysis and write both back to the PropertyImage. Images
+    are read back from storage unless the job was queued with the image bytes
+    at hand. Database work runs in threads so workers never block the event
+    loop.
+
+    Several processes (uvicorn workers, overlapping deploys) may run pools
+    against the same table. A job is claimed with one conditional UPDATE
+    (pending -> running), so exactly one worker runs it, and the claim holds
+    a lease that the worker renews while it works. Recovery, at startup and
+    then every lease period, only requeues running jobs whose lease expired,
+    i.e. whose worker died. The attempt number of the claim fences the
+    result: a worker that lost its lease cannot overwrite a retry's result.
+    """
+
+    def __init__(
+        self,
+        session_factory=SessionLocal,
+        workers: Optional[int] = None,
+        lease_seconds: Optional[float] = None
+    ):
+        self.session_factory = session_factory
+        self.workers = workers or settings.IMAGE_ANALYSIS_WORKERS
+        self.lease_seconds = lease_seconds or settings.IMAGE_ANALYSIS_LEASE_SECONDS
+        self.image_service = SimpleImageAnalysisService()
+        self._queue: Optional[asyncio.Queue] = None
+        self._queued: Set[int] = set()
+        self._tasks: List[asyncio.Task] = []
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    def _ensure_started(self):
+        # The queue and tasks belong to the running event loop
+        loop = asyncio.get_running_loop()
+        if self._loop is loop and self._tasks:
+            return
+        self._loop = loop
+        self._queue = asyncio.Queue()
+        self._queued = set()
+        self._tasks = [loop.create_task(self._worker()) for _ in range(self.workers)]
+        self._tasks.append(loop.create_task(self._sweep()))
+
+    async def start(self):
+        """Start the workers and queue pending jobs, including those of dead workers"""
+        self._ensure_started()
+        await self.recover()
+
+    async def recover(self):
+        """Requeue jobs whose lease expired and queue the pending ones"""
+        try:
+            job_ids = await asyncio.to_thread(self._recover_jobs)
+        except Exception as e:
+            print(f"Could not recover image analysis jobs: {e}")
+            return
+        for job_id in job_ids:
+            self.enqueue(job_id)
+
+    async def stop(self):
+        """Cancel the workers; unfinished jobs stay pending in the database"""
+        tasks, self._tasks = self._tasks, []
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._loop = None
+
+    def enqueue(self, job_id: int, image_data: Optional[bytes] = None):
+        """Queue a job created in the database, optionally with the image bytes at hand"""
+        self._ensure_started()
+        if job_id in self._queued:
+            return
+        self._queued.add(job_id)
+        self._queue.put_nowait((job_id, image_data))
+
+    async def join(self):
+        """Wait until every queued job has been processed"""
+        if self._queue is not None:
+            await self._queue.join()
+
+    async def _sweep(self):
+        while True:
+            await asyncio.sleep(self.lease_seconds)
+            await self.recover()
+
+    async def _worker(self):
+        while True:
+            job_id, image_data = await self._queue.get()
+            self._queued.discard(job_id)
+            try:
+                await self._run_job(job_id, image_data)
+            except Exception as e:
+                print(f"Image analysis job {job_id} crashed: {e}")
+            finally:
+                self._queue.task_done()
+
+    async def _run_job(self, job_id: int, image_data: Optional[bytes]):
+        claim = await asyncio.to_thread(self._claim_job, job_id)
+        if claim is None:
+            return
+        attempt, image_url = claim
+
+        heartbeat = asyncio.create_task(self._heartbeat(job_id, attempt))
+        try:
+            result, variants = await self._process(image_url, image_data)
+        finally:
+            heartbeat.cancel()
+        await asyncio.to_thread(self._finish_job, job_id, attempt, result, variants)
+
+    async def _heartbeat(self, job_id: int, attempt: int):
+        while True:
+            await asyncio.sleep(self.lease_seconds / 3)
+            try:
+                renewed = await asyncio.to_thread(self._renew_lease, job_id, attempt)
+            except Exception as e:
+                print(f"Could not renew the lease of image analysis job {job_id}: {e}")
+                continue
+            if not renewed:
+                print(f"Image analysis job {job_id} lost its lease, its result will be discarded")
+                return
+
+    async def _process(self, image_url: str, image_data: Optional[bytes]):
+        variants = None
+        try:
+            if image_data is None:
+                image_data = await storage_service.read_image(image_url)
+            
+            # Resized display variants are produced with the analysis
+            try:
+                encoded = await asyncio.to_thread(generate_image_variants, image_data)
+                variants = await storage_service.upload_variants(image_url, encoded)
+            except Exception as e:
+                print(f"Could not create variants of {image_url}: {e}")
+            
+            result = await self.image_service.analyze_property_listing_image(image_data)
+        except Exception as e:
+            result = {"status": "error", "message": str(e)}
+        return result, variants
+
+    def _lease_deadline(self) -> datetime:
+        return datetime.utcnow() + timedelta(seconds=self.lease_seconds)
+
+    def _recover_jobs(self) -> List[int]:
+        db = self.session_factory()
+        try:
+            # Running jobs whose worker stopped renewing the lease (crash, kill);
+            # jobs of live workers in this or other processes keep running
+            db.query(ImageAnalysisJob).filter(
+                ImageAnalysisJob.status == "running",
+                or_(
+                    ImageAnalysisJob.lease_expires_at.is_(None),
+                    ImageAnalysisJob.lease_expires_at < datetime.utcnow()
+                )
+            ).update(
+                {ImageAnalysisJob.status: "pending", ImageAnalysisJob.lease_expires_at: None},
+                synchronize_session=False
+            )
+            db.commit()
+            return [
+                job_id for (job_id,) in db.query(ImageAnalysisJob.id).filter(
+                    ImageAnalysisJob.status == "pending"
+                ).order_by(ImageAnalysisJob.id)
+            ]
+        finally:
+            db.close()
+
+    def _claim_job(self, job_id: int) -> Optional[Tuple[int, str]]:
+        """
+        Atomically mark a pending job as running under a lease
+
+        Returns:
+            (attempt number, image URL), or None if the job is not pending
+            (another worker claimed it, it finished or was deleted)
+        """
+        db = self.session_factory()
+        try:
+            claimed = db.query(ImageAnalysisJob).filter(
+                ImageAnalysisJob.id == job_id,
+                ImageAnalysisJob.status == "pending"
+            ).update({
+                ImageAnalysisJob.status: "running",
+                ImageAnalysisJob.attempts: ImageAnalysisJob.attempts + 1,
+                ImageAnalysisJob.lease_expires_at: self._lease_deadline(),
+            }, synchronize_session=False)
+            db.commit()
+            if claimed != 1:
+                return None
+            row = db.query(ImageAnalysisJob.attempts, PropertyImage.image_url).join(
+                PropertyImage, PropertyImage.id == ImageAnalysisJob.property_image_id
+            ).filter(ImageAnalysisJob.id == job_id).first()
+            return None if row is None else (row[0], row[1])
+        finally:
+            db.close()
+
+    def _renew_lease(self, job_id: int, attempt: int) -> bool:
+        """Extend the lease of a claimed job, False if the claim was lost"""
+        db = self.session_factory()
+        try:
+            renewed = db.query(ImageAnalysisJob).filter(
+                ImageAnalysisJob.id == job_id,
+                ImageAnalysisJob.status == "running",
+                ImageAnalysisJob.attempts == attempt
+            ).update({ImageAnalysisJob.lease_expires_at: self._lease_deadline()}, synchronize_session=False)
+            db.commit()
+            return renewed == 1
+        finally:
+            db.close()
+
+    def _finish_job(
+        self,
+        job_id: int,
+        attempt: int,
+        result: Dict[str, Any],
+        variants: Optional[Dict[str, Dict[str, str]]] = None
+    ):
+        db = self.session_factory()
+        try:
+            succeeded = result.get("status") == "success"
+            # Conditional status transition: a worker whose lease expired and
+            # whose job was reclaimed meanwhile matches no row and writes nothing
+            finished = db.query(ImageAnalysisJob).filter(
+                ImageAnalysisJob.id == job_id,
+                ImageAnalysisJob.status == "running",
+                ImageAnalysisJob.attempts == attempt
+            ).update({
+                ImageAnalysisJob.status: "done" if succeeded else "failed",
+                ImageAnalysisJob.error: None if succeeded else result.get("message", "Image analysis failed"),
+                ImageAnalysisJob.lease_expires_at: None,
+            }, synchronize_session=False)
+            if finished != 1:
+                # The image was deleted meanwhile, or the lease expired and the job was retried
+                db.rollback()
+                return
+            image = db.query(PropertyImage).join(
+                ImageAnalysisJob, ImageAnalysisJob.property_image_id == PropertyImage.id
+            ).filter(ImageAnalysisJob.id == job_id).one()
+            # Copies of the image within its upload batch share the stored
+            # object but have no job of their own
+            images = [image] + db.query(PropertyImage).filter(
+                PropertyImage.image_url == image.image_url,
+                PropertyImage.id != image.id,
+                ~PropertyImage.analysis_job.has()
+            ).all()
+            for target in images:
+                if variants:
+                    target.variants = variants
+                if succeeded:
+                    target.labels = result.get("features", [])
+            db.commit()
+        finally:
+            db.close()
+
+analysis_workers = ImageAnalysisWorkerPool()
@@ -1,18 +1,20 @@
 # app/services/architectural_classifier.py
-import base64
+import asyncio
 import json
 import re
 import numpy as np
 from typing import Dict, Any, List, Optional
-from openai import OpenAI
 from app.config import settings
+from app.services.openai_client import openai_client
+from app.services.analysis_cache import analysis_cache, prompt_version
+from app.utils.image_utils import prepare_image_for_vision
 
 class ArchitecturalStyleClassifier:
     """Service for analyzing and classifying architectural styles in property images"""
     
     def __init__(self):
         self.api_key = settings.OPENAI_API_KEY
-        self.client = OpenAI(api_key=self.api_key)
+        self.client = openai_client
         
         # Define common architectural styles with features
         self.styles = {
@@ -63,7 +65,7 @@ class ArchitecturalStyleClassifier:
             }
         }
     
-    def classify_architectural_style(self, image_bytes: bytes) -> Dict[str, Any]:
+    async def classify_architectural_style(self, image_bytes: bytes) -> Dict[str, Any]:
         """
         Classify the architectural style of a building in an image
         
@@ -73,9 +75,6 @@ class ArchitecturalStyleClassifier:
         Returns:
             Dictionary with classification results
         """
-        # Encode image to base64
-        base64_image = base64.b64encode(image_bytes).decode('utf-8')
-        
         # Prompt for architectural style analysis
         prompt = """
         As an architectural expert, analyze this building image. Identify the architectural style, 
@@ -94,8 +93,30 @@ class ArchitecturalStyleClassifier:
         Structure the response as valid JSON only.
         """
         
+        # Repeated classifications of the same image are served from the cache
+        return await analysis_cache.get_or_compute(
+            image_bytes,
+            "architectural_style",
+            prompt_version(prompt),
+            lambda: self._request_classification(image_bytes, prompt)
+        )
+    
+    async def _request_classification(self, image_bytes: bytes, prompt: str) -> Dict[str, Any]:
+        """
+        Send a building image to the OpenAI Vision API and parse the classification
+        
+        Args:
+            image_bytes: Image data in bytes
+            prompt: Classification prompt
+            
+        Returns:
+            Dictionary with classification results
+        """
+        # Downscale and re-encode off the event loop
+        prepared = await asyncio.to_thread(prepare_image_for_vision, image_bytes)
+        
         try:
-            response = self.client.chat.completions.create(
+            response = await self.client.create_chat_completion(
                 model="gpt-4o",
                 messages=[
                     {
@@ -105,7 +126,7 @@ class ArchitecturalStyleClassifier:
                             {
                                 "type": "image_url",
                                 "image_url": {
-                                    "url": f"data:image/jpeg;base64,{base64_image}"
+                                    "url": prepared.data_url
                                 }
                             }
                         ]
@@ -149,7 +170,7 @@ class ArchitecturalStyleClassifier:
                 "message": str(e)
             }
     
-    def compare_architectural_styles(self, image_bytes1: bytes, image_bytes2: bytes) -> Dict[str, Any]:
+    async def compare_architectural_styles(self, image_bytes1: bytes, image_bytes2: bytes) -> Dict[str, Any]:
         """
         Compare architectural styles between two buildings
         
@@ -160,9 +181,11 @@ class ArchitecturalStyleClassifier:
         Returns:
             Dictionary with comparison results
         """
-        # Get classifications for both images
-        result1 = self.classify_architectural_style(image_bytes1)
-        result2 = self.classify_architectural_style(image_bytes2)
+        # Get classifications for both images concurrently
+        result1, result2 = await asyncio.gather(
+            self.classify_architectural_style(image_bytes1),
+            self.classify_architectural_style(image_bytes2)
+        )
         
         if result1["status"] == "error" or result2["status"] == "error":
             return {
@@ -300,7 +323,7 @@ class ArchitecturalStyleClassifier:
         except Exception:
             return "Unable to determine period difference"
     
-    def generate_style_guidelines(self, style_name: str) -> Dict[str, Any]:
+    async def generate_style_guidelines(self, style_name: str) -> Dict[str, Any]:
         """
         Generate detailed architectural style guidelines
         
@@ -339,7 +362,7 @@ class ArchitecturalStyleClassifier:
         """
         
         try:
-            response = self.client.chat.completions.create(
+            response = await self.client.create_chat_completion(
                 model="gpt-4",
                 messages=[
                     {"role": "user", "content": prompt}
@@ -1,20 +1,20 @@
 # app/services/chat_service.py
 from typing import Dict, List, Optional
-from openai import OpenAI
 import re
 import json
 
 from app.config import settings
 from app.models import UserPreference
+from app.services.openai_client import openai_client
 
 class ChatService:
     """Service for AI chat interactions and preference extraction"""
     
     def __init__(self):
         self.api_key = settings.OPENAI_API_KEY
-        self.client = OpenAI(api_key=self.api_key)
+        self.client = openai_client
     
-    def chat_with_ai(self, user_message: str, history: Optional[List[Dict]] = None) -> Dict:
+    async def chat_with_ai(self, user_message: str, history: Optional[List[Dict]] = None) -> Dict:
         """
         Process user message with AI and extract housing preferences
         
@@ -77,7 +77,7 @@ class ChatService:
         messages.append({"role": "user", "content": user_message})
         
         # Call OpenAI API
-        response = self.client.chat.completions.create(
+        response = await self.client.create_chat_completion(
             model="gpt-4",
             messages=messages,
             temperature=0.7,  # More creative but still focused
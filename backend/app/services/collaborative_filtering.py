@@ -0,0 +1,252 @@
+# app/services/collaborative_filtering.py
+import json
+import os
+import threading
+from datetime import datetime
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+import scipy.sparse as sp
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.models import Interaction
+
+# Implicit feedback strength of each interaction action; unknown actions count as a click
+ACTION_WEIGHTS: Dict[str, float] = {
+    "view": 1.0,
+    "click": 1.0,
+    "like": 3.0,
+    "comment": 3.0,
+    "save": 5.0,
+}
+
+
+def build_interaction_matrix(db: Session, chunk_size: Optional[int] = None) -> Tuple[np.ndarray, np.ndarray, sp.csr_matrix]:
+    """
+    Sparse user x property matrix of weighted interaction counts
+
+    Interactions are counted per (user, property, action) in SQL and streamed
+    in chunks, so only the aggregated rows reach Python.
+
+    Returns:
+        (user ids, property ids, CSR matrix), ids sorted ascending and aligned
+        with the matrix rows and columns
+    """
+    chunk_size = chunk_size or settings.ML_EXTRACT_CHUNK_SIZE
+    query = select(
+        Interaction.user_id, Interaction.property_id, Interaction.action, func.count()
+    ).group_by(Interaction.user_id, Interaction.property_id, Interaction.action)
+
+    users, items, weights = [], [], []
+    for chunk in db.execute(query.execution_options(yield_per=chunk_size)).partitions():
+        for user_id, property_id, action, count in chunk:
+            users.append(user_id)
+            items.append(property_id)
+            weights.append(ACTION_WEIGHTS.get((action or "").lower(), 1.0) * count)
+
+    user_ids, user_rows = np.unique(np.array(users, dtype=np.int64), return_inverse=True)
+    property_ids, item_columns = np.unique(np.array(items, dtype=np.int64), return_inverse=True)
+    # Duplicate (row, column) entries of different actions are summed
+    matrix = sp.csr_matrix(
+        (np.array(weights, dtype=np.float32), (user_rows, item_columns)),
+        shape=(user_ids.shape[0], property_ids.shape[0])
+    )
+    return user_ids, property_ids, matrix
+
+
+class ImplicitALS:
+    """
+    Alternating least squares for implicit feedback (Hu, Koren & Volinsky)
+
+    Every observed (user, property) pair has preference 1 and confidence
+    1 + alpha * log1p(weight); unobserved pairs have preference 0 and
+    confidence 1. Each half-step solves one small factors x factors system
+    per user (or property) using only its nonzeros plus the shared Gram
+    matrix, so a sweep costs O(nnz * factors^2 + rows * factors^3).
+    """
+
+    def __init__(
+        self,
+        factors: int = 32,
+        regularization: float = 0.1,
+        alpha: float = 40.0,
+        iterations: int = 15,
+        random_state: Optional[int] = 0
+    ):
+        self.factors = factors
+        self.regularization = regularization
+        self.alpha = alpha
+        self.iterations = iterations
+        self.random_state = random_state
+
+    def fit(self, matrix: sp.csr_matrix) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Factorize a user x item weight matrix
+
+        Returns:
+            (user factors, item factors) as float32 arrays
+        """
+        confidence = matrix.tocsr().astype(np.float64)
+        confidence.data = self.alpha * np.log1p(confidence.data)
+        confidence_t = confidence.T.tocsr()
+
+        rng = np.random.default_rng(self.random_state)
+        user_factors = rng.normal(scale=0.01, size=(matrix.shape[0], self.factors))
+        item_factors = rng.normal(scale=0.01, size=(matrix.shape[1], self.factors))
+        for _ in range(self.iterations):
+            self._least_squares(confidence, user_factors, item_factors)
+            self._least_squares(confidence_t, item_factors, user_factors)
+        return user_factors.astype(np.float32), item_factors.astype(np.float32)
+
+    def _least_squares(self, confidence: sp.csr_matrix, solve_for: np.ndarray, fixed: np.ndarray):
+        # (F'F + F_u'(C_u - I)F_u + reg*I) x_u = F_u' C_u p_u, with p_u = 1 on the nonzeros
+        gram = fixed.T @ fixed + self.regularization * np.eye(self.factors)
+        indptr, indices, data = confidence.indptr, confidence.indices, confidence.data
+        for row in range(solve_for.shape[0]):
+            start, end = indptr[row], indptr[row + 1]
+            if start == end:
+                solve_for[row] = 0.0
+                continue
+            factors = fixed[indices[start:end]]
+            extra = data[start:end]
+            a = gram + (factors.T * extra) @ factors
+            b = factors.T @ (extra + 1.0)
+            solve_for[row] = np.linalg.solve(a, b)
+
+
+class CollaborativeFilteringModel:
+    """
+    Trained user and property factor matrices
+
+    Saved as one .npz file (ids, float32 factors and the training parameters
+    as JSON). Scoring a user is a single dense matrix-vector product of the
+    property factors with the user's factor vector.
+    """
+
+    def __init__(
+        self,
+        user_ids: np.ndarray,
+        property_ids: np.ndarray,
+        user_factors: np.ndarray,
+        item_factors: np.ndarray,
+        params: Optional[Dict] = None
+    ):
+        self.user_ids = user_ids
+        self.property_ids = property_ids
+        self.user_factors = user_factors
+        self.item_factors = item_factors
+        self.params = params or {}
+        self._user_row = {int(uid): row for row, uid in enumerate(user_ids.tolist())}
+
+    def score_properties(self, user_id: int, property_ids: np.ndarray) -> Optional[np.ndarray]:
+        """
+        Predicted preference of a user for the given properties
+
+        Args:
+            user_id: ID of the user
+            property_ids: Candidate property ids
+
+        Returns:
+            Scores aligned with property_ids (0 for properties without
+            interactions at training time), or None for users unknown to the model
+        """
+        row = self._user_row.get(user_id)
+        if row is None:
+            return None
+        predicted = self.item_factors @ self.user_factors[row]
+
+        scores = np.zeros(property_ids.shape[0], dtype=np.float32)
+        if self.property_ids.size:
+            # property_ids of the model are sorted, so columns are found by binary search
+            columns = np.searchsorted(self.property_ids, property_ids)
+            columns = np.clip(columns, 0, self.property_ids.shape[0] - 1)
+            known = self.property_ids[columns] == property_ids
+            scores[known] = predicted[columns[known]]
+        return scores
+
+    def save(self, path: str):
+        """Write the model atomically to path"""
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        # Write then rename so readers never see a partial file
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as f:
+            np.savez(
+                f,
+                user_ids=self.user_ids,
+                property_ids=self.property_ids,
+                user_factors=self.user_factors,
+                item_factors=self.item_factors,
+                params=np.array(json.dumps(self.params))
+            )
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str) -> "CollaborativeFilteringModel":
+        """Load a model saved with save()"""
+        with np.load(path) as data:
+            return cls(
+                data["user_ids"], data["property_ids"], data["user_factors"], data["item_factors"],
+                params=json.loads(str(data["params"]))
+            )
+
+
+def train_collaborative_filtering_model(
+    db: Session,
+    path: Optional[str] = None,
+    **als_params
+) -> CollaborativeFilteringModel:
+    """
+    Train the recommender on all interactions and save it
+
+    Args:
+        db: Database session
+        path: Model file, defaults to settings.COLLABORATIVE_MODEL_PATH
+        **als_params: ImplicitALS parameters (factors, regularization, alpha, iterations)
+
+    Returns:
+        The trained model
+    """
+    user_ids, property_ids, matrix = build_interaction_matrix(db)
+    als = ImplicitALS(**als_params)
+    user_factors, item_factors = als.fit(matrix)
+    model = CollaborativeFilteringModel(
+        user_ids, property_ids, user_factors, item_factors,
+        params={
+            "factors": als.factors,
+            "regularization": als.regularization,
+            "alpha": als.alpha,
+            "iterations": als.iterations,
+            "interactions": int(matrix.nnz),
+            "trained_at": datetime.utcnow().isoformat(),
+        }
+    )
+    model.save(path or settings.COLLABORATIVE_MODEL_PATH)
+    return model
+
+
+class CollaborativeModelStore:
+    """Lazily loaded model file, reloaded when a training job replaces it"""
+
+    def __init__(self, path: Optional[str] = None):
+        self.path = path
+        self._lock = threading.Lock()
+        self._model: Optional[CollaborativeFilteringModel] = None
+        self._loaded: Optional[Tuple[str, float]] = None
+
+    def get(self) -> Optional[CollaborativeFilteringModel]:
+        """The current model, None if none has been trained yet"""
+        path = self.path or settings.COLLABORATIVE_MODEL_PATH
+        try:
+            mtime = os.stat(path).st_mtime
+        except OSError:
+            return None
+        with self._lock:
+            if self._model is None or self._loaded != (path, mtime):
+                self._model = CollaborativeFilteringModel.load(path)
+                self._loaded = (path, mtime)
+            return self._model
+
+
+collaborative_model_store = CollaborativeModelStore()
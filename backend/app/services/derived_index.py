@@ -0,0 +1,218 @@
+# app/services/derived_index.py
+import threading
+import time
+import weakref
+from typing import Any, Callable, Dict, Iterable, Optional, Set
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from app.database import SessionLocal
+
+
+class DerivedIndex:
+    """
+    Base of in-process indexes derived from database tables
+
+    Subclasses implement build(db) (derive everything), update(db, ids)
+    (re-derive the entries of the given ids) and _fingerprint() /
+    _query_fingerprint(db), a cheap summary such as (row count, max id) that
+    reveals writes bypassing the ORM or made by other processes. Ids changed
+    through the ORM arrive through mark_dirty(), see track_model_changes().
+
+    ensure_fresh() runs before every read. An index that has never been built
+    is built in the calling request. After that, a refresh is due when ids are
+    dirty, when the fingerprint has not been checked for check_interval
+    seconds, or when the last full build is older than max_age_seconds.
+
+    With background=False the refresh runs inline, under the lock readers
+    hold. With background=True it runs in a thread with its own session and
+    readers keep serving the current state meanwhile. Such subclasses must
+    query the database outside self._lock and only take it to install the
+    results, which is the only time readers wait.
+    """
+
+    _instances: "weakref.WeakSet[DerivedIndex]" = weakref.WeakSet()
+
+    def __init__(
+        self,
+        max_age_seconds: float = 300.0,
+        check_interval_seconds: float = 0.0,
+        background: bool = False,
+        session_factory=SessionLocal
+    ):
+        # Full rebuild interval, also refreshes vocabularies and scaling
+        self.max_age_seconds = max_age_seconds
+        self.check_interval_seconds = check_interval_seconds
+        self.background = background
+        self.session_factory = session_factory
+        # Guards the served state; refreshes are serialized separately
+        self._lock = threading.RLock()
+        self._refresh_lock = threading.Lock()
+        self._dirty: Set[int] = set()
+        self._refresh_thread: Optional[threading.Thread] = None
+        self.built_at: Optional[float] = None
+        self.checked_at: Optional[float] = None
+        self._reset()
+        DerivedIndex._instances.add(self)
+
+    # ------------------------------------------------------------------
+    # Subclass interface
+    # ------------------------------------------------------------------
+
+    def _reset(self):
+        """Drop the derived state"""
+        raise NotImplementedError
+
+    def build(self, db: Session):
+        """Derive the whole state from the database"""
+        raise NotImplementedError
+
+    def update(self, db: Session, ids: Set[int]):
+        """Re-derive the entries of the given ids, removing those that no longer exist"""
+        raise NotImplementedError
+
+    def _fingerprint(self):
+        raise NotImplementedError
+
+    def _query_fingerprint(self, db: Session):
+        raise NotImplementedError
+
+    # ------------------------------------------------------------------
+    # Freshness
+    # ------------------------------------------------------------------
+
+    def mark_dirty(self, ids: Iterable[int]):
+        """Schedule ids for an incremental update on the next read"""
+        with self._lock:
+            self._dirty.update(i for i in ids if i is not None)
+
+    def invalidate(self):
+        """Drop the derived state, the next read rebuilds it"""
+        with self._lock:
+            self._dirty.clear()
+            self.built_at = self.checked_at = None
+            self._reset()
+
+    @classmethod
+    def invalidate_all(cls):
+        """Invalidate every index of the process (e.g. after switching databases)"""
+        for index in list(cls._instances):
+            index.invalidate()
+
+    def _refresh_due(self) -> bool:
+        now = time.monotonic()
+        return (
+            self.built_at is None
+            or bool(self._dirty)
+            or now - self.checked_at >= self.check_interval_seconds
+            or now - self.built_at > self.max_age_seconds
+        )
+
+    def ensure_fresh(self, db: Session):
+        """Refresh the index before a read, in the background if configured"""
+        if self.built_at is None:
+            # Nothing to serve yet
+            self.refresh(db)
+        elif self._refresh_due():
+            if self.background:
+                self._refresh_in_background()
+            else:
+                self.refresh(db)
+
+    def refresh(self, db: Session):
+        """Bring the index up to date with the database now"""
+        with self._refresh_lock:
+            if self.built_at is None or time.monotonic() - self.built_at > self.max_age_seconds:
+                self._rebuild(db)
+                return
+
+            with self._lock:
+                dirty, self._dirty = self._dirty, set()
+            if dirty:
+                try:
+                    self.update(db, dirty)
+                except Exception:
+                    self.mark_dirty(dirty)
+                    raise
+
+            if self._fingerprint() != self._query_fingerprint(db):
+                self._rebuild(db)
+            else:
+                self.checked_at = time.monotonic()
+
+    def update_now(self, db: Session, ids: Iterable[int]):
+        """Re-derive the entries of ids in the calling thread, e.g. for an id a reader cannot find yet"""
+        with self._refresh_lock:
+            if self.built_at is None:
+                self._rebuild(db)
+            else:
+                self.update(db, set(ids))
+
+    def _rebuild(self, db: Session):
+        # Ids marked during the build stay dirty and are re-applied next time
+        with self._lock:
+            self._dirty.clear()
+        self.build(db)
+        self.built_at = self.checked_at = time.monotonic()
+
+    def _refresh_in_background(self):
+        with self._lock:
+            if self._refresh_thread is not None and self._refresh_thread.is_alive():
+                return
+            self._refresh_thread = threading.Thread(
+                target=self._background_refresh, name=f"{type(self).__name__}-refresh", daemon=True
+            )
+            self._refresh_thread.start()
+
+    def _background_refresh(self):
+        db = self.session_factory()
+        try:
+            self.refresh(db)
+        except Exception as e:
+            print(f"Could not refresh {type(self).__name__}: {e}")
+        finally:
+            db.close()
+
+    def wait(self, timeout: Optional[float] = None):
+        """Wait for a running background refresh"""
+        thread = self._refresh_thread
+        if thread is not None:
+            thread.join(timeout)
+
+
+def track_model_changes(index: DerivedIndex, id_getters: Dict[type, Callable[[Any], Optional[int]]]):
+    """
+    Mark the ids of objects written by committed sessions dirty in an index
+
+    Objects created, edited or deleted in a flush are collected in
+    session.info and handed to index.mark_dirty() on commit; a rollback
+    discards them.
+
+    Args:
+        index: Index to notify
+        id_getters: Model class -> function returning the index id of an
+            instance, e.g. {PropertyImage: lambda image: image.property_id}
+    """
+    key = object()
+    models = tuple(id_getters)
+
+    def collect(session, flush_context):
+        changed = session.info.setdefault(key, set())
+        for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+            if isinstance(obj, models):
+                for model, get_id in id_getters.items():
+                    if isinstance(obj, model):
+                        changed.add(get_id(obj))
+
+    def apply(session):
+        changed = session.info.pop(key, None)
+        if changed:
+            index.mark_dirty(changed)
+
+    def discard(session):
+        session.info.pop(key, None)
+
+    event.listen(Session, "after_flush", collect)
+    event.listen(Session, "after_commit", apply)
+    event.listen(Session, "after_rollback", discard)
@@ -0,0 +1,311 @@
+# app/services/feature_store.py
+import json
+import os
+import threading
+from typing import Dict, Iterable, Optional, Sequence
+
+import numpy as np
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.models import Property
+from app.services.change_window import ChangeWindow
+
+# Number of columns of the architectural feature vectors:
+# [property_type, bedrooms, bathrooms, has_modern, has_traditional, has_colonial, reserved...]
+ARCHITECTURAL_FEATURE_DIM = 20
+
+
+def encode_property_type(property_type: Optional[str]) -> int:
+    """Encode a property type as an integer (0 = unknown)"""
+    if not property_type:
+        return 0
+    property_type = property_type.lower()
+    if "apartment" in property_type:
+        return 1
+    elif "house" in property_type:
+        return 2
+    elif "condo" in property_type:
+        return 3
+    elif "townhouse" in property_type:
+        return 4
+    return 0
+
+
+def encode_architectural_features(rows: Sequence, out: Optional[np.ndarray] = None) -> np.ndarray:
+    """
+    Architectural feature vectors of a chunk of property rows
+
+    Args:
+        rows: Rows with property_type, bedrooms, bathrooms and labels attributes
+        out: Optional (len(rows), ARCHITECTURAL_FEATURE_DIM) float32 array to fill
+
+    Returns:
+        The filled float32 array
+    """
+    if out is None:
+        out = np.zeros((len(rows), ARCHITECTURAL_FEATURE_DIM), dtype=np.float32)
+    else:
+        out[:] = 0
+    for i, prop in enumerate(rows):
+        out[i, 0] = encode_property_type(prop.property_type)
+        out[i, 1] = prop.bedrooms or 0
+        out[i, 2] = prop.bathrooms or 0
+        # Encode architectural style labels
+        for label in prop.labels or []:
+            if isinstance(label, dict) and label.get("name") == "architectural_style":
+                style = str(label.get("value") or "").lower()
+                if "modern" in style:
+                    out[i, 3] = 1
+                if "traditional" in style:
+                    out[i, 4] = 1
+                if "colonial" in style:
+                    out[i, 5] = 1
+    return out
+
+
+class PropertyFeatureStore:
+    """
+    Memory-mapped float32 matrix of property feature vectors
+
+    The store directory holds features.f32 (capacity x dim float32, row-major),
+    ids.i64 (the property id of each row) and meta.json (dim, row count and
+    the ChangeWindow of the last sync: its (updated_at, id) high-water mark
+    and the rows written just below it). Both arrays are
+    np.memmap views of the files, so readers in any process get zero-copy
+    access to the same matrix and writers update rows in place. The id -> row
+    index is rebuilt from ids.i64 on open.
+
+    sync() streams properties changed since the high-water mark in chunks
+    (edits bump updated_at); ensure_fresh() also drops the rows of deleted
+    properties by moving the last row into their slot.
+    """
+
+    def __init__(
+        self,
+        path: Optional[str] = None,
+        dim: int = ARCHITECTURAL_FEATURE_DIM,
+        readonly: bool = False,
+        chunk_size: Optional[int] = None
+    ):
+        self.path = path or settings.FEATURE_STORE_DIR
+        self.dim = dim
+        self.readonly = readonly
+        self.chunk_size = chunk_size or settings.ML_EXTRACT_CHUNK_SIZE
+        self._lock = threading.RLock()
+        self._features: Optional[np.memmap] = None
+        self._ids: Optional[np.memmap] = None
+        self.row_of: Dict[int, int] = {}
+        self.meta: Dict = {}
+
+    # ------------------------------------------------------------------
+    # Storage
+    # ------------------------------------------------------------------
+
+    @property
+    def _meta_path(self) -> str:
+        return os.path.join(self.path, "meta.json")
+
+    def _open(self):
+        if self._features is not None:
+            return
+        try:
+            with open(self._meta_path, "r") as f:
+                self.meta = json.load(f)
+        except (OSError, ValueError):
+            if self.readonly:
+                raise FileNotFoundError(f"No feature store at {self.path}")
+            self.meta = {"dim": self.dim, "rows": 0, "capacity": 0, "high_water_mark": None}
+            os.makedirs(self.path, exist_ok=True)
+            self._resize(1024)
+            self._save_meta()
+            return
+
+        if self.meta["dim"] != self.dim:
+            raise ValueError(f"Feature store has dimension {self.meta['dim']}, expected {self.dim}")
+        self._map()
+        self.row_of = {int(pid): row for row, pid in enumerate(self._ids[:self.meta["rows"]].tolist())}
+
+    def _map(self):
+        mode = "r" if self.readonly else "r+"
+        capacity = self.meta["capacity"]
+        self._features = np.memmap(
+            os.path.join(self.path, "features.f32"), dtype=np.float32, mode=mode, shape=(capacity, self.dim)
+        )
+        self._ids = np.memmap(os.path.join(self.path, "ids.i64"), dtype=np.int64, mode=mode, shape=(capacity,))
+
+    def _resize(self, capacity: int):
+        # Grow the files, then map them again; earlier views stay valid
+        if self._features is not None:
+            self._features.flush()
+            self._ids.flush()
+        for name, itemsize in (("features.f32", 4 * self.dim), ("ids.i64", 8)):
+            with open(os.path.join(self.path, name), "ab") as f:
+                f.truncate(capacity * itemsize)
+        self.meta["capacity"] = capacity
+        self._map()
+
+    def _save_meta(self):
+        # Write then rename so readers never see a partial file
+        tmp_path = f"{self._meta_path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(self.meta, f)
+        os.replace(tmp_path, self._meta_path)
+
+    def flush(self):
+        """Write changed rows and the metadata to disk"""
+        with self._lock:
+            if self._features is None or self.readonly:
+                return
+            self._features.flush()
+            self._ids.flush()
+            self._save_meta()
+
+    # ------------------------------------------------------------------
+    # Reads
+    # ------------------------------------------------------------------
+
+    def __len__(self) -> int:
+        with self._lock:
+            self._open()
+            return self.meta["rows"]
+
+    def matrix(self) -> np.ndarray:
+        """(rows, dim) view of all feature vectors, aligned with ids()"""
+        with self._lock:
+            self._open()
+            return self._features[:self.meta["rows"]]
+
+    def ids(self) -> np.ndarray:
+        """Property id of each row of matrix()"""
+        with self._lock:
+            self._open()
+            return self._ids[:self.meta["rows"]]
+
+    def get(self, property_id: int) -> Optional[np.ndarray]:
+        """View of a property's feature vector, or None if it is not stored"""
+        with self._lock:
+            self._open()
+            row = self.row_of.get(property_id)
+            return None if row is None else self._features[row]
+
+    # ------------------------------------------------------------------
+    # Writes
+    # ------------------------------------------------------------------
+
+    def upsert(self, property_ids: Sequence[int], vectors: np.ndarray):
+        """Overwrite the rows of known properties in place and append the others"""
+        if self.readonly:
+            raise PermissionError("Feature store is read-only")
+        with self._lock:
+            self._open()
+            rows = self.meta["rows"]
+            new_ids = [pid for pid in dict.fromkeys(int(pid) for pid in property_ids) if pid not in self.row_of]
+            if rows + len(new_ids) > self.meta["capacity"]:
+                capacity = self.meta["capacity"]
+                while rows + len(new_ids) > capacity:
+                    capacity *= 2
+                self._resize(capacity)
+            for pid in new_ids:
+                self.row_of[pid] = rows
+                self._ids[rows] = pid
+                rows += 1
+            self.meta["rows"] = rows
+            targets = np.fromiter((self.row_of[int(pid)] for pid in property_ids), dtype=np.int64, count=len(property_ids))
+            self._features[targets] = vectors
+
+    def remove(self, property_ids: Iterable[int]):
+        """Remove properties, moving the last rows into their slots"""
+        if self.readonly:
+            raise PermissionError("Feature store is read-only")
+        with self._lock:
+            self._open()
+            for pid in property_ids:
+                row = self.row_of.pop(int(pid), None)
+                if row is None:
+                    continue
+                last = self.meta["rows"] - 1
+                if row != last:
+                    moved = int(self._ids[last])
+                    self._features[row] = self._features[last]
+                    self._ids[row] = moved
+                    self.row_of[moved] = row
+                self.meta["rows"] = last
+
+    def clear(self):
+        """Drop all rows and the high-water mark"""
+        with self._lock:
+            self._open()
+            self.row_of = {}
+            self.meta["rows"] = 0
+            self.meta["high_water_mark"] = None
+            self.meta["seen"] = {}
+            self.flush()
+
+    # ------------------------------------------------------------------
+    # Synchronization with the database
+    # ------------------------------------------------------------------
+
+    @staticmethod
+    def _feature_query():
+        return select(
+            Property.id, Property.updated_at, Property.property_type,
+            Property.bedrooms, Property.bathrooms, Property.labels
+        )
+
+    def sync(self, db: Session, full_refresh: bool = False) -> int:
+        """
+        Encode properties created or updated since the last sync
+
+        Rows are streamed with yield_per and encoded into one reusable chunk
+        buffer, so memory use does not grow with the table. The overlap below
+        the high-water mark is re-read (see ChangeWindow for its assumptions).
+
+        Args:
+            db: Database session
+            full_refresh: Re-encode every property into an empty store
+
+        Returns:
+            Number of vectors written
+        """
+        with self._lock:
+            if full_refresh:
+                self.clear()
+            self._open()
+
+            query = self._feature_query().order_by(Property.updated_at, Property.id)
+            window = ChangeWindow(self.meta.get("high_water_mark"), self.meta.get("seen"))
+            if window.start() is not None:
+                query = query.where(Property.updated_at >= window.start())
+
+            buffer = np.zeros((self.chunk_size, self.dim), dtype=np.float32)
+            written = 0
+            for chunk in db.execute(query.execution_options(yield_per=self.chunk_size)).partitions():
+                rows = window.new_rows(chunk)
+                window.advance(chunk)
+                if rows:
+                    vectors = encode_architectural_features(rows, buffer[:len(rows)])
+                    self.upsert([row.id for row in rows], vectors)
+                    written += len(rows)
+            self.meta["high_water_mark"], self.meta["seen"] = window.mark, window.seen
+            self.flush()
+            return written
+
+    def ensure_fresh(self, db: Session) -> int:
+        """
+        Sync changed properties and drop the rows of deleted ones
+
+        Returns:
+            Number of vectors written
+        """
+        with self._lock:
+            written = self.sync(db)
+            if len(self) != db.query(func.count(Property.id)).scalar():
+                existing = set(db.execute(select(Property.id)).scalars())
+                self.remove([int(pid) for pid in self.ids() if int(pid) not in existing])
+                self.flush()
+            return written
+
+
+property_feature_store = PropertyFeatureStore()
@@ -1,10 +1,12 @@
 # app/services/floor_plan_analyzer.py
-import base64
+import asyncio
 import json
 import re
 from typing import Dict, Any, List
-from openai import OpenAI
 from app.config import settings
+from app.services.openai_client import openai_client
+from app.services.analysis_cache import analysis_cache, prompt_version
+from app.utils.image_utils import prepare_image_for_vision
 from scipy import ndimage
 import cv2
 import numpy as np
@@ -14,8 +16,8 @@ class FloorPlanAnalysisService:
     """Service for analyzing floor plan images using basic computer vision"""
     
     def __init__(self):
-        # No need for model initialization anymore
-        pass
+        # Computer vision runs locally, only suggestions and materials use OpenAI
+        self.client = openai_client
         
     def analyze_floor_plan(self, image_bytes: bytes) -> Dict[str, Any]:
         """
@@ -112,7 +114,7 @@ class FloorPlanAnalysisService:
             
         return round(sum(scores) / len(scores), 2)
     
-    def generate_optimization_suggestions(self, floor_plan_analysis: Dict[str, Any]) -> List[Dict[str, Any]]:
+    async def generate_optimization_suggestions(self, floor_plan_analysis: Dict[str, Any]) -> List[Dict[str, Any]]:
         """
         Generate architectural optimization suggestions based on floor plan analysis
         
@@ -146,7 +148,7 @@ class FloorPlanAnalysisService:
         """
         
         try:
-            response = self.client.chat.completions.create(
+            response = await self.client.create_chat_completion(
                 model="gpt-4",
                 messages=[
                     {"role": "user", "content": prompt}
@@ -169,7 +171,7 @@ class FloorPlanAnalysisService:
         except Exception:
             return []
     
-    def analyze_construction_materials(self, image_bytes: bytes) -> Dict[str, Any]:
+    async def analyze_construction_materials(self, image_bytes: bytes) -> Dict[str, Any]:
         """
         Analyze construction materials visible in property images
         
@@ -179,9 +181,6 @@ class FloorPlanAnalysisService:
         Returns:
             Dictionary containing identified materials and sustainability metrics
         """
-        # Implementation similar to other methods
-        base64_image = base64.b64encode(image_bytes).decode('utf-8')
-        
         prompt = """
         Analyze this property image and identify construction materials.
         For each material, provide:
@@ -191,23 +190,78 @@ class FloorPlanAnalysisService:
         4. Durability rating (1-10)
         5. Maintenance requirements
         
-        Return as structured JSON.
+        Return as structured JSON of the form {"materials": [{"type": ..., "cost_tier": ...,
+        "sustainability": ..., "durability": ..., "maintenance": ...}]}.
         """
         
-        # Implementation would continue similar to analyze_floor_plan
-        # For brevity, returning placeholder
-        return {
-            "status": "success",
-            "materials": [
-                {
-                    "type": "Example material",
-                    "cost_tier": "medium",
-                    "sustainability": 7,
-                    "durability": 8,
-                    "maintenance": "Low maintenance, periodic sealing"
-                }
-            ]
-        }
+        return await analysis_cache.get_or_compute(
+            image_bytes,
+            "construction_materials",
+            prompt_version(prompt),
+            lambda: self._request_materials(image_bytes, prompt)
+        )
+    
+    async def _request_materials(self, image_bytes: bytes, prompt: str) -> Dict[str, Any]:
+        """
+        Send a property image to the OpenAI Vision API and parse the materials
+        
+        Args:
+            image_bytes: Image data in bytes
+            prompt: Materials analysis prompt
+            
+        Returns:
+            Dictionary containing identified materials
+        """
+        # Downscale and re-encode off the event loop
+        prepared = await asyncio.to_thread(prepare_image_for_vision, image_bytes)
+        
+        try:
+            response = await self.client.create_chat_completion(
+                model="gpt-4o",
+                messages=[
+                    {
+                        "role": "user",
+                        "content": [
+                            {"type": "text", "text": prompt},
+                            {
+                                "type": "image_url",
+                                "image_url": {
+                                    "url": prepared.data_url
+                                }
+                            }
+                        ]
+                    }
+                ],
+                max_tokens=600
+            )
+            
+            content = response.choices[0].message.content
+            
+            # Extract JSON
+            json_match = re.search(r'\{.*\}', content, re.DOTALL | re.MULTILINE)
+            if json_match:
+                try:
+                    result = json.loads(json_match.group(0))
+                    return {
+                        "status": "success",
+                        "materials": result.get("materials", [])
+                    }
+                except json.JSONDecodeError:
+                    return {
+                        "status": "error",
+                        "message": "Could not parse JSON from response"
+                    }
+            
+            return {
+                "status": "error",
+                "message": "No materials found in response"
+            }
+        
+        except Exception as e:
+            return {
+                "status": "error",
+                "message": str(e)
+            }
         
 # -----
 '''
@@ -1,16 +1,18 @@
-import base64
+import asyncio
 import json
 import re
 from typing import Dict, Any, List
-from openai import OpenAI
 from app.config import settings
+from app.services.openai_client import openai_client
+from app.services.analysis_cache import analysis_cache, prompt_version
+from app.utils.image_utils import prepare_image_for_vision
 
 class SimpleImageAnalysisService:
     def __init__(self):
         self.api_key = settings.OPENAI_API_KEY
-        self.client = OpenAI(api_key=self.api_key)
+        self.client = openai_client
     
-    def _extract_features(self, image_bytes: bytes, analysis_type: str) -> Dict[str, Any]:
+    async def _extract_features(self, image_bytes: bytes, analysis_type: str) -> Dict[str, Any]:
         """
         Extract features from an image using OpenAI Vision API
         
@@ -21,9 +23,6 @@ class SimpleImageAnalysisService:
         Returns:
             Dictionary of extracted features
         """
-        # Encode image to base64
-        base64_image = base64.b64encode(image_bytes).decode('utf-8')
-        
         # Customize prompt based on analysis type
         if analysis_type == 'tenant_preference':
             prompt = (
@@ -48,8 +47,30 @@ class SimpleImageAnalysisService:
                 "}"
             )
         
+        # Identical images analyzed with the same prompt are served from the cache
+        return await analysis_cache.get_or_compute(
+            image_bytes,
+            analysis_type,
+            prompt_version(prompt),
+            lambda: self._request_features(image_bytes, prompt)
+        )
+    
+    async def _request_features(self, image_bytes: bytes, prompt: str) -> Dict[str, Any]:
+        """
+        Send an image and prompt to the OpenAI Vision API and parse the features
+        
+        Args:
+            image_bytes: Image data in bytes
+            prompt: Analysis prompt
+        
+        Returns:
+            Dictionary of extracted features
+        """
+        # Downscale and re-encode off the event loop
+        prepared = await asyncio.to_thread(prepare_image_for_vision, image_bytes)
+        
         try:
-            response = self.client.chat.completions.create(
+            response = await self.client.create_chat_completion(
                 model="gpt-4o",
                 messages=[
                     {
@@ -59,7 +80,7 @@ class SimpleImageAnalysisService:
                             {
                                 "type": "image_url",
                                 "image_url": {
-                                    "url": f"data:image/jpeg;base64,{base64_image}"
+                                    "url": prepared.data_url
                                 }
                             }
                         ]
@@ -143,7 +164,7 @@ class SimpleImageAnalysisService:
         
         return normalized_features
     
-    def analyze_tenant_preference_image(self, image_bytes: bytes) -> Dict[str, Any]:
+    async def analyze_tenant_preference_image(self, image_bytes: bytes) -> Dict[str, Any]:
         """
         Analyze an image uploaded by a tenant representing their ideal home
         
@@ -153,9 +174,9 @@ class SimpleImageAnalysisService:
         Returns:
             Analyzed features of the ideal home
         """
-        return self._extract_features(image_bytes, 'tenant_preference')
+        return await self._extract_features(image_bytes, 'tenant_preference')
     
-    def analyze_property_listing_image(self, image_bytes: bytes) -> Dict[str, Any]:
+    async def analyze_property_listing_image(self, image_bytes: bytes) -> Dict[str, Any]:
         """
         Analyze an image uploaded by a landlord of their property
         
@@ -165,4 +186,4 @@ class SimpleImageAnalysisService:
         Returns:
             Analyzed features of the property
         """
-        return self._extract_features(image_bytes, 'property_listing')
\ No newline at end of file
+        return await self._extract_features(image_bytes, 'property_listing')
\ No newline at end of file
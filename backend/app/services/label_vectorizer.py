@@ -0,0 +1,228 @@
+# app/services/label_vectorizer.py
+import json
+import os
+import re
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+import scipy.sparse as sp
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.models import Property, PropertyLabel
+from app.services.architectural_classifier import ArchitecturalStyleClassifier
+
+STYLE_LABEL = "architectural_style"
+
+
+def normalize_term(text: Any) -> str:
+    """Lowercase a label name or value and join its words with underscores"""
+    return re.sub(r"[^a-z0-9]+", "_", str(text).lower()).strip("_")
+
+
+def label_terms(name: Optional[str], value: Any = None, label_type: Optional[str] = None) -> List[str]:
+    """
+    Vocabulary terms of one label
+
+    Styles become 'style:<value>', materials 'material:<value>', other
+    primary attributes '<name>:<value>' and everything else (the additional
+    features) 'feature:<name>'.
+    """
+    name = normalize_term(name or "")
+    if not name:
+        return []
+    value = normalize_term(value) if value not in (None, "") else ""
+    if name == STYLE_LABEL:
+        return [f"style:{value}"] if value else []
+    if "material" in name:
+        return [f"material:{value or name}"]
+    if label_type == "primary_attribute" and value:
+        return [f"{name}:{value}"]
+    return [f"feature:{name}"]
+
+
+def seed_vocabulary() -> List[str]:
+    """Terms of the styles known to ArchitecturalStyleClassifier with their features and materials"""
+    terms = []
+    for style, info in ArchitecturalStyleClassifier().styles.items():
+        terms.append(f"style:{normalize_term(style)}")
+        terms.extend(f"feature:{normalize_term(feature)}" for feature in info.get("features", []))
+        terms.extend(f"material:{normalize_term(material)}" for material in info.get("materials", []))
+    return list(dict.fromkeys(terms))
+
+
+class LabelVectorizer:
+    """
+    Multi-hot / TF-IDF encoding of property labels as a sparse CSR matrix
+
+    The vocabulary starts with the styles, features and materials of
+    ArchitecturalStyleClassifier and grows with the label terms observed in
+    property_labels; column indices never change once assigned, so matrices
+    encoded later stay compatible with earlier ones (they are only wider).
+    Document frequencies are kept with the vocabulary for the IDF weights.
+    Both are persisted as JSON so new properties can be encoded incrementally
+    with transform() instead of refitting.
+    """
+
+    def __init__(self, weighting: str = "tfidf", min_confidence: float = 0.0):
+        if weighting not in ("tfidf", "binary"):
+            raise ValueError(f"Unknown weighting: {weighting}")
+        self.weighting = weighting
+        self.min_confidence = min_confidence
+        self.vocabulary: Dict[str, int] = {}
+        self.document_frequency: List[int] = []
+        self.n_documents = 0
+        self._add_terms(seed_vocabulary())
+
+    def _add_terms(self, terms: Iterable[str]):
+        for term in terms:
+            if term not in self.vocabulary:
+                self.vocabulary[term] = len(self.vocabulary)
+                self.document_frequency.append(0)
+
+    @property
+    def terms(self) -> List[str]:
+        """Vocabulary terms in column order"""
+        return list(self.vocabulary)
+
+    # ------------------------------------------------------------------
+    # Encoding
+    # ------------------------------------------------------------------
+
+    def _label_columns(self, labels: Iterable[Tuple[Any, Any, Any, Any]], grow: bool) -> List[int]:
+        columns = set()
+        for name, value, confidence, label_type in labels:
+            if confidence is not None and confidence < self.min_confidence:
+                continue
+            for term in label_terms(name, value, label_type):
+                if grow:
+                    self._add_terms([term])
+                column = self.vocabulary.get(term)
+                if column is not None:
+                    columns.add(column)
+        return sorted(columns)
+
+    def _to_matrix(self, rows: List[List[int]]) -> sp.csr_matrix:
+        indptr = np.zeros(len(rows) + 1, dtype=np.int64)
+        indptr[1:] = np.cumsum([len(columns) for columns in rows])
+        indices = np.fromiter((c for columns in rows for c in columns), dtype=np.int32, count=int(indptr[-1]))
+        data = np.ones(indices.shape[0], dtype=np.float32)
+        matrix = sp.csr_matrix((data, indices, indptr), shape=(len(rows), len(self.vocabulary)))
+        return self._weight(matrix)
+
+    def _weight(self, matrix: sp.csr_matrix) -> sp.csr_matrix:
+        if self.weighting == "binary":
+            return matrix
+        # Smoothed IDF (as scikit-learn's TfidfTransformer), then L2-normalized rows
+        df = np.asarray(self.document_frequency, dtype=np.float32)
+        idf = np.log((1.0 + self.n_documents) / (1.0 + df)) + 1.0
+        matrix = matrix.multiply(idf[None, :]).tocsr().astype(np.float32)
+        norms = np.sqrt(np.asarray(matrix.multiply(matrix).sum(axis=1)).ravel())
+        norms[norms == 0] = 1.0
+        return sp.csr_matrix(sp.diags(1.0 / norms).dot(matrix), dtype=np.float32)
+
+    def fit_transform(self, db: Session, chunk_size: Optional[int] = None) -> Tuple[np.ndarray, sp.csr_matrix]:
+        """
+        Encode every property in one pass over property_labels
+
+        Labels are streamed in property order, the vocabulary grows with new
+        terms and document frequencies are recounted.
+
+        Returns:
+            (property ids, CSR matrix with one row per property)
+        """
+        chunk_size = chunk_size or settings.ML_EXTRACT_CHUNK_SIZE
+        property_ids = np.array(db.execute(select(Property.id).order_by(Property.id)).scalars().all(), dtype=np.int64)
+        row_of = {pid: row for row, pid in enumerate(property_ids.tolist())}
+        rows: List[List[int]] = [[] for _ in range(len(property_ids))]
+
+        query = select(
+            PropertyLabel.property_id, PropertyLabel.name, PropertyLabel.value,
+            PropertyLabel.confidence, PropertyLabel.type
+        ).order_by(PropertyLabel.property_id)
+        labels_by_property: Dict[int, list] = {}
+        for chunk in db.execute(query.execution_options(yield_per=chunk_size)).partitions():
+            for property_id, *label in chunk:
+                labels_by_property.setdefault(property_id, []).append(label)
+            # Rows are complete once a later property id has been seen
+            last = chunk[-1].property_id
+            for property_id in [pid for pid in labels_by_property if pid != last]:
+                self._encode_into(rows, row_of, property_id, labels_by_property.pop(property_id))
+        for property_id, labels in labels_by_property.items():
+            self._encode_into(rows, row_of, property_id, labels)
+
+        self.n_documents = len(rows)
+        self.document_frequency = [0] * len(self.vocabulary)
+        for columns in rows:
+            for column in columns:
+                self.document_frequency[column] += 1
+        return property_ids, self._to_matrix(rows)
+
+    def _encode_into(self, rows, row_of, property_id: int, labels):
+        row = row_of.get(property_id)
+        if row is not None:
+            rows[row] = self._label_columns(labels, grow=True)
+
+    def transform(self, labels_per_row: Sequence[Optional[list]], update: bool = False) -> sp.csr_matrix:
+        """
+        Encode labels JSON lists with the current vocabulary
+
+        Args:
+            labels_per_row: Property.labels-style lists, one per row
+            update: Add unseen terms to the vocabulary and count the rows in
+                the document frequencies (for newly added properties)
+
+        Returns:
+            CSR matrix with len(vocabulary) columns
+        """
+        rows = []
+        for labels in labels_per_row:
+            entries = [
+                (label.get("name"), label.get("value"), label.get("confidence"), label.get("type"))
+                for label in labels or [] if isinstance(label, dict)
+            ]
+            rows.append(self._label_columns(entries, grow=update))
+        if update:
+            self.n_documents += len(rows)
+            for columns in rows:
+                for column in columns:
+                    self.document_frequency[column] += 1
+        return self._to_matrix(rows)
+
+    # ------------------------------------------------------------------
+    # Persistence
+    # ------------------------------------------------------------------
+
+    def save(self, path: str):
+        """Persist the vocabulary and document frequencies as JSON"""
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        state = {
+            "weighting": self.weighting,
+            "min_confidence": self.min_confidence,
+            "terms": self.terms,
+            "document_frequency": self.document_frequency,
+            "n_documents": self.n_documents,
+        }
+        # Write then rename so readers never see a partial file
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(state, f)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str) -> "LabelVectorizer":
+        """Load a vectorizer saved with save()"""
+        with open(path, "r") as f:
+            state = json.load(f)
+        vectorizer = cls(weighting=state["weighting"], min_confidence=state["min_confidence"])
+        # Keep the persisted column order, seed terms added since then go last
+        persisted = set(state["terms"])
+        seeded = [term for term in vectorizer.terms if term not in persisted]
+        vectorizer.vocabulary = {}
+        vectorizer.document_frequency = []
+        vectorizer._add_terms(state["terms"])
+        vectorizer.document_frequency = list(state["document_frequency"])
+        vectorizer._add_terms(seeded)
+        vectorizer.n_documents = state["n_documents"]
+        return vectorizer
@@ -1,5 +1,5 @@
 from sqlalchemy.orm import Session
-from typing import List, Optional
+from typing import Iterable, List, Optional, Set
 from app.models import Property, User, Interaction
 from app.utils.geo_utils import get_nearby_properties
 
@@ -21,6 +21,52 @@ class MapService:
         
         return bool(interaction)
     
+    def get_interacted_property_ids(
+        self,
+        user_id: int,
+        property_ids: Iterable[int],
+        actions: Optional[List[str]] = None
+    ) -> Set[int]:
+        """
+        Get the subset of property_ids the user has interacted with, in a single IN query
+        """
+        property_ids = list(property_ids)
+        if not property_ids:
+            return set()
+        
+        query = self.db.query(Interaction.property_id).filter(
+            Interaction.user_id == user_id,
+            Interaction.property_id.in_(property_ids)
+        )
+        if actions:
+            query = query.filter(Interaction.action.in_(actions))
+        
+        return {row[0] for row in query.distinct().all()}
+    
+    def _build_map_payload(self, properties: List[Property], interacted_ids: Set[int], **extra) -> List[dict]:
+        """
+        Build the map pin payload for a page of properties without further queries
+        """
+        result = []
+        for prop in properties:
+            prop_dict = {
+                "id": prop.id,
+                "title": prop.title,
+                "price": prop.price,
+                "latitude": prop.latitude,
+                "longitude": prop.longitude,
+                "image_url": prop.image_url,
+                "address": prop.address,
+                "city": prop.city,
+                "has_interacted": prop.id in interacted_ids,
+                "distance_to_core": prop.distance_to_core,
+                "distance": getattr(prop, "distance", None)
+            }
+            prop_dict.update(extra)
+            result.append(prop_dict)
+        
+        return result
+    
     def get_properties_for_map(
         self,
         user: User,
@@ -42,41 +88,17 @@ class MapService:
         
         # Get properties based on location
         if latitude and longitude:
-            # Get properties within radius
-            properties = get_nearby_properties(self.db, latitude, longitude, radius)
-            # Limit results
-            properties = properties[:limit]
+            # Get properties within radius, combined with the filters above
+            properties = get_nearby_properties(
+                self.db, latitude, longitude, radius, query=query, limit=limit
+            )
         else:
             # If no location provided, sort by proximity to CMU
             properties = query.order_by(Property.distance_to_core).limit(limit).all()
         
-        # Enhanced response with user-specific data
-        result = []
-        for prop in properties:
-            # Check if user has interacted with this property
-            interaction = self.db.query(Interaction).filter(
-                Interaction.user_id == user.id,
-                Interaction.property_id == prop.id
-            ).first()
-            
-            # Create response dictionary
-            prop_dict = {
-                "id": prop.id,
-                "title": prop.title,
-                "price": prop.price,
-                "latitude": prop.latitude,
-                "longitude": prop.longitude,
-                "image_url": prop.image_url,
-                "address": prop.address,
-                "city": prop.city,
-                "has_interacted": bool(interaction),
-                "distance_to_core": prop.distance_to_core,
-                "distance": getattr(prop, "distance", None)
-            }
-            
-            result.append(prop_dict)
-        
-        return result
+        # Enhanced response with user-specific data, one interaction query for the whole page
+        interacted_ids = self.get_interacted_property_ids(user.id, [prop.id for prop in properties])
+        return self._build_map_payload(properties, interacted_ids)
     
     def get_personalized_map_recommendations(
         self,
@@ -89,16 +111,16 @@ class MapService:
         Get personalized property recommendations for the map based on user preferences
         and interaction history
         """
-        # Get user's interactions to determine preferences
-        user_interactions = self.db.query(Interaction).filter(
-            Interaction.user_id == user.id,
-            Interaction.action.in_(["view", "like", "save"])
-        ).all()
+        # Get the properties the user has interacted with to determine preferences
+        interacted_property_ids = [
+            row[0] for row in self.db.query(Interaction.property_id).filter(
+                Interaction.user_id == user.id,
+                Interaction.action.in_(["view", "like", "save"])
+            ).distinct().all()
+        ]
         
         # If user has interactions, use them to determine preferences
-        if user_interactions:
-            # Get properties the user has interacted with
-            interacted_property_ids = [i.property_id for i in user_interactions]
+        if interacted_property_ids:
             interacted_properties = self.db.query(Property).filter(
                 Property.id.in_(interacted_property_ids)
             ).all()
@@ -116,13 +138,10 @@ class MapService:
                 
                 # If location provided, use it to sort
                 if latitude and longitude:
-                    properties = get_nearby_properties(self.db, latitude, longitude)
-                    # Filter by price range
-                    properties = [p for p in properties if price_range[0] <= p.price <= price_range[1]]
-                    # Filter out already interacted properties
-                    properties = [p for p in properties if p.id not in interacted_property_ids]
-                    # Limit results
-                    properties = properties[:limit]
+                    # Price range and interaction filters are applied in SQL
+                    properties = get_nearby_properties(
+                        self.db, latitude, longitude, query=query, limit=limit
+                    )
                 else:
                     # Sort by proximity to CMU
                     properties = query.order_by(Property.distance_to_core).limit(limit).all()
@@ -139,23 +158,10 @@ class MapService:
             )
             return properties
         
-        # Format response
-        result = []
-        for prop in properties:
-            prop_dict = {
-                "id": prop.id,
-                "title": prop.title,
-                "price": prop.price,
-                "latitude": prop.latitude,
-                "longitude": prop.longitude,
-                "image_url": prop.image_url,
-                "address": prop.address,
-                "city": prop.city,
-                "distance_to_core": prop.distance_to_core,
-                "distance": getattr(prop, "distance", None),
-                "recommendation_reason": "Based on your browsing history"
-            }
-            
-            result.append(prop_dict)
-        
-        return result
\ No newline at end of file
+        # Format response; view/like/save were excluded above, clicks and comments are not
+        interacted_ids = self.get_interacted_property_ids(user.id, [prop.id for prop in properties])
+        return self._build_map_payload(
+            properties,
+            interacted_ids,
+            recommendation_reason="Based on your browsing history"
+        )
@@ -0,0 +1,272 @@
+# app/services/message_broker.py
+import asyncio
+import contextlib
+import json
+import threading
+from abc import ABC, abstractmethod
+from typing import Dict, Optional, Set
+
+from fastapi import WebSocket
+from sqlalchemy.engine import make_url
+
+from app.config import settings
+
+
+class MessageBroker(ABC):
+    """
+    Fan-out of chat messages to the WebSockets subscribed to a room
+
+    Each worker process keeps the sockets connected to it. publish() hands a
+    message to the backend, which makes sure every worker delivers it to its
+    local sockets. Local delivery sends to all sockets of a room concurrently;
+    a socket that errors or does not accept the message within send_timeout
+    seconds is closed (1011) and dropped so one slow client cannot hold up
+    the others, and the client knows to reconnect.
+    """
+
+    def __init__(self, send_timeout: float = 5.0):
+        self.send_timeout = send_timeout
+        self.local_connections: Dict[str, Set[WebSocket]] = {}
+
+    async def start(self):
+        """Start the backend (idempotent)"""
+
+    async def stop(self):
+        """Stop the backend and release its resources"""
+
+    async def connect(self, room_id: str, websocket: WebSocket):
+        """Subscribe an accepted WebSocket to a room"""
+        await self.start()
+        self.local_connections.setdefault(room_id, set()).add(websocket)
+
+    async def disconnect(self, room_id: str, websocket: WebSocket):
+        """Unsubscribe a WebSocket from a room"""
+        sockets = self.local_connections.get(room_id)
+        if sockets is None:
+            return
+        sockets.discard(websocket)
+        if not sockets:
+            del self.local_connections[room_id]
+
+    @abstractmethod
+    async def publish(self, room_id: str, message: str):
+        """Deliver a message to every socket in the room, across all workers"""
+
+    async def deliver_local(self, room_id: str, message: str) -> int:
+        """
+        Send a message to the sockets of a room connected to this process
+
+        Returns:
+            Number of sockets the message was delivered to
+        """
+        sockets = list(self.local_connections.get(room_id, ()))
+        if not sockets:
+            return 0
+
+        results = await asyncio.gather(
+            *(asyncio.wait_for(ws.send_text(message), timeout=self.send_timeout) for ws in sockets),
+            return_exceptions=True
+        )
+
+        delivered = 0
+        dropped = []
+        for ws, result in zip(sockets, results):
+            if isinstance(result, BaseException):
+                print(f"Error sending message to WebSocket in room {room_id}: {result!r}")
+                await self.disconnect(room_id, ws)
+                dropped.append(ws)
+            else:
+                delivered += 1
+        if dropped:
+            await asyncio.gather(*(self._close(ws) for ws in dropped))
+        return delivered
+
+    async def _close(self, websocket: WebSocket):
+        # 1011 (internal error) tells the client to reconnect; the socket may already be gone
+        with contextlib.suppress(Exception):
+            await asyncio.wait_for(websocket.close(code=1011), timeout=self.send_timeout)
+
+
+class InProcessBroker(MessageBroker):
+    """Broker for a single worker process: publishing is local delivery"""
+
+    async def publish(self, room_id: str, message: str):
+        await self.deliver_local(room_id, message)
+
+
+class PostgresBroker(MessageBroker):
+    """
+    Broker that fans out across workers with Postgres LISTEN/NOTIFY
+
+    Every worker LISTENs on one channel and publishes with pg_notify; the
+    notification carries the room id and the message, and each worker
+    (including the publisher) delivers it to its local sockets. The listening
+    connection is polled from the event loop, so no thread is blocked on it.
+    Postgres limits NOTIFY payloads to 8000 bytes; larger messages are only
+    delivered to sockets on the publishing worker.
+
+    If the listening connection dies it is re-established with exponential
+    backoff (TCP keepalives detect dead peers); until then, and whenever
+    NOTIFY fails, messages are delivered to local sockets only. Notifications
+    sent while a worker was disconnected are not replayed.
+    """
+
+    MAX_PAYLOAD_BYTES = 7999
+    RECONNECT_MAX_DELAY = 30.0
+    # libpq keepalives, so a silently dropped connection errors within about a minute
+    CONNECT_KWARGS = {"keepalives": 1, "keepalives_idle": 30, "keepalives_interval": 10, "keepalives_count": 3}
+
+    def __init__(self, database_url: str, channel: str = "uninest_messages", send_timeout: float = 5.0):
+        super().__init__(send_timeout=send_timeout)
+        # psycopg2 expects a plain libpq URL without the SQLAlchemy driver suffix
+        self.dsn = make_url(database_url).set(drivername="postgresql").render_as_string(hide_password=False)
+        self.channel = channel
+        self._listen_conn = None
+        self._publish_conn = None
+        self._publish_lock = threading.Lock()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._start_lock = asyncio.Lock()
+        self._reconnect_task: Optional[asyncio.Task] = None
+        self._stopped = False
+
+    async def start(self):
+        if self._listen_conn is not None:
+            return
+        async with self._start_lock:
+            if self._listen_conn is not None:
+                return
+            import psycopg2
+            from psycopg2.extensions import ISOLATION_LEVEL_AUTOCOMMIT
+
+            self._stopped = False
+            self._loop = asyncio.get_running_loop()
+            conn = await self._loop.run_in_executor(None, self._connect)
+            conn.set_isolation_level(ISOLATION_LEVEL_AUTOCOMMIT)
+            with conn.cursor() as cursor:
+                cursor.execute(f'LISTEN "{self.channel}";')
+            self._loop.add_reader(conn.fileno(), self._on_notify)
+            self._listen_conn = conn
+
+    async def connect(self, room_id: str, websocket: WebSocket):
+        # Chat keeps working on this worker while Postgres is unreachable
+        self.local_connections.setdefault(room_id, set()).add(websocket)
+        try:
+            await self.start()
+        except Exception as e:
+            print(f"ERROR: Postgres LISTEN connection failed, cross-worker chat delivery is down: {e!r}")
+            self._schedule_reconnect()
+
+    def _connect(self):
+        import psycopg2
+
+        return psycopg2.connect(self.dsn, **self.CONNECT_KWARGS)
+
+    async def stop(self):
+        self._stopped = True
+        if self._reconnect_task is not None:
+            self._reconnect_task.cancel()
+            self._reconnect_task = None
+        self._drop_listen_connection()
+        with self._publish_lock:
+            if self._publish_conn is not None:
+                self._publish_conn.close()
+                self._publish_conn = None
+
+    async def publish(self, room_id: str, message: str):
+        payload = json.dumps({"room_id": room_id, "message": message})
+        if len(payload.encode("utf-8")) > self.MAX_PAYLOAD_BYTES:
+            print(f"Message for room {room_id} exceeds the NOTIFY payload limit, delivering locally only")
+            await self.deliver_local(room_id, message)
+            return
+        if self._reconnect_task is not None and not self._reconnect_task.done():
+            # Postgres is unreachable, don't wait for another connect attempt
+            await self.deliver_local(room_id, message)
+            return
+        try:
+            await self.start()
+            await self._loop.run_in_executor(None, self._notify, payload)
+        except Exception as e:
+            print(f"ERROR: Postgres NOTIFY failed, delivering message for room {room_id} locally only: {e!r}")
+            self._schedule_reconnect()
+            await self.deliver_local(room_id, message)
+
+    def _notify(self, payload: str):
+        from psycopg2.extensions import ISOLATION_LEVEL_AUTOCOMMIT
+
+        with self._publish_lock:
+            if self._publish_conn is None or self._publish_conn.closed:
+                self._publish_conn = self._connect()
+                self._publish_conn.set_isolation_level(ISOLATION_LEVEL_AUTOCOMMIT)
+            try:
+                with self._publish_conn.cursor() as cursor:
+                    cursor.execute("SELECT pg_notify(%s, %s)", (self.channel, payload))
+            except Exception:
+                # Reconnect on the next publish
+                with contextlib.suppress(Exception):
+                    self._publish_conn.close()
+                self._publish_conn = None
+                raise
+
+    def _drop_listen_connection(self):
+        conn, self._listen_conn = self._listen_conn, None
+        if conn is None:
+            return
+        with contextlib.suppress(Exception):
+            self._loop.remove_reader(conn.fileno())
+        with contextlib.suppress(Exception):
+            conn.close()
+
+    def _schedule_reconnect(self):
+        if self._stopped or self._loop is None:
+            return
+        if self._reconnect_task is None or self._reconnect_task.done():
+            self._reconnect_task = self._loop.create_task(self._reconnect())
+
+    async def _reconnect(self):
+        """Re-establish the listening connection with exponential backoff"""
+        delay = 1.0
+        while not self._stopped and self._listen_conn is None:
+            try:
+                await self.start()
+                print(f"Postgres LISTEN connection on {self.channel!r} re-established")
+                return
+            except Exception as e:
+                print(
+                    f"ERROR: Postgres LISTEN reconnect failed, cross-worker chat delivery is down "
+                    f"(retrying in {delay:.0f}s): {e!r}"
+                )
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, self.RECONNECT_MAX_DELAY)
+
+    def _on_notify(self):
+        """Event loop reader callback: drain notifications from the listening connection"""
+        try:
+            self._listen_conn.poll()
+        except Exception as e:
+            print(
+                f"ERROR: Postgres LISTEN connection lost, cross-worker chat delivery is down "
+                f"until it reconnects: {e!r}"
+            )
+            self._drop_listen_connection()
+            self._schedule_reconnect()
+            return
+        while self._listen_conn.notifies:
+            notify = self._listen_conn.notifies.pop(0)
+            try:
+                data = json.loads(notify.payload)
+            except ValueError:
+                continue
+            self._loop.create_task(self.deliver_local(data["room_id"], data["message"]))
+
+
+def create_broker(backend: Optional[str] = None) -> MessageBroker:
+    """Create the broker configured by settings.MESSAGE_BROKER ('memory' or 'postgres')"""
+    backend = (backend or settings.MESSAGE_BROKER).lower()
+    if backend == "memory":
+        return InProcessBroker()
+    if backend == "postgres":
+        return PostgresBroker(settings.DATABASE_URL)
+    raise ValueError(f"Unknown message broker backend: {backend}")
+
+
+broker = create_broker()
@@ -1,64 +1,278 @@
 # app/services/ml_data_pipeline.py
-from typing import List, Dict, Any, Optional, Tuple
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import List, Dict, Any, Iterator, Optional, Sequence, Tuple
 import json
 import os
+import shutil
 import pandas as pd
 import numpy as np
+import scipy.sparse as sp
+from sqlalchemy import DateTime, select, tuple_
 from sqlalchemy.orm import Session
 from app.models import Property, PropertyImage, User, UserPreference
 from app.config import settings
+from app.services.feature_store import (
+    ARCHITECTURAL_FEATURE_DIM,
+    PropertyFeatureStore,
+    encode_property_type,
+    property_feature_store,
+)
+from app.services.change_window import ChangeWindow
+from app.services.collaborative_filtering import CollaborativeFilteringModel, train_collaborative_filtering_model
+from app.services.label_vectorizer import LabelVectorizer
+
+
+def _feature_value(value: Any) -> Optional[str]:
+    """
+    Label value as a string column entry
+
+    Vision output mixes strings, numbers and objects, which Parquet cannot
+    store in one column; everything but strings and None is JSON-encoded.
+    """
+    if value is None or isinstance(value, str):
+        return value
+    return json.dumps(value, sort_keys=True)
+
+
+@dataclass
+class DatasetUpdate:
+    """Summary of one incremental extraction run"""
+    name: str
+    path: str
+    rows_written: int
+    partitions_written: int
+    high_water_mark: Optional[list]
+    columns: List[str] = field(default_factory=list)
+    sample: List[Dict[str, Any]] = field(default_factory=list)
+
+
+class ParquetDataset:
+    """
+    Append-only dataset of Parquet partitions with a high-water mark
+
+    Each extraction chunk becomes one part-NNNNNN.parquet file; _state.json
+    records the partitions and the position (e.g. [updated_at, id]) of the
+    last row written, so the next run resumes after it (for timestamp marks,
+    together with the rows written within the ChangeWindow overlap). Rows
+    that changed after being written are appended again; read() keeps the
+    latest version of each key.
+    """
+
+    STATE_FILE = "_state.json"
+
+    def __init__(self, root: str, name: str):
+        self.name = name
+        self.path = os.path.join(root, name)
+        os.makedirs(self.path, exist_ok=True)
+        self.state = self._load_state()
+
+    def _load_state(self) -> Dict[str, Any]:
+        try:
+            with open(os.path.join(self.path, self.STATE_FILE), "r") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {"partitions": [], "high_water_mark": None, "rows": 0}
+
+    def _save_state(self):
+        # Write then rename so a crash never leaves a partial state file
+        path = os.path.join(self.path, self.STATE_FILE)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(self.state, f)
+        os.replace(tmp_path, path)
+
+    @property
+    def high_water_mark(self) -> Optional[list]:
+        return self.state["high_water_mark"]
+
+    @property
+    def partitions(self) -> List[str]:
+        return [os.path.join(self.path, name) for name in self.state["partitions"]]
+
+    def append(self, df: pd.DataFrame, high_water_mark: list, seen: Optional[Dict[str, str]] = None) -> str:
+        """Write a chunk as a new partition and advance the high-water mark past it"""
+        name = f"part-{len(self.state['partitions']):06d}.parquet"
+        path = os.path.join(self.path, name)
+        tmp_path = f"{path}.tmp"
+        df.to_parquet(tmp_path, index=False)
+        os.replace(tmp_path, path)
+        # The state only references the partition once it is complete
+        self.state["partitions"].append(name)
+        self.state["high_water_mark"] = high_water_mark
+        if seen is not None:
+            self.state["seen"] = seen
+        self.state["rows"] += len(df)
+        self._save_state()
+        return path
+
+    def iter_partitions(self, columns: Optional[Sequence[str]] = None) -> Iterator[pd.DataFrame]:
+        """Read the partitions one at a time, oldest first"""
+        for path in self.partitions:
+            yield pd.read_parquet(path, columns=columns)
+
+    def read(self, columns: Optional[Sequence[str]] = None, key: Optional[str] = "id") -> pd.DataFrame:
+        """Read the whole dataset, keeping only the latest row of each key"""
+        frames = list(self.iter_partitions(columns))
+        if not frames:
+            return pd.DataFrame(columns=list(columns) if columns else None)
+        df = pd.concat(frames, ignore_index=True, sort=False)
+        if key is not None and key in df.columns:
+            df = df.drop_duplicates(subset=key, keep="last").reset_index(drop=True)
+        return df
+
+    def reset(self):
+        """Delete all partitions and the high-water mark"""
+        shutil.rmtree(self.path, ignore_errors=True)
+        os.makedirs(self.path, exist_ok=True)
+        self.state = {"partitions": [], "high_water_mark": None, "rows": 0}
+
 
 class MLDataPipelineService:
-    """Service for preparing architectural data for machine learning pipelines"""
+    """
+    Service for preparing architectural data for machine learning pipelines
+
+    Table extractors stream rows with yield_per in chunks of
+    settings.ML_EXTRACT_CHUNK_SIZE and append each chunk as a Parquet
+    partition of a ParquetDataset under data_path. Each run only reads rows
+    past the dataset's high-water mark, so memory use is bounded by the chunk
+    size and repeated runs only process new or changed rows.
+    """
     
-    def __init__(self, db: Session):
+    def __init__(
+        self,
+        db: Session,
+        chunk_size: Optional[int] = None,
+        data_path: Optional[str] = None,
+        feature_store: Optional[PropertyFeatureStore] = None
+    ):
         self.db = db
-        self.data_path = os.path.join(os.getcwd(), "app/data")
+        self.chunk_size = chunk_size or settings.ML_EXTRACT_CHUNK_SIZE
+        self.feature_store = feature_store if feature_store is not None else property_feature_store
+        self.data_path = data_path or os.path.join(os.getcwd(), "app/data")
         os.makedirs(self.data_path, exist_ok=True)
     
-    def extract_property_features_dataset(self) -> pd.DataFrame:
+    def dataset(self, name: str) -> ParquetDataset:
+        """Parquet dataset of an extractor, e.g. 'property_features'"""
+        return ParquetDataset(self.data_path, name)
+    
+    def _extract(self, name: str, query, position, to_records, full_refresh: bool) -> DatasetUpdate:
+        """
+        Stream the rows of query past the dataset's high-water mark into new partitions
+
+        Args:
+            name: Dataset name
+            query: Select statement ordered by the position columns
+            position: Tuple of the position columns (keyset), e.g. (updated_at, id);
+                (timestamp, id) positions re-read the overlap of a ChangeWindow
+            to_records: Function turning a chunk of rows into a DataFrame
+            full_refresh: Drop the dataset and extract every row again
+        """
+        dataset = self.dataset(name)
+        if full_refresh:
+            dataset.reset()
+        
+        mark = dataset.high_water_mark
+        window = None
+        if isinstance(position[0].type, DateTime):
+            window = ChangeWindow(mark, dataset.state.get("seen"))
+            if window.start() is not None:
+                query = query.where(position[0] >= window.start())
+        elif mark is not None:
+            values = [
+                datetime.fromisoformat(value) if isinstance(column.type, DateTime) else value
+                for column, value in zip(position, mark)
+            ]
+            query = query.where(tuple_(*position) > tuple_(*values))
+        
+        result = self.db.execute(query.execution_options(yield_per=self.chunk_size))
+        rows_written = 0
+        partitions_written = 0
+        columns: List[str] = []
+        sample: List[Dict[str, Any]] = []
+        for chunk in result.partitions():
+            if window is not None:
+                rows = window.new_rows(chunk, key=position[-1].key, stamp=position[0].key)
+                window.advance(chunk, key=position[-1].key, stamp=position[0].key)
+                if not rows:
+                    continue
+                df = to_records(rows)
+                dataset.append(df, window.mark, window.seen)
+            else:
+                df = to_records(chunk)
+                last = chunk[-1]
+                mark = [
+                    value.isoformat() if isinstance(value, datetime) else value
+                    for value in (getattr(last, column.key) for column in position)
+                ]
+                dataset.append(df, mark)
+            rows_written += len(df)
+            partitions_written += 1
+            columns.extend(c for c in df.columns if c not in columns)
+            if len(sample) < 5:
+                sample.extend(df.head(5 - len(sample)).replace({np.nan: None}).to_dict(orient="records"))
+        
+        return DatasetUpdate(
+            name=name,
+            path=dataset.path,
+            rows_written=rows_written,
+            partitions_written=partitions_written,
+            high_water_mark=dataset.high_water_mark,
+            columns=columns,
+            sample=sample
+        )
+    
+    def extract_property_features_dataset(self, full_refresh: bool = False) -> DatasetUpdate:
         """
         Extract property features for ML model training
         
+        Properties created or updated since the last run are appended to the
+        'property_features' dataset; read it with dataset('property_features').read().
+        
+        Args:
+            full_refresh: Re-extract all properties into a fresh dataset
+        
         Returns:
-            DataFrame with property features
+            Summary of the rows written by this run
         """
-        properties = self.db.query(Property).all()
-        
-        data = []
-        for prop in properties:
-            # Extract basic property data
-            property_data = {
-                "id": prop.id,
-                "price": prop.price,
-                "property_type": prop.property_type,
-                "bedrooms": prop.bedrooms,
-                "bathrooms": prop.bathrooms,
-                "area": prop.area,
-                "latitude": prop.latitude,
-                "longitude": prop.longitude,
-                "city": prop.city
-            }
-            
-            # Extract architectural features from labels
-            if prop.labels:
-                for label in prop.labels:
-                    # Flatten architectural features
-                    if isinstance(label, dict):
-                        if label.get("type") == "primary_attribute":
-                            property_data[f"feature_{label.get('name')}"] = label.get('value')
-                        else:
-                            property_data[f"has_{label.get('name', '')}"] = 1
-            
-            data.append(property_data)
-        
-        # Convert to DataFrame
-        df = pd.DataFrame(data)
+        query = select(
+            Property.id, Property.updated_at, Property.price, Property.property_type,
+            Property.bedrooms, Property.bathrooms, Property.area, Property.latitude,
+            Property.longitude, Property.city, Property.labels
+        ).order_by(Property.updated_at, Property.id)
         
-        # Save dataset for ML use
-        df.to_csv(os.path.join(self.data_path, "property_features.csv"), index=False)
+        def to_records(rows) -> pd.DataFrame:
+            data = []
+            for prop in rows:
+                # Extract basic property data
+                property_data = {
+                    "id": prop.id,
+                    "price": prop.price,
+                    "property_type": prop.property_type,
+                    "bedrooms": prop.bedrooms,
+                    "bathrooms": prop.bathrooms,
+                    "area": prop.area,
+                    "latitude": prop.latitude,
+                    "longitude": prop.longitude,
+                    "city": prop.city
+                }
+                
+                # Extract architectural features from labels
+                if prop.labels:
+                    for label in prop.labels:
+                        # Flatten architectural features
+                        if isinstance(label, dict):
+                            if label.get("type") == "primary_attribute":
+                                property_data[f"feature_{label.get('name')}"] = _feature_value(label.get('value'))
+                            else:
+                                property_data[f"has_{label.get('name', '')}"] = 1
+                
+                data.append(property_data)
+            return pd.DataFrame(data)
         
-        return df
+        return self._extract(
+            "property_features", query, (Property.updated_at, Property.id), to_records, full_refresh
+        )
     
     def prepare_floor_plan_training_data(self, labeled_data: List[Dict[str, Any]]) -> Tuple[pd.DataFrame, str]:
         """
@@ -125,100 +339,123 @@ class MLDataPipelineService:
         
         return df, file_path
     
-    def generate_architectural_feature_vectors(self) -> np.ndarray:
+    def generate_architectural_feature_vectors(self, full_refresh: bool = False) -> DatasetUpdate:
         """
         Generate feature vectors for architectural style classification
         
+        Vectors of properties created or updated since the last run are
+        written in place to the memory-mapped feature store, and rows of
+        deleted properties are dropped. Training jobs can map the store
+        (PropertyFeatureStore(readonly=True)) instead of re-extracting them.
+        
+        Args:
+            full_refresh: Re-encode all properties into an empty store
+        
         Returns:
-            NumPy array of feature vectors
+            Summary of the vectors written by this run
         """
-        properties = self.db.query(Property).all()
+        store = self.feature_store
+        if full_refresh:
+            rows_written = store.sync(self.db, full_refresh=True)
+        else:
+            rows_written = store.ensure_fresh(self.db)
+        columns = [f"f{j}" for j in range(ARCHITECTURAL_FEATURE_DIM)]
+        sample = [
+            dict(id=int(pid), **dict(zip(columns, vector.tolist())))
+            for pid, vector in zip(store.ids()[:5], store.matrix()[:5])
+        ]
+        return DatasetUpdate(
+            name="architectural_features",
+            path=store.path,
+            rows_written=rows_written,
+            partitions_written=0,
+            high_water_mark=store.meta.get("high_water_mark"),
+            columns=["id"] + columns,
+            sample=sample
+        )
+    
+    def generate_label_feature_matrix(self, weighting: str = "tfidf") -> Tuple[np.ndarray, sp.csr_matrix]:
+        """
+        Encode the style, feature and material labels of all properties
         
-        # Extract architectural style features
-        feature_vectors = []
-        property_ids = []
+        Starts from the vocabulary saved by the previous run (label_vocabulary.json)
+        so existing columns keep their index; the first run seeds it from
+        ArchitecturalStyleClassifier.styles. One pass over property_labels
+        appends newly observed terms and recounts the document frequencies,
+        then the CSR matrix (label_features.npz), its row ids
+        (label_feature_ids.npy) and the vocabulary are saved to data_path.
         
-        for prop in properties:
-            # Initialize empty feature vector
-            # Features: [property_type, bedrooms, bathrooms, has_modern, has_traditional, etc.]
-            feature_vector = [0] * 20  # Placeholder size
-            
-            # Basic numeric features
-            feature_vector[0] = self._encode_property_type(prop.property_type)
-            feature_vector[1] = prop.bedrooms if prop.bedrooms else 0
-            feature_vector[2] = prop.bathrooms if prop.bathrooms else 0
-            
-            # Extract architectural styles from labels
-            if prop.labels:
-                for label in prop.labels:
-                    if isinstance(label, dict) and label.get("name") == "architectural_style":
-                        style = label.get("value", "").lower()
-                        # Encode architectural style
-                        if "modern" in style:
-                            feature_vector[3] = 1
-                        if "traditional" in style:
-                            feature_vector[4] = 1
-                        if "colonial" in style:
-                            feature_vector[5] = 1
-                        # Add more style encodings
-            
-            feature_vectors.append(feature_vector)
-            property_ids.append(prop.id)
+        Args:
+            weighting: 'tfidf' or 'binary' (multi-hot)
         
-        # Convert to NumPy array
-        feature_array = np.array(feature_vectors)
+        Returns:
+            (property ids, CSR matrix with one row per property)
+        """
+        vocabulary_path = os.path.join(self.data_path, "label_vocabulary.json")
+        if os.path.exists(vocabulary_path):
+            vectorizer = LabelVectorizer.load(vocabulary_path)
+            vectorizer.weighting = weighting
+        else:
+            vectorizer = LabelVectorizer(weighting=weighting)
+        property_ids, matrix = vectorizer.fit_transform(self.db, chunk_size=self.chunk_size)
+        
+        sp.save_npz(os.path.join(self.data_path, "label_features.npz"), matrix)
+        np.save(os.path.join(self.data_path, "label_feature_ids.npy"), property_ids)
+        vectorizer.save(vocabulary_path)
+        return property_ids, matrix
+    
+    def train_collaborative_filtering_model(
+        self,
+        model_path: Optional[str] = None,
+        factors: int = 32,
+        iterations: int = 15,
+        regularization: float = 0.1,
+        alpha: float = 40.0
+    ) -> CollaborativeFilteringModel:
+        """
+        Train the implicit-feedback ALS recommender on all interactions
         
-        # Save for ML use
-        np.save(os.path.join(self.data_path, "architectural_features.npy"), feature_array)
-        with open(os.path.join(self.data_path, "property_ids.json"), "w") as f:
-            json.dump(property_ids, f)
+        The factor matrices are written to settings.COLLABORATIVE_MODEL_PATH
+        (or model_path), where RecommendationEngine picks them up.
         
-        return feature_array
+        Returns:
+            The trained model
+        """
+        return train_collaborative_filtering_model(
+            self.db, path=model_path, factors=factors, iterations=iterations,
+            regularization=regularization, alpha=alpha
+        )
     
-    def extract_user_preferences_dataset(self) -> pd.DataFrame:
+    def extract_user_preferences_dataset(self, full_refresh: bool = False) -> DatasetUpdate:
         """
         Extract user preferences for recommendation model training
         
+        Preferences are insert-only, so the high-water mark is the id and each
+        run appends the preferences added since the last one to the
+        'user_preferences' dataset.
+        
+        Args:
+            full_refresh: Re-extract all preferences into a fresh dataset
+        
         Returns:
-            DataFrame with user preferences
+            Summary of the rows written by this run
         """
-        preferences = self.db.query(UserPreference).all()
-        
-        data = []
-        for pref in preferences:
-            pref_data = {
-                "user_id": pref.user_id,
-                "preference_key": pref.preference_key,
-                "preference_value": pref.preference_value,
-                "preference_category": pref.preference_category,
-                "source": pref.source
-            }
-            data.append(pref_data)
-        
-        # Convert to DataFrame
-        df = pd.DataFrame(data)
+        query = select(
+            UserPreference.id, UserPreference.user_id, UserPreference.preference_key,
+            UserPreference.preference_value, UserPreference.preference_category, UserPreference.source
+        ).order_by(UserPreference.id)
         
-        # Save dataset
-        df.to_csv(os.path.join(self.data_path, "user_preferences.csv"), index=False)
+        def to_records(rows) -> pd.DataFrame:
+            return pd.DataFrame(
+                [tuple(row) for row in rows],
+                columns=["id", "user_id", "preference_key", "preference_value", "preference_category", "source"]
+            )
         
-        return df
+        return self._extract("user_preferences", query, (UserPreference.id,), to_records, full_refresh)
     
     def _encode_property_type(self, property_type: Optional[str]) -> int:
         """Helper to encode property types as integers"""
-        if not property_type:
-            return 0
-            
-        property_type = property_type.lower()
-        if "apartment" in property_type:
-            return 1
-        elif "house" in property_type:
-            return 2
-        elif "condo" in property_type:
-            return 3
-        elif "townhouse" in property_type:
-            return 4
-        else:
-            return 0  # Unknown
+        return encode_property_type(property_type)
     
     def audit_training_data(self) -> Dict[str, Any]:
         """
@@ -228,16 +465,16 @@ class MLDataPipelineService:
             Audit report with statistics and quality metrics
         """
         # Check property features
-        property_file = os.path.join(self.data_path, "property_features.csv")
-        property_features = pd.read_csv(property_file) if os.path.exists(property_file) else None
+        property_features = self.dataset("property_features").read()
+        property_features = property_features if len(property_features) else None
         
         # Check floor plan annotations
         floor_plan_file = os.path.join(self.data_path, "floor_plan_annotations.csv")
         floor_plan_data = pd.read_csv(floor_plan_file) if os.path.exists(floor_plan_file) else None
         
         # Check user preferences
-        preferences_file = os.path.join(self.data_path, "user_preferences.csv")
-        preferences_data = pd.read_csv(preferences_file) if os.path.exists(preferences_file) else None
+        preferences_data = self.dataset("user_preferences").read(columns=["id", "preference_category"])
+        preferences_data = preferences_data if len(preferences_data) else None
         
         # Generate audit report
         report = {
@@ -0,0 +1,74 @@
+# app/services/openai_client.py
+import asyncio
+from typing import Any, Optional
+
+import httpx
+from openai import AsyncOpenAI
+
+from app.config import settings
+
+
+class AsyncOpenAIClient:
+    """
+    Shared non-blocking OpenAI client for all AI services
+
+    Wraps AsyncOpenAI with a bounded httpx connection pool, a per-request
+    timeout and a semaphore that caps concurrent in-flight requests per worker,
+    so a slow completion never blocks the event loop and a burst of requests
+    queues instead of exhausting connections or rate limits.
+    """
+
+    def __init__(
+        self,
+        api_key: Optional[str] = None,
+        max_connections: Optional[int] = None,
+        max_concurrency: Optional[int] = None,
+        timeout: Optional[float] = None
+    ):
+        self.api_key = api_key if api_key is not None else settings.OPENAI_API_KEY
+        self.max_connections = max_connections or settings.OPENAI_MAX_CONNECTIONS
+        self.max_concurrency = max_concurrency or settings.OPENAI_MAX_CONCURRENCY
+        self.timeout = timeout or settings.OPENAI_TIMEOUT_SECONDS
+        self._client: Optional[AsyncOpenAI] = None
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    def _ensure_client(self):
+        # httpx connections and asyncio primitives belong to one event loop
+        loop = asyncio.get_running_loop()
+        if self._client is None or self._loop is not loop:
+            http_client = httpx.AsyncClient(
+                limits=httpx.Limits(
+                    max_connections=self.max_connections,
+                    max_keepalive_connections=self.max_connections
+                ),
+                timeout=httpx.Timeout(self.timeout)
+            )
+            self._client = AsyncOpenAI(api_key=self.api_key, http_client=http_client, timeout=self.timeout)
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+            self._loop = loop
+
+    async def create_chat_completion(self, timeout: Optional[float] = None, **kwargs) -> Any:
+        """
+        Create a chat completion without blocking the event loop
+
+        Args:
+            timeout: Optional per-request timeout in seconds, defaults to the client timeout
+            **kwargs: Arguments for chat.completions.create (model, messages, ...)
+
+        Returns:
+            The ChatCompletion response
+        """
+        self._ensure_client()
+        async with self._semaphore:
+            return await self._client.chat.completions.create(timeout=timeout or self.timeout, **kwargs)
+
+    async def close(self):
+        """Close the underlying connection pool"""
+        if self._client is not None:
+            await self._client.close()
+            self._client = None
+            self._loop = None
+
+
+openai_client = AsyncOpenAIClient()
@@ -0,0 +1,155 @@
+# app/services/property_labels.py
+import json
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import delete, event, insert, select
+from sqlalchemy.orm import Session, attributes
+
+from app.models import Property, PropertyImage, PropertyLabel
+
+# (property id, source image id or None, labels JSON)
+LabelSource = Tuple[int, Optional[int], Any]
+
+
+def normalize_labels(labels) -> List[Dict[str, Any]]:
+    """
+    Rows of property_labels for a labels JSON list
+
+    Entries without a name are skipped; non-string values are stored as their
+    JSON text and non-numeric confidences as NULL.
+    """
+    if not isinstance(labels, list):
+        return []
+    rows = []
+    for label in labels:
+        if not isinstance(label, dict) or not label.get("name"):
+            continue
+        value = label.get("value")
+        if value is not None and not isinstance(value, str):
+            value = json.dumps(value)
+        confidence = label.get("confidence")
+        if isinstance(confidence, bool) or not isinstance(confidence, (int, float)):
+            confidence = None
+        rows.append({
+            "name": str(label["name"]),
+            "value": value,
+            "confidence": confidence,
+            "type": label.get("type"),
+        })
+    return rows
+
+
+def replace_labels(connection, sources: Iterable[LabelSource], deleted: bool = False):
+    """
+    Replace the label rows of properties and images with their current JSON labels
+
+    Args:
+        connection: Connection or Session to execute on
+        sources: (property id, source image id or None, labels JSON) per
+            property or image
+        deleted: Only remove the rows, the sources were deleted
+    """
+    property_ids = set()
+    image_ids = set()
+    rows = []
+    for property_id, image_id, labels in sources:
+        if image_id is None:
+            property_ids.add(property_id)
+        else:
+            image_ids.add(image_id)
+        if not deleted:
+            rows.extend(
+                dict(row, property_id=property_id, source_image_id=image_id)
+                for row in normalize_labels(labels)
+            )
+
+    if property_ids:
+        connection.execute(delete(PropertyLabel).where(
+            PropertyLabel.property_id.in_(property_ids),
+            PropertyLabel.source_image_id.is_(None)
+        ))
+    if image_ids:
+        connection.execute(delete(PropertyLabel).where(PropertyLabel.source_image_id.in_(image_ids)))
+    if rows:
+        connection.execute(insert(PropertyLabel), rows)
+
+
+def rebuild_property_labels(db: Session) -> int:
+    """Rebuild the whole property_labels table from the JSON labels, returns the row count"""
+    db.execute(delete(PropertyLabel))
+    sources: List[LabelSource] = [
+        (property_id, None, labels)
+        for property_id, labels in db.execute(
+            select(Property.id, Property.labels).where(Property.labels.isnot(None))
+        )
+    ]
+    sources.extend(
+        (property_id, image_id, labels)
+        for image_id, property_id, labels in db.execute(
+            select(PropertyImage.id, PropertyImage.property_id, PropertyImage.labels).where(
+                PropertyImage.labels.isnot(None)
+            )
+        )
+    )
+    replace_labels(db, sources)
+    return sum(len(normalize_labels(labels)) for _, _, labels in sources)
+
+
+def properties_with_feature(
+    name: str,
+    min_confidence: Optional[float] = None,
+    value: Optional[str] = None
+):
+    """
+    Subquery of the ids of properties having a label, for Property.id.in_()
+
+    Served by the (name, confidence, property_id) and (name, value,
+    property_id) indexes, so no labels JSON is loaded. Labels of a property's
+    images count as labels of the property.
+
+    Args:
+        name: Label name, e.g. 'hardwood_floors' or 'architectural_style'
+        min_confidence: Minimum confidence (inclusive)
+        value: Required value, e.g. 'craftsman'
+    """
+    query = select(PropertyLabel.property_id).where(PropertyLabel.name == name)
+    if min_confidence is not None:
+        query = query.where(PropertyLabel.confidence >= min_confidence)
+    if value is not None:
+        query = query.where(PropertyLabel.value == value)
+    return query
+
+
+def _labels_changed(obj, *keys: str) -> bool:
+    return any(attributes.get_history(obj, key).has_changes() for key in keys)
+
+
+@event.listens_for(Session, "after_flush")
+def _sync_property_labels(session, flush_context):
+    """Mirror labels of flushed properties and images into property_labels"""
+    changed: List[LabelSource] = []
+    removed_images: List[LabelSource] = []
+    removed_property_ids = []
+    for obj in session.new:
+        if isinstance(obj, Property) and obj.labels:
+            changed.append((obj.id, None, obj.labels))
+        elif isinstance(obj, PropertyImage) and obj.labels:
+            changed.append((obj.property_id, obj.id, obj.labels))
+    for obj in session.dirty:
+        if isinstance(obj, Property) and _labels_changed(obj, "labels"):
+            changed.append((obj.id, None, obj.labels))
+        elif isinstance(obj, PropertyImage) and _labels_changed(obj, "labels", "property_id"):
+            changed.append((obj.property_id, obj.id, obj.labels))
+    for obj in session.deleted:
+        if isinstance(obj, Property):
+            removed_property_ids.append(obj.id)
+        elif isinstance(obj, PropertyImage):
+            removed_images.append((obj.property_id, obj.id, None))
+
+    if changed:
+        replace_labels(session.connection(), changed)
+    if removed_images:
+        replace_labels(session.connection(), removed_images, deleted=True)
+    if removed_property_ids:
+        # Including the labels of its images; the foreign key cascades too where enforced
+        session.connection().execute(delete(PropertyLabel).where(PropertyLabel.property_id.in_(removed_property_ids)))
@@ -0,0 +1,221 @@
+# app/services/property_search.py
+import base64
+import json
+from dataclasses import dataclass
+from datetime import datetime
+from typing import List, Optional, Tuple
+
+from sqlalchemy import and_, func, or_, tuple_
+from sqlalchemy.orm import Query, Session, selectinload
+
+from app.models import Property
+from app.services.property_labels import properties_with_feature
+from app.services.property_text_search import property_text_index
+
+# Sortable columns; each has a composite (…, column, id) index, see Property.__table_args__
+SORT_COLUMNS = {
+    "price": Property.price,
+    "created_at": Property.created_at,
+    "distance_to_core": Property.distance_to_core,
+}
+
+# Sort key of full-text searches: descending relevance, then id
+RELEVANCE = "relevance"
+
+
+@dataclass
+class PropertySearchFilters:
+    """Structured filters of a property search, None means unfiltered"""
+    min_price: Optional[float] = None
+    max_price: Optional[float] = None
+    min_bedrooms: Optional[int] = None
+    max_bedrooms: Optional[int] = None
+    min_bathrooms: Optional[float] = None
+    property_type: Optional[str] = None
+    city: Optional[str] = None
+    is_active: Optional[bool] = True
+    # (min_lng, min_lat, max_lng, max_lat)
+    bbox: Optional[Tuple[float, float, float, float]] = None
+    # Label name, e.g. 'hardwood_floors', optionally with a value and minimum confidence
+    feature: Optional[str] = None
+    feature_value: Optional[str] = None
+    min_feature_confidence: Optional[float] = None
+
+
+def apply_property_filters(query: Query, filters: PropertySearchFilters) -> Query:
+    """Add the filters to a Property query"""
+    if filters.is_active is not None:
+        query = query.filter(Property.is_active == filters.is_active)
+    if filters.min_price is not None:
+        query = query.filter(Property.price >= filters.min_price)
+    if filters.max_price is not None:
+        query = query.filter(Property.price <= filters.max_price)
+    if filters.min_bedrooms is not None:
+        query = query.filter(Property.bedrooms >= filters.min_bedrooms)
+    if filters.max_bedrooms is not None:
+        query = query.filter(Property.bedrooms <= filters.max_bedrooms)
+    if filters.min_bathrooms is not None:
+        query = query.filter(Property.bathrooms >= filters.min_bathrooms)
+    if filters.property_type:
+        query = query.filter(Property.property_type == filters.property_type)
+    if filters.city:
+        query = query.filter(Property.city == filters.city)
+    if filters.bbox is not None:
+        min_lng, min_lat, max_lng, max_lat = filters.bbox
+        query = query.filter(
+            Property.latitude.between(min_lat, max_lat),
+            Property.longitude.between(min_lng, max_lng)
+        )
+    if filters.feature:
+        # Index lookup in property_labels instead of scanning the labels JSON
+        query = query.filter(Property.id.in_(properties_with_feature(
+            filters.feature, filters.min_feature_confidence, filters.feature_value
+        )))
+    return query
+
+
+def encode_property_cursor(sort: str, value, property_id: int) -> str:
+    """Opaque keyset cursor for a position in a sorted search: (sort value, id)"""
+    if isinstance(value, datetime):
+        value = value.isoformat()
+    raw = json.dumps([sort, value, property_id])
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+
+def decode_property_cursor(cursor: str, sort: str) -> Tuple[object, int]:
+    """Decode a cursor produced by encode_property_cursor, raises ValueError if invalid"""
+    try:
+        cursor_sort, value, property_id = json.loads(base64.urlsafe_b64decode(cursor.encode()).decode())
+    except (ValueError, TypeError, UnicodeDecodeError):
+        raise ValueError("Invalid property cursor")
+    if cursor_sort != sort or not isinstance(property_id, int):
+        raise ValueError("Cursor does not belong to this sort order")
+    if sort.lstrip("-") == "created_at":
+        value = datetime.fromisoformat(value)
+    return value, property_id
+
+
+def _uses_search_vector(db: Session) -> bool:
+    return db.get_bind().dialect.name == "postgresql"
+
+
+def _relevance_page(
+    db: Session,
+    query: Query,
+    text: str,
+    cursor: Optional[str],
+    limit: int
+) -> Tuple[List[Property], Optional[str]]:
+    # Postgres ranks the GIN-indexed tsvector, elsewhere the in-process index scores matches
+    position = None
+    if cursor:
+        position = decode_property_cursor(cursor, RELEVANCE)
+
+    if _uses_search_vector(db):
+        tsquery = func.plainto_tsquery("english", text)
+        rank = func.ts_rank_cd(Property.search_vector, tsquery)
+        query = query.filter(Property.search_vector.op("@@")(tsquery))
+        if position is not None:
+            score, property_id = position
+            query = query.filter(or_(rank < score, and_(rank == score, Property.id > property_id)))
+        rows = query.add_columns(rank).options(selectinload(Property.images)).order_by(
+            rank.desc(), Property.id.asc()
+        ).limit(limit + 1).all()
+        ranked = [(prop, float(score)) for prop, score in rows]
+    else:
+        scores = property_text_index.search(db, text)
+        if not scores:
+            return [], None
+        # Structured filters still run in the database, on the matching ids only
+        ids = [property_id for (property_id,) in query.filter(Property.id.in_(list(scores))).with_entities(Property.id)]
+        ids.sort(key=lambda property_id: (-scores[property_id], property_id))
+        if position is not None:
+            score, property_id = position
+            ids = [i for i in ids if (-scores[i], i) > (-score, property_id)]
+        ids = ids[:limit + 1]
+        by_id = {
+            prop.id: prop
+            for prop in db.query(Property).options(selectinload(Property.images)).filter(Property.id.in_(ids))
+        }
+        ranked = [(by_id[i], scores[i]) for i in ids if i in by_id]
+
+    page = ranked[:limit]
+    next_cursor = None
+    if len(ranked) > limit:
+        last, score = page[-1]
+        next_cursor = encode_property_cursor(RELEVANCE, score, last.id)
+    return [prop for prop, _ in page], next_cursor
+
+
+def search_properties(
+    db: Session,
+    filters: PropertySearchFilters,
+    sort: str = "price",
+    cursor: Optional[str] = None,
+    limit: int = 20,
+    text: Optional[str] = None
+) -> Tuple[List[Property], Optional[str]]:
+    """
+    One page of properties matching the filters, ordered by (sort key, id)
+
+    Pages are addressed by keyset cursors rather than offsets: the next page
+    starts with a row-value comparison against the last (sort key, id) seen,
+    which the composite indexes turn into an index range scan, so deep pages
+    cost the same as the first one.
+
+    With a text query only properties matching every term of it (in the
+    title, address, label names or description) are returned. Sorting by
+    'relevance' ranks them best match first; on Postgres through the
+    search_vector GIN index, elsewhere through the in-process index of
+    app.services.property_text_search.
+
+    Args:
+        db: Database session
+        filters: Structured filters
+        sort: Sort key from SORT_COLUMNS, prefixed with '-' for descending order,
+            or 'relevance' together with text
+        cursor: next_cursor of the previous page
+        limit: Page size
+        text: Optional full-text query
+
+    Returns:
+        (properties of the page, cursor of the next page or None on the last page)
+    """
+    text = text.strip() if text else None
+    query = apply_property_filters(db.query(Property), filters)
+
+    if sort == RELEVANCE:
+        if not text:
+            raise ValueError("Sorting by relevance requires a text query")
+        return _relevance_page(db, query, text, cursor, limit)
+
+    descending = sort.startswith("-")
+    column = SORT_COLUMNS.get(sort.lstrip("-"))
+    if column is None:
+        raise ValueError(f"Unknown sort key: {sort}")
+
+    query = query.filter(column.isnot(None))
+    if text:
+        if _uses_search_vector(db):
+            query = query.filter(Property.search_vector.op("@@")(func.plainto_tsquery("english", text)))
+        else:
+            query = query.filter(Property.id.in_(list(property_text_index.search(db, text))))
+
+    if cursor:
+        value, property_id = decode_property_cursor(cursor, sort)
+        position = tuple_(column, Property.id)
+        query = query.filter(position < tuple_(value, property_id) if descending else position > tuple_(value, property_id))
+
+    if descending:
+        query = query.order_by(column.desc(), Property.id.desc())
+    else:
+        query = query.order_by(column.asc(), Property.id.asc())
+
+    # One extra row tells whether there is a next page
+    rows = query.options(selectinload(Property.images)).limit(limit + 1).all()
+    page = rows[:limit]
+    next_cursor = None
+    if len(rows) > limit:
+        last = page[-1]
+        next_cursor = encode_property_cursor(sort, getattr(last, column.key), last.id)
+    return page, next_cursor
@@ -0,0 +1,188 @@
+# app/services/property_text_search.py
+import math
+import re
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.models import Property
+from app.services.derived_index import DerivedIndex, track_model_changes
+
+# Field weights, matching the setweight() classes of the Postgres trigger
+# (A = 1.0, B = 0.4, C = 0.2 in ts_rank's default weights)
+FIELD_WEIGHTS = {
+    "title": 1.0,
+    "address": 0.4,
+    "labels": 0.4,
+    "description": 0.2,
+}
+
+STOPWORDS = frozenset(
+    "a an and are as at be by for from has have in is it its of on or the this to with".split()
+)
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+
+def _stem(token: str) -> str:
+    # Plural folding only, so 'apartments' matches 'apartment'
+    if len(token) > 4 and token.endswith("ies"):
+        return token[:-3] + "y"
+    if len(token) > 3 and token.endswith("s") and not token.endswith("ss"):
+        return token[:-1]
+    return token
+
+
+def tokenize(text: Optional[str]) -> List[str]:
+    """Lowercased, plural-folded search terms of a text, without stopwords"""
+    if not text:
+        return []
+    return [_stem(token) for token in _TOKEN_RE.findall(text.lower()) if token not in STOPWORDS]
+
+
+def label_text(labels) -> str:
+    """Searchable text of a labels JSON list: feature names and their string values"""
+    if not isinstance(labels, list):
+        return ""
+    parts = []
+    for label in labels:
+        if not isinstance(label, dict):
+            continue
+        for key in ("name", "value"):
+            if isinstance(label.get(key), str):
+                parts.append(label[key])
+    return " ".join(parts)
+
+
+class PropertyTextIndex(DerivedIndex):
+    """
+    In-process inverted index for full-text property search
+
+    Used where the database has no full-text search (SQLite in development and
+    tests); on Postgres, property_search queries the search_vector column
+    instead. Each term maps to the properties containing it with a field
+    weighted term frequency, and results are ranked by TF-IDF. All query terms
+    must match.
+
+    Refreshes run in the background (see DerivedIndex), so a search never
+    waits for the database beyond the first build.
+    """
+
+    def _reset(self):
+        self.postings: Dict[str, Dict[int, float]] = {}
+        self.doc_terms: Dict[int, Set[str]] = {}
+
+    def search(self, db: Session, text: str) -> Dict[int, float]:
+        """
+        Find the properties matching all terms of a query
+
+        Args:
+            db: Database session
+            text: Free-text query
+
+        Returns:
+            Property id -> relevance score, empty if the query has no terms
+        """
+        terms = set(tokenize(text))
+        if not terms:
+            return {}
+
+        self.ensure_fresh(db)
+        with self._lock:
+            postings = [self.postings.get(term) for term in terms]
+            if not all(postings):
+                return {}
+
+            postings.sort(key=len)
+            n_docs = len(self.doc_terms)
+            matches = set(postings[0])
+            for posting in postings[1:]:
+                matches.intersection_update(posting)
+
+            scores = dict.fromkeys(matches, 0.0)
+            for posting in postings:
+                idf = math.log(1.0 + n_docs / len(posting))
+                for property_id in matches:
+                    scores[property_id] += posting[property_id] * idf
+            return scores
+
+    def build(self, db: Session):
+        """Index all properties"""
+        postings: Dict[str, Dict[int, float]] = {}
+        doc_terms: Dict[int, Set[str]] = {}
+        for row in self._load_documents(db):
+            self._add(postings, doc_terms, *self._term_weights(*row))
+        with self._lock:
+            self.postings, self.doc_terms = postings, doc_terms
+
+    def update(self, db: Session, property_ids: Iterable[int]):
+        """Re-index the given properties, removing those that no longer exist"""
+        property_ids = sorted(set(property_ids))
+        if not property_ids:
+            return
+        documents = [self._term_weights(*row) for row in self._load_documents(db, property_ids)]
+        with self._lock:
+            for property_id in property_ids:
+                self._remove(property_id)
+            for property_id, weights in documents:
+                self._add(self.postings, self.doc_terms, property_id, weights)
+
+    # ------------------------------------------------------------------
+    # Internals
+    # ------------------------------------------------------------------
+
+    @staticmethod
+    def _load_documents(db: Session, property_ids: Optional[List[int]] = None):
+        query = db.query(
+            Property.id, Property.title, Property.description, Property.address, Property.labels
+        )
+        if property_ids is not None:
+            query = query.filter(Property.id.in_(property_ids))
+        return query.all()
+
+    @staticmethod
+    def _term_weights(property_id: int, title, description, address, labels) -> Tuple[int, Dict[str, float]]:
+        fields = {
+            "title": title,
+            "address": address,
+            "labels": label_text(labels),
+            "description": description,
+        }
+        weights: Dict[str, float] = {}
+        for field, text in fields.items():
+            for term in tokenize(text):
+                weights[term] = weights.get(term, 0.0) + FIELD_WEIGHTS[field]
+        return property_id, weights
+
+    @staticmethod
+    def _add(postings, doc_terms, property_id: int, weights: Dict[str, float]):
+        doc_terms[property_id] = set(weights)
+        for term, weight in weights.items():
+            # Sublinear term frequency so long descriptions do not dominate
+            postings.setdefault(term, {})[property_id] = 1.0 + math.log(weight) if weight > 1.0 else weight
+
+    def _remove(self, property_id: int):
+        for term in self.doc_terms.pop(property_id, ()):
+            posting = self.postings.get(term)
+            if posting is not None:
+                posting.pop(property_id, None)
+                if not posting:
+                    del self.postings[term]
+
+    def _fingerprint(self) -> Tuple[int, int]:
+        return len(self.doc_terms), max(self.doc_terms, default=0)
+
+    @staticmethod
+    def _query_fingerprint(db: Session) -> Tuple[int, int]:
+        count, max_id = db.query(func.count(Property.id), func.coalesce(func.max(Property.id), 0)).one()
+        return int(count or 0), int(max_id or 0)
+
+
+property_text_index = PropertyTextIndex(
+    check_interval_seconds=settings.DERIVED_INDEX_CHECK_SECONDS,
+    background=True
+)
+
+track_model_changes(property_text_index, {Property: lambda prop: prop.id})
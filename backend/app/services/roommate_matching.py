@@ -0,0 +1,309 @@
+# app/services/roommate_matching.py
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+import scipy.sparse as sp
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from app.models import User, TenantProfile, UserPreference
+from app.services.derived_index import DerivedIndex, track_model_changes
+
+LIFESTYLE_CATEGORY = "lifestyle"
+
+
+class RoommateCompatibilityIndex(DerivedIndex):
+    """
+    Cached N x N roommate compatibility matrix over all tenant users
+
+    Tenant profiles and lifestyle preferences are loaded in bulk and encoded as
+    sparse one-hot matrices (locations, lifestyle key/value pairs and lifestyle
+    keys), so a whole compatibility row is a handful of sparse products instead
+    of four queries per candidate. Users whose profile or preferences change are
+    marked dirty and only their rows/columns are recomputed on the next read,
+    inside that request (see DerivedIndex).
+
+    Scores follow RecommendationEngine._calculate_roommate_compatibility:
+    budget closeness (30%), same preferred location (30%) and share of matching
+    lifestyle preferences (40%). Users without a tenant profile score 0.
+    """
+
+    def _reset(self):
+        self.user_ids = np.array([], dtype=np.int64)
+        self.row_of: Dict[int, int] = {}
+        self.has_profile = np.array([], dtype=bool)
+        self.budgets = np.array([], dtype=float)
+        self.location_codes = np.array([], dtype=np.int64)
+        self.pref_counts = np.array([], dtype=np.int64)
+        self.max_pref_id = 0
+        self.location_vocab: Dict[str, int] = {}
+        self.pair_vocab: Dict[Tuple[str, str], int] = {}
+        self.key_vocab: Dict[str, int] = {}
+        self.user_pairs: List[List[int]] = []
+        self.user_keys: List[List[int]] = []
+        self.matrix = np.zeros((0, 0), dtype=float)
+
+    # ------------------------------------------------------------------
+    # Public API
+    # ------------------------------------------------------------------
+
+    def get_compatibility_row(self, db: Session, user_id: int) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Get the compatibility of a user with every other tenant
+
+        Args:
+            db: Database session
+            user_id: ID of the tenant to match
+
+        Returns:
+            Tuple of (candidate user ids, scores), excluding the user itself
+        """
+        self.ensure_fresh(db)
+        with self._lock:
+            row = self.row_of.get(user_id)
+            if row is None:
+                mask = np.ones(self.user_ids.shape[0], dtype=bool)
+                return self.user_ids[mask], np.zeros(int(mask.sum()), dtype=float)
+            mask = np.arange(self.user_ids.shape[0]) != row
+            return self.user_ids[mask], self.matrix[row][mask]
+
+    def build(self, db: Session):
+        """Load all tenants and lifestyle preferences in bulk and compute the full matrix"""
+        with self._lock:
+            self._reset()
+
+            tenants = self._load_tenants(db)
+            prefs = self._load_lifestyle_preferences(db)
+
+            self.user_ids = np.array([t[0] for t in tenants], dtype=np.int64)
+            self.row_of = {uid: i for i, uid in enumerate(self.user_ids.tolist())}
+            n = len(tenants)
+            self.has_profile = np.zeros(n, dtype=bool)
+            self.budgets = np.full(n, np.nan)
+            self.location_codes = np.full(n, -1, dtype=np.int64)
+            self.pref_counts = np.zeros(n, dtype=np.int64)
+            self.user_pairs = [[] for _ in range(n)]
+            self.user_keys = [[] for _ in range(n)]
+
+            prefs_by_user = self._group_preferences(prefs)
+            for i, (uid, profile_id, budget, location) in enumerate(tenants):
+                self._encode_row(i, profile_id, budget, location, prefs_by_user.get(uid, []))
+
+            self.matrix = self._compute_rows(np.arange(n))
+
+    def update(self, db: Session, user_ids: Iterable[int]):
+        """
+        Re-encode the given users and recompute only their rows and columns
+
+        Users that are no longer tenants are removed, new tenants are appended.
+        """
+        user_ids = sorted(set(user_ids))
+        if not user_ids:
+            return
+
+        with self._lock:
+            tenants = {t[0]: t for t in self._load_tenants(db, user_ids)}
+            prefs_by_user = self._group_preferences(self._load_lifestyle_preferences(db, user_ids))
+
+            removed = [self.row_of[uid] for uid in user_ids if uid in self.row_of and uid not in tenants]
+            if removed:
+                self._remove_rows(removed)
+
+            changed_rows = []
+            for uid in user_ids:
+                if uid not in tenants:
+                    continue
+                if uid not in self.row_of:
+                    self._append_row(uid)
+                row = self.row_of[uid]
+                _, profile_id, budget, location = tenants[uid]
+                self.user_pairs[row] = []
+                self.user_keys[row] = []
+                self._encode_row(row, profile_id, budget, location, prefs_by_user.get(uid, []))
+                changed_rows.append(row)
+
+            if changed_rows:
+                rows = np.array(changed_rows, dtype=np.int64)
+                block = self._compute_rows(rows)
+                self.matrix[rows, :] = block
+                self.matrix[:, rows] = block.T
+
+    # ------------------------------------------------------------------
+    # Loading
+    # ------------------------------------------------------------------
+
+    def _load_tenants(self, db: Session, user_ids: Optional[List[int]] = None):
+        query = db.query(
+            User.id,
+            TenantProfile.id,
+            TenantProfile.budget,
+            TenantProfile.preferred_location
+        ).outerjoin(TenantProfile, TenantProfile.user_id == User.id).filter(User.user_type == "tenant")
+        if user_ids is not None:
+            query = query.filter(User.id.in_(user_ids))
+        return query.order_by(User.id).all()
+
+    def _load_lifestyle_preferences(self, db: Session, user_ids: Optional[List[int]] = None):
+        query = db.query(
+            UserPreference.id,
+            UserPreference.user_id,
+            UserPreference.preference_key,
+            UserPreference.preference_value
+        ).join(User, User.id == UserPreference.user_id).filter(
+            User.user_type == "tenant",
+            UserPreference.preference_category == LIFESTYLE_CATEGORY
+        )
+        if user_ids is not None:
+            query = query.filter(UserPreference.user_id.in_(user_ids))
+        return query.order_by(UserPreference.id).all()
+
+    @staticmethod
+    def _group_preferences(prefs) -> Dict[int, list]:
+        grouped: Dict[int, list] = {}
+        for pref_id, user_id, key, value in prefs:
+            grouped.setdefault(user_id, []).append((pref_id, key, value))
+        return grouped
+
+    def _fingerprint(self) -> Tuple[int, int, int, int, int]:
+        return (
+            int(self.user_ids.shape[0]),
+            int(self.user_ids.max()) if self.user_ids.size else 0,
+            int(self.has_profile.sum()),
+            int(self.pref_counts.sum()),
+            self.max_pref_id
+        )
+
+    @staticmethod
+    def _query_fingerprint(db: Session) -> Tuple[int, int, int, int, int]:
+        tenant_filter = User.user_type == "tenant"
+        tenant_count = db.query(func.count(User.id)).filter(tenant_filter).scalar_subquery()
+        tenant_max = db.query(func.coalesce(func.max(User.id), 0)).filter(tenant_filter).scalar_subquery()
+        profile_count = db.query(func.count(TenantProfile.id)).join(
+            User, User.id == TenantProfile.user_id
+        ).filter(tenant_filter).scalar_subquery()
+        lifestyle = db.query(UserPreference.id).join(User, User.id == UserPreference.user_id).filter(
+            tenant_filter,
+            UserPreference.preference_category == LIFESTYLE_CATEGORY
+        ).subquery()
+        pref_count = db.query(func.count(lifestyle.c.id)).scalar_subquery()
+        pref_max = db.query(func.coalesce(func.max(lifestyle.c.id), 0)).scalar_subquery()
+        row = db.query(tenant_count, tenant_max, profile_count, pref_count, pref_max).one()
+        return tuple(int(v or 0) for v in row)
+
+    # ------------------------------------------------------------------
+    # Encoding
+    # ------------------------------------------------------------------
+
+    def _encode_row(self, row: int, profile_id, budget, location, prefs):
+        self.has_profile[row] = profile_id is not None
+        # Falsy budgets (None or 0) never contributed to the score
+        self.budgets[row] = budget if budget else np.nan
+        if location:
+            code = self.location_vocab.setdefault(location.lower(), len(self.location_vocab))
+        else:
+            code = -1
+        self.location_codes[row] = code
+
+        # Later preferences for the same key win, like the dict built per pair
+        pref_map = {}
+        for pref_id, key, value in prefs:
+            pref_map[key] = value
+            self.max_pref_id = max(self.max_pref_id, pref_id)
+        self.pref_counts[row] = len(prefs)
+        self.user_pairs[row] = [
+            self.pair_vocab.setdefault((key, value), len(self.pair_vocab)) for key, value in pref_map.items()
+        ]
+        self.user_keys[row] = [self.key_vocab.setdefault(key, len(self.key_vocab)) for key in pref_map]
+
+    def _append_row(self, user_id: int):
+        row = self.user_ids.shape[0]
+        self.user_ids = np.append(self.user_ids, user_id)
+        self.row_of[user_id] = row
+        self.has_profile = np.append(self.has_profile, False)
+        self.budgets = np.append(self.budgets, np.nan)
+        self.location_codes = np.append(self.location_codes, -1)
+        self.pref_counts = np.append(self.pref_counts, 0)
+        self.user_pairs.append([])
+        self.user_keys.append([])
+        self.matrix = np.pad(self.matrix, ((0, 1), (0, 1)))
+
+    def _remove_rows(self, rows: List[int]):
+        keep = np.ones(self.user_ids.shape[0], dtype=bool)
+        keep[rows] = False
+        self.user_ids = self.user_ids[keep]
+        self.row_of = {uid: i for i, uid in enumerate(self.user_ids.tolist())}
+        self.has_profile = self.has_profile[keep]
+        self.budgets = self.budgets[keep]
+        self.location_codes = self.location_codes[keep]
+        self.pref_counts = self.pref_counts[keep]
+        self.user_pairs = [p for p, k in zip(self.user_pairs, keep) if k]
+        self.user_keys = [p for p, k in zip(self.user_keys, keep) if k]
+        self.matrix = self.matrix[np.ix_(keep, keep)]
+
+    @staticmethod
+    def _one_hot(columns_per_row: List[List[int]], n_columns: int) -> sp.csr_matrix:
+        indptr = np.zeros(len(columns_per_row) + 1, dtype=np.int64)
+        indptr[1:] = np.cumsum([len(cols) for cols in columns_per_row])
+        indices = np.fromiter(
+            (c for cols in columns_per_row for c in cols), dtype=np.int64, count=int(indptr[-1])
+        )
+        data = np.ones(indices.shape[0], dtype=float)
+        return sp.csr_matrix((data, indices, indptr), shape=(len(columns_per_row), max(n_columns, 1)))
+
+    def _sparse_encodings(self) -> Tuple[sp.csr_matrix, sp.csr_matrix, sp.csr_matrix]:
+        locations = self._one_hot(
+            [[code] if code >= 0 else [] for code in self.location_codes.tolist()],
+            len(self.location_vocab)
+        )
+        pairs = self._one_hot(self.user_pairs, len(self.pair_vocab))
+        keys = self._one_hot(self.user_keys, len(self.key_vocab))
+        return locations, pairs, keys
+
+    # ------------------------------------------------------------------
+    # Scoring
+    # ------------------------------------------------------------------
+
+    def _compute_rows(self, rows: np.ndarray) -> np.ndarray:
+        """Compatibility of the given rows against every indexed tenant"""
+        n = self.user_ids.shape[0]
+        if rows.size == 0 or n == 0:
+            return np.zeros((rows.shape[0], n), dtype=float)
+
+        locations, pairs, keys = self._sparse_encodings()
+
+        # Budget compatibility (closer budgets = higher score)
+        b_rows = self.budgets[rows][:, None]
+        b_all = self.budgets[None, :]
+        with np.errstate(invalid="ignore", divide="ignore"):
+            max_budget = np.maximum(b_rows, b_all)
+            ratio = np.where(max_budget > 0, np.abs(b_rows - b_all) / max_budget, 0.0)
+        both_budgets = ~np.isnan(b_rows) & ~np.isnan(b_all)
+        scores = np.where(both_budgets, 0.3 * (1.0 - ratio), 0.0)
+
+        # Location preference match
+        same_location = (locations[rows] @ locations.T).toarray() > 0
+        scores = scores + np.where(same_location, 0.3, 0.0)
+
+        # Lifestyle preference match over the union of lifestyle keys
+        matching = (pairs[rows] @ pairs.T).toarray()
+        shared_keys = (keys[rows] @ keys.T).toarray()
+        key_counts = np.asarray(keys.sum(axis=1)).ravel()
+        total = key_counts[rows][:, None] + key_counts[None, :] - shared_keys
+        with np.errstate(invalid="ignore", divide="ignore"):
+            lifestyle = np.where(total > 0, 0.4 * (matching / total), 0.0)
+        scores = scores + lifestyle
+
+        # No profile on either side means no compatibility
+        profile_mask = self.has_profile[rows][:, None] & self.has_profile[None, :]
+        return np.where(profile_mask, scores, 0.0)
+
+
+roommate_index = RoommateCompatibilityIndex()
+
+
+# Users whose profile, preferences or type changed
+track_model_changes(roommate_index, {
+    TenantProfile: lambda profile: profile.user_id,
+    UserPreference: lambda pref: pref.user_id,
+    User: lambda user: user.id,
+})
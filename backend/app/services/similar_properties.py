@@ -0,0 +1,269 @@
+# app/services/similar_properties.py
+import warnings
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+from sklearn.neighbors import BallTree
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.models import Property, PropertyImage, PropertyLabel
+from app.services.derived_index import DerivedIndex, track_model_changes
+from app.services.label_vectorizer import LabelVectorizer
+
+# Share of the cosine similarity coming from the numeric attributes, the rest
+# comes from the label (style/feature/material) vectors
+NUMERIC_WEIGHT = 0.4
+
+
+class SimilarPropertyIndex(DerivedIndex):
+    """
+    Nearest-neighbour index of listing embeddings for "more like this"
+
+    Each property is embedded as the concatenation of its standardized numeric
+    attributes (log price, bedrooms, bathrooms, log area, location, distance to
+    campus) and its TF-IDF label vector (see LabelVectorizer), each block
+    L2-normalized and weighted, and the whole row normalized again. Cosine
+    similarity is then a dot product: a query is one BLAS matrix-vector
+    product over the float32 embedding matrix plus an argpartition top-k.
+    With algorithm='ball_tree' the active rows are also indexed in a
+    scikit-learn BallTree (Euclidean distance on unit vectors ranks like
+    cosine), which is faster than brute force for large catalogs with few
+    label dimensions.
+
+    Edited listings are re-embedded with the current vocabulary and scaling;
+    the periodic full rebuild refreshes both (see DerivedIndex). Refreshes
+    compute new arrays aside and swap them in, so queries keep using the
+    previous ones meanwhile.
+    """
+
+    def __init__(self, algorithm: Optional[str] = None, **kwargs):
+        self.algorithm = algorithm or settings.SIMILAR_PROPERTIES_ALGORITHM
+        if self.algorithm not in ("brute", "ball_tree"):
+            raise ValueError(f"Unknown nearest-neighbour algorithm: {self.algorithm}")
+        super().__init__(**kwargs)
+
+    def _reset(self):
+        self.vectorizer: Optional[LabelVectorizer] = None
+        self.numeric_mean = np.zeros(0, dtype=np.float32)
+        self.numeric_scale = np.ones(0, dtype=np.float32)
+        self.ids = np.array([], dtype=np.int64)
+        self.active = np.array([], dtype=bool)
+        self.matrix = np.zeros((0, 0), dtype=np.float32)
+        self.row_of: Dict[int, int] = {}
+        self._tree: Optional[BallTree] = None
+        self._tree_rows = np.array([], dtype=np.int64)
+
+    # ------------------------------------------------------------------
+    # Public API
+    # ------------------------------------------------------------------
+
+    def similar(self, db: Session, property_id: int, limit: int = 10) -> Optional[List[Tuple[int, float]]]:
+        """
+        Active listings most similar to a property
+
+        Args:
+            db: Database session
+            property_id: ID of the reference property
+            limit: Maximum number of results
+
+        Returns:
+            (property id, cosine similarity) pairs, best first, excluding the
+            property itself; None if the property does not exist
+        """
+        self.ensure_fresh(db)
+        if property_id not in self.row_of:
+            # Listings created since the last refresh are embedded inline
+            if db.query(Property.id).filter(Property.id == property_id).first() is None:
+                return None
+            self.update_now(db, [property_id])
+        with self._lock:
+            row = self.row_of.get(property_id)
+            if row is None:
+                return None
+            query = self.matrix[row]
+
+            if self.algorithm == "ball_tree" and self._tree is not None:
+                k = min(limit + 1, self._tree_rows.shape[0])
+                if k == 0:
+                    return []
+                distances, positions = self._tree.query(query[None, :], k=k)
+                rows = self._tree_rows[positions[0]]
+                # |a - b|^2 = 2 - 2 cos(a, b) for unit vectors
+                scores = 1.0 - distances[0] ** 2 / 2.0
+                return [
+                    (int(self.ids[r]), float(s)) for r, s in zip(rows, scores) if r != row
+                ][:limit]
+
+            scores = self.matrix @ query
+            scores[~self.active] = -np.inf
+            scores[row] = -np.inf
+            k = min(limit, int(np.isfinite(scores).sum()))
+            if k <= 0:
+                return []
+            # argpartition so only the selected k rows are sorted; ties by property id
+            top = np.argpartition(-scores, k - 1)[:k]
+            top = top[np.lexsort((self.ids[top], -scores[top]))]
+            return [(int(self.ids[r]), float(scores[r])) for r in top]
+
+    def build(self, db: Session):
+        """Fit the label vocabulary and numeric scaling and embed every listing"""
+        vectorizer = LabelVectorizer(weighting="tfidf")
+        label_ids, labels = vectorizer.fit_transform(db)
+        rows = self._load_properties(db)
+
+        numeric = self._numeric_features(rows)
+        with warnings.catch_warnings():
+            # All-NULL columns (or no rows at all) just get mean 0, scale 1
+            warnings.simplefilter("ignore", RuntimeWarning)
+            mean = np.nan_to_num(np.nanmean(numeric, axis=0))
+            std = np.nan_to_num(np.nanstd(numeric, axis=0))
+        numeric_mean = mean.astype(np.float32)
+        numeric_scale = np.where(std > 0, std, 1.0).astype(np.float32)
+
+        # Both queries order by id; align explicitly in case a listing was
+        # inserted in between
+        label_block = np.zeros((len(rows), labels.shape[1]), dtype=np.float32)
+        label_row = {pid: i for i, pid in enumerate(label_ids.tolist())}
+        positions = [(i, label_row[row.id]) for i, row in enumerate(rows) if row.id in label_row]
+        if positions:
+            targets, sources = map(list, zip(*positions))
+            label_block[targets] = labels[sources].toarray()
+
+        ids = np.array([row.id for row in rows], dtype=np.int64)
+        active = np.array([bool(row.is_active) for row in rows], dtype=bool)
+        matrix = self._embed(numeric, label_block, numeric_mean, numeric_scale)
+        tree, tree_rows = self._build_tree(matrix, active)
+        with self._lock:
+            self.vectorizer = vectorizer
+            self.numeric_mean, self.numeric_scale = numeric_mean, numeric_scale
+            self._install(ids, active, matrix, tree, tree_rows)
+
+    def update(self, db: Session, property_ids: Iterable[int]):
+        """
+        Re-embed the given listings with the current vocabulary and scaling
+
+        Deleted listings are removed, new ones appended. Label terms unseen at
+        the last build are ignored until the next full rebuild.
+        """
+        property_ids = sorted(set(property_ids))
+        if not property_ids:
+            return
+
+        # Only refreshes replace the arrays and refreshes are serialized, so
+        # they can be read here without the lock
+        ids, active, matrix = self.ids, self.active.copy(), self.matrix.copy()
+        row_of = self.row_of
+        rows = self._load_properties(db, property_ids)
+        found = {row.id for row in rows}
+
+        removed = [row_of[pid] for pid in property_ids if pid in row_of and pid not in found]
+        if removed:
+            keep = np.ones(ids.shape[0], dtype=bool)
+            keep[removed] = False
+            ids, active, matrix = ids[keep], active[keep], matrix[keep]
+            row_of = {pid: i for i, pid in enumerate(ids.tolist())}
+
+        if rows:
+            labels_by_property: Dict[int, list] = {}
+            for label in db.execute(select(
+                PropertyLabel.property_id, PropertyLabel.name, PropertyLabel.value,
+                PropertyLabel.confidence, PropertyLabel.type
+            ).where(PropertyLabel.property_id.in_(list(found)))):
+                labels_by_property.setdefault(label.property_id, []).append({
+                    "name": label.name, "value": label.value,
+                    "confidence": label.confidence, "type": label.type
+                })
+            label_block = self.vectorizer.transform([labels_by_property.get(row.id) for row in rows]).toarray()
+            embedded = self._embed(
+                self._numeric_features(rows), label_block, self.numeric_mean, self.numeric_scale
+            )
+
+            new = [i for i, row in enumerate(rows) if row.id not in row_of]
+            for i, row in enumerate(rows):
+                target = row_of.get(row.id)
+                if target is not None:
+                    matrix[target] = embedded[i]
+                    active[target] = bool(row.is_active)
+            if new:
+                matrix = np.vstack([matrix, embedded[new]])
+                ids = np.concatenate([ids, np.array([rows[i].id for i in new], dtype=np.int64)])
+                active = np.concatenate([active, np.array([bool(rows[i].is_active) for i in new])])
+
+        tree, tree_rows = self._build_tree(matrix, active)
+        with self._lock:
+            self._install(ids, active, matrix, tree, tree_rows)
+
+    # ------------------------------------------------------------------
+    # Internals
+    # ------------------------------------------------------------------
+
+    @staticmethod
+    def _load_properties(db: Session, property_ids: Optional[List[int]] = None):
+        query = select(
+            Property.id, Property.is_active, Property.price, Property.bedrooms, Property.bathrooms,
+            Property.area, Property.latitude, Property.longitude, Property.distance_to_core
+        ).order_by(Property.id)
+        if property_ids is not None:
+            query = query.where(Property.id.in_(property_ids))
+        return db.execute(query).all()
+
+    @staticmethod
+    def _numeric_features(rows) -> np.ndarray:
+        def column(values, log=False):
+            array = np.array([np.nan if v is None else v for v in values], dtype=np.float64)
+            return np.log1p(np.clip(array, 0, None)) if log else array
+
+        return np.stack([
+            column([row.price for row in rows], log=True),
+            column([row.bedrooms for row in rows]),
+            column([row.bathrooms for row in rows]),
+            column([row.area for row in rows], log=True),
+            column([row.latitude for row in rows]),
+            column([row.longitude for row in rows]),
+            column([row.distance_to_core for row in rows]),
+        ], axis=1).reshape(len(rows), 7).astype(np.float32)
+
+    @staticmethod
+    def _embed(numeric: np.ndarray, labels: np.ndarray, mean: np.ndarray, scale: np.ndarray) -> np.ndarray:
+        # Missing values sit at the mean, i.e. contribute nothing
+        numeric = np.nan_to_num((numeric - mean) / scale).astype(np.float32)
+        blocks = []
+        for block, weight in ((numeric, NUMERIC_WEIGHT), (labels.astype(np.float32), 1.0 - NUMERIC_WEIGHT)):
+            norms = np.linalg.norm(block, axis=1, keepdims=True)
+            blocks.append(np.sqrt(weight) * block / np.where(norms > 0, norms, 1.0))
+        embedded = np.hstack(blocks).astype(np.float32)
+        norms = np.linalg.norm(embedded, axis=1, keepdims=True)
+        return embedded / np.where(norms > 0, norms, 1.0)
+
+    def _build_tree(self, matrix: np.ndarray, active: np.ndarray) -> Tuple[Optional[BallTree], np.ndarray]:
+        tree_rows = np.flatnonzero(active)
+        if self.algorithm == "ball_tree" and tree_rows.size:
+            return BallTree(matrix[tree_rows]), tree_rows
+        return None, tree_rows
+
+    def _install(self, ids, active, matrix, tree, tree_rows):
+        self.ids, self.active, self.matrix = ids, active, matrix
+        self.row_of = {pid: i for i, pid in enumerate(ids.tolist())}
+        self._tree, self._tree_rows = tree, tree_rows
+
+    def _fingerprint(self) -> Tuple[int, int]:
+        return int(self.ids.shape[0]), int(self.ids.max()) if self.ids.size else 0
+
+    @staticmethod
+    def _query_fingerprint(db: Session) -> Tuple[int, int]:
+        count, max_id = db.query(func.count(Property.id), func.coalesce(func.max(Property.id), 0)).one()
+        return int(count or 0), int(max_id or 0)
+
+
+similar_property_index = SimilarPropertyIndex(
+    check_interval_seconds=settings.DERIVED_INDEX_CHECK_SECONDS,
+    background=True
+)
+
+# Listings edited directly or through their images' labels
+track_model_changes(similar_property_index, {
+    Property: lambda prop: prop.id,
+    PropertyImage: lambda image: image.property_id,
+})
@@ -1,49 +1,248 @@
-import boto3
+import asyncio
+import io
 import os
+import shutil
+from abc import ABC, abstractmethod
+from typing import BinaryIO, Dict, Optional
+from uuid import uuid4
+
+import boto3
+import httpx
+from boto3.s3.transfer import TransferConfig
+from botocore.config import Config
 from botocore.exceptions import ClientError
 from fastapi import UploadFile
-from uuid import uuid4
 
-class S3ImageService:
-    def __init__(self):
-        # get AWS credentials from environment variables
-        self.aws_access_key = os.environ.get("AWS_ACCESS_KEY_ID")
-        self.aws_secret_key = os.environ.get("AWS_SECRET_ACCESS_KEY")
-        self.bucket_name = os.environ.get("S3_BUCKET_NAME", "horizonhome-property-images")
-        self.region = os.environ.get("AWS_REGION", "us-east-2")  # 确保与你的应用区域一致
-        
-        # initialize S3 client
+from app.config import settings
+
+
+class StorageBackend(ABC):
+    """
+    Object storage for uploaded files
+
+    Backends write from file-like objects in fixed-size chunks, so memory use
+    per upload does not depend on the file size. All methods are blocking;
+    ImageStorageService runs them in worker threads.
+    """
+
+    @abstractmethod
+    def save(self, fileobj: BinaryIO, key: str, content_type: str) -> str:
+        """Store the rest of fileobj under key and return its public URL"""
+
+    @abstractmethod
+    def read(self, key: str) -> bytes:
+        """Return the stored data of key"""
+
+    @abstractmethod
+    def delete(self, key: str):
+        """Delete key (missing keys are ignored)"""
+
+    @abstractmethod
+    def url_for(self, key: str) -> str:
+        """Public URL of key"""
+
+    def key_from_url(self, url: str) -> Optional[str]:
+        """Key of a URL returned by this backend, or None if the URL is not ours"""
+        prefix = self.url_for("")
+        return url[len(prefix):] if url and url.startswith(prefix) else None
+
+
+class S3StorageBackend(StorageBackend):
+    """
+    S3 (or S3-compatible, e.g. MinIO) storage
+
+    Uploads go through boto3's managed transfer, which streams the file in
+    chunk_size parts and switches to a multipart upload above
+    multipart_threshold. The boto3 client is thread-safe and shared with its
+    connection pool by all requests.
+    """
+
+    def __init__(
+        self,
+        bucket_name: str,
+        region: str,
+        aws_access_key: Optional[str] = None,
+        aws_secret_key: Optional[str] = None,
+        endpoint_url: Optional[str] = None,
+        public_base_url: Optional[str] = None,
+        max_pool_connections: int = 20,
+        multipart_threshold: int = 8 * 1024 * 1024,
+        chunk_size: int = 8 * 1024 * 1024
+    ):
+        self.bucket_name = bucket_name
+        self.region = region
+        self.endpoint_url = endpoint_url
+        self.public_base_url = public_base_url
         self.s3_client = boto3.client(
             's3',
-            aws_access_key_id=self.aws_access_key,
-            aws_secret_access_key=self.aws_secret_key,
-            region_name=self.region
+            aws_access_key_id=aws_access_key,
+            aws_secret_access_key=aws_secret_key,
+            region_name=region,
+            endpoint_url=endpoint_url,
+            config=Config(max_pool_connections=max_pool_connections)
         )
-    
-    async def upload_image(self, file: UploadFile, property_id: int, landlord_id: int) -> str:
-        """Upload image to S3 and return public URL"""
+        self.transfer_config = TransferConfig(
+            multipart_threshold=multipart_threshold,
+            multipart_chunksize=chunk_size,
+            io_chunksize=min(chunk_size, 256 * 1024),
+            max_concurrency=4
+        )
+
+    def save(self, fileobj: BinaryIO, key: str, content_type: str) -> str:
         try:
-            # read file content
-            contents = await file.read()
-            
-            # generate unique file name (use UUID to avoid conflicts)
-            file_ext = os.path.splitext(file.filename)[1] if file.filename else ".jpg"
-            unique_filename = f"properties/{landlord_id}/{property_id}/{uuid4()}{file_ext}"
-            
-            # upload to S3
-            self.s3_client.put_object(
-                Bucket=self.bucket_name,
-                Key=unique_filename,
-                Body=contents,
-                ContentType=file.content_type or "image/jpeg"
+            self.s3_client.upload_fileobj(
+                fileobj,
+                self.bucket_name,
+                key,
+                ExtraArgs={"ContentType": content_type or "image/jpeg"},
+                Config=self.transfer_config
             )
-            
-            # build and return image URL
-            return f"https://{self.bucket_name}.s3.{self.region}.amazonaws.com/{unique_filename}"
-        
         except ClientError as e:
             print(f"S3 upload error: {e}")
             raise Exception(f"Image upload failed: {str(e)}")
+        return self.url_for(key)
+
+    def read(self, key: str) -> bytes:
+        response = self.s3_client.get_object(Bucket=self.bucket_name, Key=key)
+        return response["Body"].read()
+
+    def delete(self, key: str):
+        self.s3_client.delete_object(Bucket=self.bucket_name, Key=key)
+
+    def url_for(self, key: str) -> str:
+        if self.public_base_url:
+            return f"{self.public_base_url.rstrip('/')}/{key}"
+        if self.endpoint_url:
+            # Path-style URL for S3-compatible servers
+            return f"{self.endpoint_url.rstrip('/')}/{self.bucket_name}/{key}"
+        return f"https://{self.bucket_name}.s3.{self.region}.amazonaws.com/{key}"
+
+
+class LocalStorageBackend(StorageBackend):
+    """Storage in a local directory, for on-prem deployments and tests"""
+
+    def __init__(self, root: str, base_url: str = "/media", chunk_size: int = 1024 * 1024):
+        self.root = os.path.abspath(root)
+        self.base_url = base_url.rstrip("/")
+        self.chunk_size = chunk_size
+
+    def _path(self, key: str) -> str:
+        path = os.path.abspath(os.path.join(self.root, key))
+        if not path.startswith(self.root + os.sep):
+            raise ValueError(f"Invalid storage key: {key}")
+        return path
+
+    def save(self, fileobj: BinaryIO, key: str, content_type: str) -> str:
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Write then rename so readers never see a partial file
+        tmp_path = f"{path}.{uuid4().hex}.tmp"
+        try:
+            with open(tmp_path, "wb") as f:
+                shutil.copyfileobj(fileobj, f, self.chunk_size)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise Exception(f"Image upload failed: {str(e)}")
+        return self.url_for(key)
+
+    def read(self, key: str) -> bytes:
+        with open(self._path(key), "rb") as f:
+            return f.read()
+
+    def delete(self, key: str):
+        try:
+            os.remove(self._path(key))
+        except FileNotFoundError:
+            pass
+
+    def url_for(self, key: str) -> str:
+        return f"{self.base_url}/{key}"
+
+
+def create_storage_backend(backend: Optional[str] = None) -> StorageBackend:
+    """Create the storage backend configured by settings.STORAGE_BACKEND ('s3' or 'local')"""
+    backend = (backend or settings.STORAGE_BACKEND).lower()
+    if backend == "s3":
+        return S3StorageBackend(
+            bucket_name=os.environ.get("S3_BUCKET_NAME", "horizonhome-property-images"),
+            region=os.environ.get("AWS_REGION", "us-east-2"),
+            aws_access_key=os.environ.get("AWS_ACCESS_KEY_ID"),
+            aws_secret_key=os.environ.get("AWS_SECRET_ACCESS_KEY"),
+            endpoint_url=settings.S3_ENDPOINT_URL,
+            public_base_url=settings.S3_PUBLIC_BASE_URL,
+            max_pool_connections=settings.STORAGE_MAX_POOL_CONNECTIONS,
+            multipart_threshold=settings.STORAGE_MULTIPART_THRESHOLD,
+            chunk_size=settings.STORAGE_CHUNK_SIZE
+        )
+    if backend == "local":
+        return LocalStorageBackend(settings.LOCAL_STORAGE_DIR, settings.LOCAL_STORAGE_BASE_URL)
+    raise ValueError(f"Unknown storage backend: {backend}")
+
+
+class ImageStorageService:
+    """Stores property images in the configured backend without blocking the event loop"""
+
+    def __init__(self, backend: Optional[StorageBackend] = None):
+        self.backend = backend or create_storage_backend()
+
+    @staticmethod
+    def make_key(filename: Optional[str], property_id: int, landlord_id: int) -> str:
+        # generate unique file name (use UUID to avoid conflicts)
+        file_ext = os.path.splitext(filename)[1] if filename else ".jpg"
+        return f"properties/{landlord_id}/{property_id}/{uuid4()}{file_ext}"
+
+    async def upload_image(self, file: UploadFile, property_id: int, landlord_id: int) -> str:
+        """Stream an uploaded image to storage and return its public URL"""
+        key = self.make_key(file.filename, property_id, landlord_id)
+        await file.seek(0)
+        try:
+            # UploadFile spools to disk, the backend copies it in chunks
+            return await asyncio.to_thread(self.backend.save, file.file, key, file.content_type)
         finally:
             # ensure file pointer is reset,以防后续需要使用
-            await file.seek(0)
\ No newline at end of file
+            await file.seek(0)
+
+    async def upload_variants(self, image_url: str, variants: Dict[str, Dict[str, bytes]]) -> Dict[str, Dict[str, str]]:
+        """
+        Store resized variants of an image next to the original
+
+        Args:
+            image_url: Public URL of the original image
+            variants: Variant name -> format extension -> encoded data
+
+        Returns:
+            Variant name -> format extension -> public URL
+        """
+        key = self.backend.key_from_url(image_url)
+        stem = os.path.splitext(key)[0] if key else f"variants/{uuid4()}"
+        content_types = {"webp": "image/webp", "jpeg": "image/jpeg"}
+
+        uploads = [
+            (name, extension, f"{stem}_{name}.{extension}", data)
+            for name, encoded in variants.items()
+            for extension, data in encoded.items()
+        ]
+        urls = await asyncio.gather(*(
+            asyncio.to_thread(self.backend.save, io.BytesIO(data), variant_key, content_types[extension])
+            for _, extension, variant_key, data in uploads
+        ))
+
+        result: Dict[str, Dict[str, str]] = {}
+        for (name, extension, _, _), url in zip(uploads, urls):
+            result.setdefault(name, {})[extension] = url
+        return result
+
+    async def read_image(self, image_url: str) -> bytes:
+        """Read a stored image by its public URL (other URLs are downloaded)"""
+        key = self.backend.key_from_url(image_url)
+        if key is not None:
+            return await asyncio.to_thread(self.backend.read, key)
+        async with httpx.AsyncClient(timeout=30.0) as http_client:
+            response = await http_client.get(image_url)
+            response.raise_for_status()
+        return response.content
+
+
+storage_service = ImageStorageService()
@@ -1,4 +1,7 @@
 import math
+from typing import Optional
+import numpy as np
+from sqlalchemy import or_
 from sqlalchemy.orm import Session
 from app.models import Property
 
@@ -6,13 +9,15 @@ from app.models import Property
 CMU_LATITUDE = 40.4433
 CMU_LONGITUDE = -79.9436
 
+# Radius of the Earth in miles
+EARTH_RADIUS_MILES = 3958.8
+
 def calculate_distance(lat1, lon1, lat2, lon2):
     """
     Calculate distance between two points using Haversine formula
     Returns distance in miles
     """
-    # Radius of the Earth in miles
-    R = 3958.8
+    R = EARTH_RADIUS_MILES
     
     # Convert latitude and longitude from degrees to radians
     lat1_rad = math.radians(lat1)
@@ -29,44 +34,138 @@ def calculate_distance(lat1, lon1, lat2, lon2):
     
     return distance
 
-def update_cmu_distances(db: Session):
+def calculate_distances(lat, lon, latitudes, longitudes):
+    """
+    Vectorized Haversine distance from one point to arrays of points
+    Returns a NumPy array of distances in miles (NaN where coordinates are missing)
+    """
+    lat1_rad = np.radians(lat)
+    lon1_rad = np.radians(lon)
+    lat2_rad = np.radians(np.asarray(latitudes, dtype=float))
+    lon2_rad = np.radians(np.asarray(longitudes, dtype=float))
+    
+    dlon = lon2_rad - lon1_rad
+    dlat = lat2_rad - lat1_rad
+    a = np.sin(dlat / 2) ** 2 + np.cos(lat1_rad) * np.cos(lat2_rad) * np.sin(dlon / 2) ** 2
+    c = 2 * np.arctan2(np.sqrt(a), np.sqrt(1 - a))
+    return EARTH_RADIUS_MILES * c
+
+def calculate_distance_to_core(latitude, longitude):
+    """
+    Distance in miles from a point to the CMU anchor, None without coordinates
+    """
+    if latitude is None or longitude is None:
+        return None
+    return calculate_distance(CMU_LATITUDE, CMU_LONGITUDE, latitude, longitude)
+
+def update_cmu_distances(db: Session, chunk_size: int = 5000):
     """
     Update distance_to_core for all properties in the database
     Call this function when new properties are added or after migrations
+    
+    Properties are streamed in id order, `chunk_size` rows at a time, and each
+    chunk is written back with a single bulk UPDATE.
     """
-    properties = db.query(Property).all()
-    
-    for prop in properties:
-        if prop.latitude and prop.longitude:
-            distance = calculate_distance(
-                CMU_LATITUDE, CMU_LONGITUDE,
-                prop.latitude, prop.longitude
-            )
-            prop.distance_to_core = distance
-    
-    db.commit()
-    return f"Updated distances for {len(properties)} properties"
+    updated = 0
+    last_id = 0
+    
+    while True:
+        rows = db.query(Property.id, Property.latitude, Property.longitude).filter(
+            Property.id > last_id,
+            Property.latitude.isnot(None),
+            Property.longitude.isnot(None)
+        ).order_by(Property.id).limit(chunk_size).all()
+        
+        if not rows:
+            break
+        
+        ids, latitudes, longitudes = zip(*rows)
+        distances = calculate_distances(CMU_LATITUDE, CMU_LONGITUDE, latitudes, longitudes)
+        
+        db.bulk_update_mappings(Property, [
+            {"id": prop_id, "distance_to_core": float(distance)}
+            for prop_id, distance in zip(ids, distances.tolist())
+        ])
+        db.commit()
+        
+        updated += len(rows)
+        last_id = ids[-1]
+    
+    return f"Updated distances for {updated} properties"
 
-def get_nearby_properties(db: Session, latitude: float, longitude: float, radius: float = 5.0):
+def get_bounding_box(latitude, longitude, radius):
+    """
+    Get the latitude/longitude bounding box enclosing a circle of `radius` miles
+    Returns (min_lat, max_lat, min_lng, max_lng) in degrees. Longitudes may fall
+    outside [-180, 180] when the box crosses the antimeridian; a box touching a
+    pole spans every longitude.
+    """
+    # Angular radius in radians
+    angular_radius = radius / EARTH_RADIUS_MILES
+    lat_rad = math.radians(latitude)
+    
+    min_lat = latitude - math.degrees(angular_radius)
+    max_lat = latitude + math.degrees(angular_radius)
+    
+    if min_lat <= -90 or max_lat >= 90:
+        return max(min_lat, -90.0), min(max_lat, 90.0), -180.0, 180.0
+    
+    delta_lng = math.degrees(math.asin(min(1.0, math.sin(angular_radius) / math.cos(lat_rad))))
+    return min_lat, max_lat, longitude - delta_lng, longitude + delta_lng
+
+def filter_bounding_box(query, min_lat, max_lat, min_lng, max_lng):
+    """
+    Restrict a Property query to a bounding box so the (latitude, longitude) index is used
+    """
+    query = query.filter(
+        Property.latitude.isnot(None),
+        Property.longitude.isnot(None),
+        Property.latitude.between(min_lat, max_lat)
+    )
+    
+    if min_lng < -180:
+        # Box wraps around the antimeridian on the west side
+        return query.filter(or_(Property.longitude >= min_lng + 360, Property.longitude <= max_lng))
+    if max_lng > 180:
+        # Box wraps around the antimeridian on the east side
+        return query.filter(or_(Property.longitude >= min_lng, Property.longitude <= max_lng - 360))
+    return query.filter(Property.longitude.between(min_lng, max_lng))
+
+def get_nearby_properties(db: Session, latitude: float, longitude: float, radius: float = 5.0,
+                          query=None, limit: Optional[int] = None):
     """
     Get all properties within a given radius from the specified coordinates
     Returns a list of properties sorted by distance
+    
+    Only properties inside the radius' bounding box are loaded from the database.
+    Pass `query` to combine the radius search with other Property filters (price,
+    exclusions, ...); `limit` is applied after the radius filter and distance sort.
     """
-    properties = db.query(Property).all()
-    nearby_properties = []
+    if query is None:
+        query = db.query(Property)
+    
+    min_lat, max_lat, min_lng, max_lng = get_bounding_box(latitude, longitude, radius)
+    candidates = filter_bounding_box(query, min_lat, max_lat, min_lng, max_lng).all()
+    if not candidates:
+        return []
     
-    for prop in properties:
-        if prop.latitude and prop.longitude:
-            distance = calculate_distance(
-                latitude, longitude,
-                prop.latitude, prop.longitude
-            )
-            
-            if distance <= radius:
-                # Add distance as a dynamic attribute
-                setattr(prop, "distance", distance)
-                nearby_properties.append(prop)
+    distances = calculate_distances(
+        latitude, longitude,
+        [prop.latitude for prop in candidates],
+        [prop.longitude for prop in candidates]
+    )
+    
+    # The box corners lie outside the circle
+    nearby_properties = []
+    for prop, distance in zip(candidates, distances.tolist()):
+        if distance <= radius:
+            # Add distance as a dynamic attribute
+            setattr(prop, "distance", distance)
+            nearby_properties.append(prop)
     
     # Sort by distance
     nearby_properties.sort(key=lambda x: getattr(x, "distance"))
-    return nearby_properties
\ No newline at end of file
+    
+    if limit is not None:
+        nearby_properties = nearby_properties[:limit]
+    return nearby_properties
@@ -0,0 +1,255 @@
+import base64
+import hashlib
+import io
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import BinaryIO, Dict, List, Optional
+
+import numpy as np
+from PIL import Image, ImageOps
+
+from app.config import settings
+
+# MIME types of the formats we send to vision models
+MIME_TYPES = {
+    "JPEG": "image/jpeg",
+    "PNG": "image/png",
+    "WEBP": "image/webp",
+    "GIF": "image/gif",
+}
+
+EXIF_ORIENTATION_TAG = 0x0112
+
+# Longest edge in pixels of the resized variants served to clients
+IMAGE_VARIANT_SIZES = {
+    "full": 1920,
+    "card": 800,
+    "thumbnail": 320,
+}
+
+# Formats every variant is encoded in, with their file extensions
+IMAGE_VARIANT_FORMATS = {
+    "WEBP": "webp",
+    "JPEG": "jpeg",
+}
+
+
+@dataclass(frozen=True)
+class PreparedImage:
+    """An image decoded, oriented, downscaled and re-encoded for a vision request"""
+    data: bytes
+    mime_type: str
+    width: int
+    height: int
+
+    @property
+    def data_url(self) -> str:
+        """Base64 data URL for an image_url content part"""
+        return f"data:{self.mime_type};base64,{base64.b64encode(self.data).decode('utf-8')}"
+
+
+def sniff_mime_type(image_bytes: bytes) -> str:
+    """Guess the MIME type of encoded image data from its magic number"""
+    if image_bytes.startswith(b"\x89PNG\r\n\x1a\n"):
+        return "image/png"
+    if image_bytes[:4] == b"RIFF" and image_bytes[8:12] == b"WEBP":
+        return "image/webp"
+    if image_bytes[:6] in (b"GIF87a", b"GIF89a"):
+        return "image/gif"
+    return "image/jpeg"
+
+
+def encode_image(image: Image.Image, image_format: str = "JPEG", quality: int = 85) -> bytes:
+    """Encode a PIL image as JPEG or WebP"""
+    image_format = image_format.upper()
+    if image_format == "JPEG" and image.mode != "RGB":
+        # JPEG has no alpha channel or palette
+        image = image.convert("RGB")
+    elif image_format == "WEBP" and image.mode not in ("RGB", "RGBA"):
+        image = image.convert("RGBA" if "A" in image.getbands() or "transparency" in image.info else "RGB")
+
+    buffer = io.BytesIO()
+    if image_format == "JPEG":
+        image.save(buffer, format="JPEG", quality=quality, optimize=True, progressive=True)
+    else:
+        image.save(buffer, format=image_format, quality=quality, method=4)
+    return buffer.getvalue()
+
+
+def _prepare_image(image_bytes: bytes, max_edge: int, image_format: str, quality: int) -> PreparedImage:
+    try:
+        source = Image.open(io.BytesIO(image_bytes))
+        source_format = source.format
+        oriented = source.getexif().get(EXIF_ORIENTATION_TAG, 1) != 1
+        source.load()
+        image = ImageOps.exif_transpose(source)
+    except Exception:
+        # Not decodable here, let the vision API decide
+        return PreparedImage(image_bytes, sniff_mime_type(image_bytes), 0, 0)
+
+    width, height = image.size
+    if max(width, height) > max_edge:
+        image.thumbnail((max_edge, max_edge), Image.LANCZOS)
+    elif not oriented and source_format in MIME_TYPES and source_format != "GIF":
+        # Small enough already, only re-encode if that makes it smaller
+        encoded = encode_image(image, image_format, quality)
+        if len(encoded) >= len(image_bytes):
+            return PreparedImage(image_bytes, MIME_TYPES[source_format], width, height)
+        return PreparedImage(encoded, MIME_TYPES[image_format], width, height)
+
+    encoded = encode_image(image, image_format, quality)
+    return PreparedImage(encoded, MIME_TYPES[image_format], image.width, image.height)
+
+
+class _PreparedImageCache:
+    """Small LRU of prepared images so several analyzers decode an upload only once"""
+
+    def __init__(self, max_entries: int = 32):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[tuple, PreparedImage]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: tuple) -> Optional[PreparedImage]:
+        with self._lock:
+            prepared = self._entries.get(key)
+            if prepared is not None:
+                self._entries.move_to_end(key)
+            return prepared
+
+    def put(self, key: tuple, prepared: PreparedImage):
+        with self._lock:
+            self._entries[key] = prepared
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+
+_prepared_images = _PreparedImageCache()
+
+
+def prepare_image_for_vision(
+    image_bytes: bytes,
+    max_edge: Optional[int] = None,
+    image_format: Optional[str] = None,
+    quality: Optional[int] = None
+) -> PreparedImage:
+    """
+    Prepare an uploaded image for a vision model request
+
+    Decodes the image once, applies its EXIF orientation, downscales it so the
+    longest edge is at most max_edge pixels and re-encodes it as JPEG or WebP.
+    Images that are already small keep their original encoding unless
+    re-encoding makes them smaller. The result carries the matching MIME type.
+    Results are memoized by content, so analyzers called on the same upload
+    share one decode.
+
+    Args:
+        image_bytes: Encoded image data
+        max_edge: Maximum width/height in pixels, defaults to settings.VISION_IMAGE_MAX_EDGE
+        image_format: 'JPEG' or 'WEBP', defaults to settings.VISION_IMAGE_FORMAT
+        quality: Encoder quality (1-100), defaults to settings.VISION_IMAGE_QUALITY
+
+    Returns:
+        PreparedImage with the encoded data, MIME type and dimensions
+    """
+    max_edge = max_edge or settings.VISION_IMAGE_MAX_EDGE
+    image_format = (image_format or settings.VISION_IMAGE_FORMAT).upper()
+    quality = quality or settings.VISION_IMAGE_QUALITY
+    if image_format not in ("JPEG", "WEBP"):
+        raise ValueError(f"Unsupported vision image format: {image_format}")
+
+    key = (hashlib.sha256(image_bytes).hexdigest(), max_edge, image_format, quality)
+    prepared = _prepared_images.get(key)
+    if prepared is None:
+        prepared = _prepare_image(image_bytes, max_edge, image_format, quality)
+        _prepared_images.put(key, prepared)
+    return prepared
+
+
+def generate_image_variants(
+    image_bytes: bytes,
+    sizes: Optional[Dict[str, int]] = None,
+    quality: int = 82
+) -> Dict[str, Dict[str, bytes]]:
+    """
+    Resize an image into the display variants in WebP and JPEG
+
+    The image is decoded and oriented once; each variant is downscaled from
+    the next larger one, so the full-size decode is only resampled once.
+    Images are never upscaled.
+
+    Args:
+        image_bytes: Encoded image data
+        sizes: Variant name -> longest edge, defaults to IMAGE_VARIANT_SIZES
+        quality: Encoder quality (1-100)
+
+    Returns:
+        Variant name -> format extension ('webp', 'jpeg') -> encoded data
+    """
+    sizes = sizes or IMAGE_VARIANT_SIZES
+    image = ImageOps.exif_transpose(Image.open(io.BytesIO(image_bytes)))
+
+    variants = {}
+    for name, max_edge in sorted(sizes.items(), key=lambda item: -item[1]):
+        if max(image.size) > max_edge:
+            image = image.copy()
+            image.thumbnail((max_edge, max_edge), Image.LANCZOS)
+        variants[name] = {
+            extension: encode_image(image, image_format, quality)
+            for image_format, extension in IMAGE_VARIANT_FORMATS.items()
+        }
+    return variants
+
+
+def compute_dhash(fileobj: BinaryIO, hash_size: int = 8) -> Optional[str]:
+    """
+    Perceptual difference hash (dHash) of an image
+
+    The image is oriented, reduced to a (hash_size + 1) x hash_size grayscale
+    grid and each bit records whether a pixel is brighter than its left
+    neighbour. Re-encoded, resized or lightly edited copies of a photo get the
+    same or a nearby hash. JPEGs are decoded at reduced scale, so hashing a
+    large photo stays cheap.
+
+    Args:
+        fileobj: Seekable file with encoded image data, rewound afterwards
+        hash_size: Grid size, the hash has hash_size ** 2 bits
+
+    Returns:
+        Hash as a hex string, or None if the data is not a decodable image
+    """
+    try:
+        fileobj.seek(0)
+        image = Image.open(fileobj)
+        image.draft("L", (hash_size * 8, hash_size * 8))
+        image = ImageOps.exif_transpose(image).convert("L").resize((hash_size + 1, hash_size), Image.LANCZOS)
+    except Exception:
+        return None
+    finally:
+        fileobj.seek(0)
+
+    pixels = np.asarray(image, dtype=np.int16)
+    bits = np.packbits(pixels[:, 1:] > pixels[:, :-1])
+    return bits.tobytes().hex()
+
+
+def hamming_distance(hash1: str, hash2: str) -> int:
+    """Number of differing bits between two hex hashes"""
+    return bin(int(hash1, 16) ^ int(hash2, 16)).count("1")
+
+
+# Hex digits per band of a 64-bit dHash. By the pigeonhole principle two hashes
+# within Hamming distance len(HASH_BAND_WIDTHS) - 1 = 4 have one identical band
+HASH_BAND_WIDTHS = (4, 3, 3, 3, 3)
+
+
+def hash_bands(image_hash: Optional[str]) -> List[Optional[str]]:
+    """Split a hex dHash into the disjoint bands of HASH_BAND_WIDTHS (all None without a hash)"""
+    if not image_hash:
+        return [None] * len(HASH_BAND_WIDTHS)
+    bands, start = [], 0
+    for width in HASH_BAND_WIDTHS:
+        bands.append(image_hash[start:start + width])
+        start += width
+    return bands
@@ -1,7 +1,8 @@
 import pytest
 import os
 import sys
-from sqlalchemy import create_engine
+from contextlib import contextmanager
+from sqlalchemy import create_engine, event
 from sqlalchemy.orm import sessionmaker
 from sqlalchemy.pool import StaticPool
 
@@ -12,6 +13,7 @@ from app.database import Base, get_db
 from app.main import app
 from app.models import User, Property, TenantProfile, LandlordProfile
 from app.auth import get_password_hash
+from app.services.derived_index import DerivedIndex
 
 # Setup in-memory SQLite database for testing
 SQLALCHEMY_DATABASE_URL = "sqlite:///:memory:"
@@ -30,6 +32,11 @@ def test_db():
     # Create the database
     Base.metadata.create_all(bind=engine)
     
+    # In-process indexes must not serve rows of a previous test's database
+    DerivedIndex.invalidate_all()
+    for index in list(DerivedIndex._instances):
+        index.session_factory = TestingSessionLocal
+    
     # Create a session
     db = TestingSessionLocal()
     
@@ -53,4 +60,36 @@ def override_get_db(test_db):
     
     app.dependency_overrides[get_db] = _override_get_db
     yield
-    app.dependency_overrides.clear()
\ No newline at end of file
+    app.dependency_overrides.clear()
+
+
+class QueryCounter:
+    """Records the SQL statements executed on the test engine"""
+    
+    def __init__(self):
+        self.statements = []
+    
+    @property
+    def count(self):
+        return len(self.statements)
+    
+    def __call__(self, conn, cursor, statement, parameters, context, executemany):
+        self.statements.append(statement)
+
+
+# Count SQL statements, to assert an upper bound on the queries of an endpoint:
+#     with count_queries() as counter:
+#         client.get("/api/v1/properties/")
+#     assert counter.count <= 2, counter.statements
+@pytest.fixture
+def count_queries():
+    @contextmanager
+    def _count_queries():
+        counter = QueryCounter()
+        event.listen(engine, "before_cursor_execute", counter)
+        try:
+            yield counter
+        finally:
+            event.remove(engine, "before_cursor_execute", counter)
+    
+    return _count_queries
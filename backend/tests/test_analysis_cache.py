@@ -0,0 +1,87 @@
+import asyncio
+import io
+from types import SimpleNamespace
+
+import httpx
+from fastapi import UploadFile
+from starlette.datastructures import Headers
+
+from app.models import Property, User
+from app.routes import architectural_style
+from app.services import architectural_classifier
+from app.services.analysis_cache import AnalysisCache, prompt_version
+
+
+def test_analysis_cache_tiers_and_ttl(tmp_path):
+    calls = []
+
+    async def compute():
+        calls.append(1)
+        return {"status": "success", "features": [{"name": "balcony", "confidence": 0.9}]}
+
+    async def failing_compute():
+        return {"status": "error", "message": "rate limit"}
+
+    cache = AnalysisCache(cache_dir=str(tmp_path), max_memory_entries=2, ttl_seconds=60)
+    version = prompt_version("describe this property")
+    image = b"fake image bytes"
+
+    first = asyncio.run(cache.get_or_compute(image, "property_listing", version, compute))
+    second = asyncio.run(cache.get_or_compute(image, "property_listing", version, compute))
+    assert first == second
+    assert len(calls) == 1
+
+    # Different analysis type or prompt version is a different entry
+    asyncio.run(cache.get_or_compute(image, "tenant_preference", version, compute))
+    asyncio.run(cache.get_or_compute(image, "property_listing", prompt_version("new prompt"), compute))
+    assert len(calls) == 3
+
+    # Errors are never cached
+    asyncio.run(cache.get_or_compute(b"other", "property_listing", version, failing_compute))
+    assert cache.stats()["stores"] == 3
+
+    # A fresh cache (e.g. after a restart) is served from the disk tier
+    restarted = AnalysisCache(cache_dir=str(tmp_path), max_memory_entries=2, ttl_seconds=60)
+    asyncio.run(restarted.get_or_compute(image, "property_listing", version, compute))
+    assert len(calls) == 3
+    assert restarted.stats()["disk_hits"] == 1
+    asyncio.run(restarted.get_or_compute(image, "property_listing", version, compute))
+    assert restarted.stats()["memory_hits"] == 1
+
+    # Expired entries are recomputed
+    expired = AnalysisCache(cache_dir=str(tmp_path), max_memory_entries=2, ttl_seconds=1e-9)
+    asyncio.run(expired.get_or_compute(image, "property_listing", version, compute))
+    assert len(calls) == 4
+    assert expired.stats()["misses"] == 1
+
+
+def test_classify_responses_do_not_leak_into_the_cache(test_db, tmp_path, monkeypatch):
+    image = b"same building photo"
+    calls = []
+
+    async def fake_classification(image_bytes, prompt):
+        calls.append(1)
+        return {"status": "success", "classification": {"primary_architectural_style": "Tudor", "confidence_score": 0.8}}
+
+    async def fake_download(self, url, **kwargs):
+        return SimpleNamespace(content=image)
+
+    monkeypatch.setattr(architectural_classifier, "analysis_cache", AnalysisCache(cache_dir=str(tmp_path)))
+    monkeypatch.setattr(architectural_style.style_classifier, "_request_classification", fake_classification)
+    monkeypatch.setattr(httpx.AsyncClient, "get", fake_download)
+
+    user = User(email="style@example.com", username="style", password_hash="x", user_type="landlord")
+    prop = Property(title="Tudor house", price=1000.0, image_url="https://example.com/tudor.jpg")
+    test_db.add_all([user, prop])
+    test_db.commit()
+
+    # Classifying a property adds property_updated to its response only
+    for _ in range(2):
+        result = asyncio.run(architectural_style.classify_property_style(prop.id, user, test_db))
+        assert result["property_updated"] is True
+
+    upload = UploadFile(file=io.BytesIO(image), headers=Headers({"content-type": "image/jpeg"}))
+    result = asyncio.run(architectural_style.classify_architectural_style(upload, user, test_db))
+    assert "property_updated" not in result
+    assert result["classification"]["primary_architectural_style"] == "Tudor"
+    assert len(calls) == 1
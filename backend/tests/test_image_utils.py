@@ -0,0 +1,69 @@
+import io
+
+import numpy as np
+from PIL import Image
+
+from app.utils.image_utils import compute_dhash, hamming_distance, hash_bands, prepare_image_for_vision
+
+
+def _encode(image, image_format, **kwargs):
+    buffer = io.BytesIO()
+    image.save(buffer, format=image_format, **kwargs)
+    return buffer.getvalue()
+
+
+def test_prepare_image_for_vision():
+    # Large photo stored sideways with an EXIF rotation, as phones do
+    photo = Image.new("RGB", (4000, 3000), (120, 80, 40))
+    exif = photo.getexif()
+    exif[0x0112] = 6
+    photo_bytes = _encode(photo, "JPEG", exif=exif)
+
+    prepared = prepare_image_for_vision(photo_bytes, max_edge=1024, image_format="JPEG")
+    assert prepared.mime_type == "image/jpeg"
+    assert (prepared.width, prepared.height) == (768, 1024)
+    assert len(prepared.data) < len(photo_bytes)
+    assert Image.open(io.BytesIO(prepared.data)).size == (768, 1024)
+    assert prepared.data_url.startswith("data:image/jpeg;base64,")
+
+    webp = prepare_image_for_vision(photo_bytes, max_edge=512, image_format="WEBP")
+    assert webp.mime_type == "image/webp"
+    assert Image.open(io.BytesIO(webp.data)).format == "WEBP"
+
+    # Small PNGs keep their encoding and MIME type when that is smaller
+    icon_bytes = _encode(Image.new("RGBA", (16, 16), (0, 0, 0, 0)), "PNG")
+    icon = prepare_image_for_vision(icon_bytes, max_edge=1024, image_format="JPEG")
+    assert icon.mime_type == "image/png"
+    assert icon.data == icon_bytes
+
+    # Undecodable data is passed through
+    raw = prepare_image_for_vision(b"not an image")
+    assert raw.data == b"not an image"
+    assert raw.mime_type == "image/jpeg"
+
+
+def test_compute_dhash_matches_resized_copies():
+    photo = Image.linear_gradient("L").convert("RGB").resize((1600, 1200))
+    original = io.BytesIO(_encode(photo, "JPEG", quality=95))
+    resized = io.BytesIO(_encode(photo.resize((400, 300)), "PNG"))
+    rotated = io.BytesIO(_encode(photo.rotate(90, expand=True), "JPEG"))
+
+    original_hash = compute_dhash(original)
+    assert len(original_hash) == 16
+    assert original.tell() == 0
+    assert hamming_distance(original_hash, compute_dhash(resized)) <= 4
+    assert hamming_distance(original_hash, compute_dhash(rotated)) > 16
+    assert compute_dhash(io.BytesIO(b"not an image")) is None
+
+
+def test_hashes_within_four_bits_share_a_band():
+    rng = np.random.default_rng(0)
+    for _ in range(500):
+        value = int(rng.integers(0, 2 ** 63)) * 2 + int(rng.integers(0, 2))
+        flipped = value
+        for bit in rng.choice(64, size=int(rng.integers(0, 5)), replace=False):
+            flipped ^= 1 << int(bit)
+        original, near = f"{value:016x}", f"{flipped:016x}"
+        assert hamming_distance(original, near) <= 4
+        assert any(a == b for a, b in zip(hash_bands(original), hash_bands(near)))
+    assert hash_bands(None) == [None] * 5
@@ -0,0 +1,69 @@
+import pytest
+from app.auth import get_password_hash
+from app.models import User, Property, Interaction
+from app.services.map_service import MapService
+
+
+@pytest.fixture
+def test_user(test_db):
+    user = User(
+        email="mapuser@example.com",
+        username="mapuser",
+        password_hash=get_password_hash("Test1234"),
+        user_type="tenant"
+    )
+    test_db.add(user)
+    test_db.commit()
+    test_db.refresh(user)
+    return user
+
+
+@pytest.fixture
+def test_map_properties(test_db):
+    """Create properties around the CMU anchor"""
+    properties = [
+        Property(title="Next to campus", price=1000.0, latitude=40.4433, longitude=-79.9436, distance_to_core=0.0),
+        Property(title="Shadyside", price=1400.0, latitude=40.4520, longitude=-79.9340, distance_to_core=0.8),
+        Property(title="Squirrel Hill", price=2400.0, latitude=40.4380, longitude=-79.9230, distance_to_core=1.1),
+        Property(title="Far away", price=900.0, latitude=41.0000, longitude=-79.9000, distance_to_core=38.5)
+    ]
+    for prop in properties:
+        test_db.add(prop)
+    test_db.commit()
+    return properties
+
+
+def test_map_marks_interacted_properties(test_db, test_user, test_map_properties):
+    """Test that has_interacted is filled for the whole page"""
+    test_db.add(Interaction(user_id=test_user.id, property_id=test_map_properties[1].id, action="like"))
+    test_db.commit()
+    
+    result = MapService(test_db).get_properties_for_map(test_user, latitude=40.4433, longitude=-79.9436)
+    
+    assert [p["title"] for p in result] == ["Next to campus", "Shadyside", "Squirrel Hill"]
+    assert {p["title"]: p["has_interacted"] for p in result} == {
+        "Next to campus": False,
+        "Shadyside": True,
+        "Squirrel Hill": False
+    }
+
+
+def test_map_radius_search_applies_price_filter(test_db, test_user, test_map_properties):
+    """Test that max_price is combined with the radius search before the limit"""
+    result = MapService(test_db).get_properties_for_map(
+        test_user, latitude=40.4433, longitude=-79.9436, max_price=1500.0, limit=2
+    )
+    
+    assert [p["title"] for p in result] == ["Next to campus", "Shadyside"]
+    assert all(p["price"] <= 1500.0 for p in result)
+
+
+def test_personalized_map_marks_clicked_properties(test_db, test_user, test_map_properties):
+    """Test that clicks, which do not drive the price range, still mark has_interacted"""
+    test_db.add(Interaction(user_id=test_user.id, property_id=test_map_properties[0].id, action="like"))
+    test_db.add(Interaction(user_id=test_user.id, property_id=test_map_properties[3].id, action="click"))
+    test_db.commit()
+    
+    result = MapService(test_db).get_personalized_map_recommendations(test_user)
+    
+    assert [(p["title"], p["has_interacted"]) for p in result] == [("Far away", True)]
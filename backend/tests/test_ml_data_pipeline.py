@@ -0,0 +1,232 @@
+from datetime import datetime, timedelta
+
+import numpy as np
+
+from app.models import Property, User, UserPreference
+from app.routes import ml_pipeline
+from app.services import ml_data_pipeline
+from app.services.feature_store import PropertyFeatureStore
+from app.services.label_vectorizer import LabelVectorizer
+from app.services.ml_data_pipeline import MLDataPipelineService
+
+
+def test_property_features_extraction_is_incremental(test_db, tmp_path):
+    test_db.add_all([
+        Property(
+            title=f"Listing {i}", price=1000.0 + i, bedrooms=i % 3,
+            labels=[{"name": "architectural_style", "value": "modern", "type": "primary_attribute"}] if i % 2 else None
+        )
+        for i in range(5)
+    ])
+    test_db.commit()
+
+    store = PropertyFeatureStore(str(tmp_path / "feature_store"), chunk_size=2)
+    pipeline = MLDataPipelineService(test_db, chunk_size=2, data_path=str(tmp_path), feature_store=store)
+    first = pipeline.extract_property_features_dataset()
+    assert first.rows_written == 5
+    assert first.partitions_written == 3
+    assert "feature_architectural_style" in first.columns
+
+    # Nothing new, nothing written
+    assert pipeline.extract_property_features_dataset().rows_written == 0
+
+    # Only new and changed rows are appended, readers see the latest version
+    changed = test_db.query(Property).filter(Property.title == "Listing 0").first()
+    changed.price = 500.0
+    test_db.add(Property(title="Listing 5", price=2000.0))
+    test_db.commit()
+    second = pipeline.extract_property_features_dataset()
+    assert second.rows_written == 2
+
+    df = pipeline.dataset("property_features").read()
+    assert len(df) == 6
+    assert df.set_index("id").loc[changed.id, "price"] == 500.0
+
+    vectors = pipeline.generate_architectural_feature_vectors()
+    assert vectors.rows_written == 6
+    assert store.matrix().shape == (6, 20)
+    assert store.matrix()[:, 3].sum() == 2
+
+    # A full refresh starts the dataset over
+    refreshed = pipeline.extract_property_features_dataset(full_refresh=True)
+    assert refreshed.rows_written == 6
+    assert len(pipeline.dataset("property_features").partitions) == 3
+
+
+def test_property_features_extraction_accepts_mixed_label_values(test_db, tmp_path):
+    values = ["craftsman", 3, {"primary": "brick", "secondary": "wood"}, None]
+    test_db.add_all([
+        Property(title=f"Listing {i}", price=1000.0, labels=[
+            {"name": "material", "value": value, "type": "primary_attribute"}
+        ])
+        for i, value in enumerate(values)
+    ])
+    test_db.commit()
+
+    pipeline = MLDataPipelineService(test_db, chunk_size=10, data_path=str(tmp_path))
+    assert pipeline.extract_property_features_dataset().rows_written == 4
+    df = pipeline.dataset("property_features").read().sort_values("id")
+    assert df["feature_material"].tolist() == [
+        "craftsman", "3", '{"primary": "brick", "secondary": "wood"}', None
+    ]
+
+
+def test_extraction_picks_up_rows_committed_below_the_mark(test_db, tmp_path):
+    now = datetime.utcnow()
+    test_db.add_all([Property(title=f"Listing {i}", price=1000.0, updated_at=now) for i in range(3)])
+    test_db.commit()
+
+    store = PropertyFeatureStore(str(tmp_path / "feature_store"), chunk_size=2)
+    pipeline = MLDataPipelineService(test_db, chunk_size=2, data_path=str(tmp_path), feature_store=store)
+    assert pipeline.extract_property_features_dataset().rows_written == 3
+    assert store.sync(test_db) == 3
+
+    # A transaction that stamped its row before the last run but committed after it
+    late = Property(title="Late", price=900.0, updated_at=now - timedelta(seconds=30))
+    test_db.add(late)
+    test_db.commit()
+    update = pipeline.extract_property_features_dataset()
+    assert update.rows_written == 1
+    assert update.sample[0]["id"] == late.id
+    assert store.sync(test_db) == 1
+    assert store.get(late.id) is not None
+
+    # Rows older than the overlap window are assumed to be seen already
+    test_db.add(Property(title="Too late", price=900.0, updated_at=now - timedelta(hours=1)))
+    test_db.commit()
+    assert pipeline.extract_property_features_dataset().rows_written == 0
+    assert len(pipeline.dataset("property_features").read()) == 4
+
+
+def test_user_preferences_extraction_appends_new_rows(test_db, tmp_path):
+    user = User(email="prefs@example.com", username="prefs", password_hash="x", user_type="tenant")
+    test_db.add(user)
+    test_db.commit()
+    for i in range(3):
+        test_db.add(UserPreference(
+            user_id=user.id, preference_key=f"key{i}", preference_value="yes",
+            preference_category="lifestyle", source="chat"
+        ))
+    test_db.commit()
+
+    pipeline = MLDataPipelineService(test_db, chunk_size=2, data_path=str(tmp_path))
+    assert pipeline.extract_user_preferences_dataset().rows_written == 3
+    test_db.add(UserPreference(
+        user_id=user.id, preference_key="key3", preference_value="no",
+        preference_category="property", source="chat"
+    ))
+    test_db.commit()
+    update = pipeline.extract_user_preferences_dataset()
+    assert update.rows_written == 1
+    assert update.sample[0]["preference_key"] == "key3"
+
+    report = pipeline.audit_training_data()
+    assert report["user_preferences"]["record_count"] == 4
+    assert report["user_preferences"]["category_distribution"] == {"lifestyle": 3, "property": 1}
+
+
+def test_feature_store_updates_rows_in_place(test_db, tmp_path):
+    properties = [
+        Property(title=f"Listing {i}", price=1000.0, property_type="apartment", bedrooms=i)
+        for i in range(3)
+    ]
+    test_db.add_all(properties)
+    test_db.commit()
+
+    path = str(tmp_path / "feature_store")
+    store = PropertyFeatureStore(path, chunk_size=2)
+    assert store.sync(test_db) == 3
+    assert store.sync(test_db) == 0
+    assert store.get(properties[2].id)[:3].tolist() == [1.0, 2.0, 0.0]
+
+    # Label edits are re-encoded in place and deleted properties dropped
+    properties[1].labels = [{"name": "architectural_style", "value": "Colonial revival"}]
+    test_db.delete(properties[0])
+    test_db.commit()
+    assert store.ensure_fresh(test_db) == 1
+    assert len(store) == 2
+    assert store.get(properties[0].id) is None
+    assert store.get(properties[1].id)[5] == 1.0
+
+    # Other readers map the same file without copying it
+    reader = PropertyFeatureStore(path, readonly=True)
+    assert isinstance(reader.matrix(), np.memmap)
+    assert sorted(reader.ids().tolist()) == sorted(p.id for p in properties[1:])
+    np.testing.assert_array_equal(reader.get(properties[1].id), store.get(properties[1].id))
+
+    # Growing past the initial capacity keeps the index intact
+    store.upsert(list(range(10000, 12000)), np.ones((2000, 20), dtype=np.float32))
+    assert len(store) == 2002
+    assert store.get(properties[2].id)[1] == 2.0
+    assert store.get(11999).sum() == 20.0
+
+
+def test_feature_vectors_route_reports_the_store_shape(test_db, tmp_path, monkeypatch):
+    store = PropertyFeatureStore(str(tmp_path / "feature_store"))
+    monkeypatch.setattr(ml_data_pipeline, "property_feature_store", store)
+    monkeypatch.chdir(tmp_path)
+    admin = User(email="admin@example.com", username="admin", password_hash="x", user_type="admin")
+    test_db.add_all([admin] + [Property(title=f"Listing {i}", price=1000.0) for i in range(3)])
+    test_db.commit()
+
+    first = ml_pipeline.generate_feature_vectors(full_refresh=False, current_user=admin, db=test_db)
+    assert (first["rows_written"], first["shape"]) == (3, (3, 20))
+    # An incremental run without changes writes nothing but keeps the full shape
+    second = ml_pipeline.generate_feature_vectors(full_refresh=False, current_user=admin, db=test_db)
+    assert (second["rows_written"], second["shape"]) == (0, (3, 20))
+
+
+def test_label_vectorizer_encodes_styles_features_and_materials(test_db, tmp_path):
+    labels_per_property = [
+        [
+            {"name": "architectural_style", "value": "Craftsman", "confidence": 0.9, "type": "primary_attribute"},
+            {"name": "exposed beams", "confidence": 0.8, "type": "additional_feature"},
+            {"name": "rooftop deck", "confidence": 0.7, "type": "additional_feature"}
+        ],
+        [
+            {"name": "architectural_style", "value": "craftsman", "confidence": 0.6, "type": "primary_attribute"},
+            {"name": "condition", "value": "Excellent", "confidence": 0.9, "type": "primary_attribute"}
+        ],
+        None
+    ]
+    properties = [Property(title=f"Listing {i}", price=1000.0, labels=labels) for i, labels in enumerate(labels_per_property)]
+    test_db.add_all(properties)
+    test_db.commit()
+
+    pipeline = MLDataPipelineService(test_db, chunk_size=2, data_path=str(tmp_path))
+    property_ids, matrix = pipeline.generate_label_feature_matrix(weighting="binary")
+    vectorizer = LabelVectorizer.load(str(tmp_path / "label_vocabulary.json"))
+
+    # All nine classifier styles are in the vocabulary before any data is seen
+    assert {t for t in vectorizer.terms if t.startswith("style:")} >= {
+        "style:modern", "style:craftsman", "style:mid_century_modern", "style:tudor", "style:victorian"
+    }
+    assert "feature:rooftop_deck" in vectorizer.vocabulary
+    assert property_ids.tolist() == [p.id for p in properties]
+    assert matrix.shape == (3, len(vectorizer.vocabulary))
+    assert matrix.getnnz(axis=1).tolist() == [3, 2, 0]
+    craftsman = vectorizer.vocabulary["style:craftsman"]
+    assert matrix[:, craftsman].toarray().ravel().tolist() == [1.0, 1.0, 0.0]
+    assert matrix[1, vectorizer.vocabulary["condition:excellent"]] == 1.0
+
+    # New rows are encoded with the persisted vocabulary, TF-IDF rows are unit length
+    tfidf = LabelVectorizer.load(str(tmp_path / "label_vocabulary.json"))
+    tfidf.weighting = "tfidf"
+    encoded = tfidf.transform([[{"name": "exposed_beams"}, {"name": "architectural_style", "value": "craftsman"}]])
+    assert encoded.shape[1] == len(vectorizer.vocabulary)
+    assert encoded.nnz == 2
+    np.testing.assert_allclose(np.sqrt(encoded.multiply(encoded).sum()), 1.0, rtol=1e-5)
+    # The shared style weighs less than the rarer feature
+    assert encoded[0, craftsman] < encoded[0, vectorizer.vocabulary["feature:exposed_beams"]]
+
+    # Later runs keep the columns of known terms and append new ones
+    properties[2].labels = [{"name": "home gym", "confidence": 0.9, "type": "additional_feature"}]
+    test_db.delete(properties[0])
+    test_db.commit()
+    property_ids, matrix = pipeline.generate_label_feature_matrix(weighting="binary")
+    rerun = LabelVectorizer.load(str(tmp_path / "label_vocabulary.json"))
+    assert rerun.terms[:len(vectorizer.terms)] == vectorizer.terms
+    assert rerun.terms[len(vectorizer.terms):] == ["feature:home_gym"]
+    assert rerun.n_documents == 2
+    assert rerun.document_frequency[rerun.vocabulary["feature:rooftop_deck"]] == 0
+    assert matrix[:, craftsman].toarray().ravel().tolist() == [1.0, 0.0]
@@ -2,7 +2,7 @@ import pytest
 from fastapi.testclient import TestClient
 from app.main import app
 from app.auth import get_password_hash
-from app.models import User, TenantProfile, LandlordProfile
+from app.models import User, TenantProfile, LandlordProfile, Property, PropertyImage
 
 @pytest.fixture
 def client(override_get_db):
@@ -227,4 +227,34 @@ def test_wrong_user_type_for_profile(client, test_db):
         }
     )
     # Should fail with a 403 Forbidden
-    assert response.status_code == 403
\ No newline at end of file
+    assert response.status_code == 403
+
+
+def test_get_landlord_profile_query_count(client, test_landlord, test_db, count_queries):
+    """Test that the landlord profile loads its properties and images eagerly"""
+    profile = LandlordProfile(user_id=test_landlord.id, company_name="Real Estate Inc")
+    test_db.add(profile)
+    test_db.flush()
+    for i in range(4):
+        prop = Property(title=f"Listing {i}", price=900.0 + i, landlord_id=profile.id)
+        test_db.add(prop)
+        test_db.flush()
+        test_db.add_all([
+            PropertyImage(property_id=prop.id, image_url=f"https://example.com/{i}/{j}.jpg", is_primary=j == 0)
+            for j in range(2)
+        ])
+    test_db.commit()
+    test_db.expire_all()
+    
+    token = get_auth_token(client, "landlord@example.com")
+    with count_queries() as counter:
+        response = client.get(
+            "/api/v1/profile/landlord",
+            headers={"Authorization": f"Bearer {token}"}
+        )
+    assert response.status_code == 200
+    properties = response.json()["listed_properties"]
+    assert len(properties) == 4
+    assert all(len(p["images"]) == 2 for p in properties)
+    # current user, profile, properties, images
+    assert counter.count <= 4, counter.statements
@@ -1,8 +1,12 @@
+import io
+
 import pytest
+from PIL import Image
 from fastapi.testclient import TestClient
 from app.main import app
 from app.auth import get_password_hash
-from app.models import User, Property, LandlordProfile
+from app.models import User, Property, LandlordProfile, PropertyImage, PropertyLabel
+from app.services.property_text_search import property_text_index
 
 @pytest.fixture
 def client(override_get_db):
@@ -190,4 +194,537 @@ def test_delete_property_unauthorized(client, test_property, test_db):
         headers={"Authorization": f"Bearer {token}"}
     )
     # This should fail with a 403 Forbidden
-    assert response.status_code == 403
\ No newline at end of file
+    assert response.status_code == 403
+
+def test_create_property_sets_distance_to_core(client, test_landlord):
+    """Test that properties with coordinates get their distance to the core anchor"""
+    token = get_auth_token(client)
+    response = client.post(
+        "/api/v1/properties/",
+        headers={"Authorization": f"Bearer {token}"},
+        json={
+            "title": "Located Property",
+            "price": 1100.0,
+            "latitude": 40.45,
+            "longitude": -79.95
+        }
+    )
+    assert response.status_code == 200
+    data = response.json()
+    assert data["distance_to_core"] == pytest.approx(0.572, abs=1e-3)
+
+
+def defer_image_jobs(monkeypatch):
+    """
+    Hold back background image jobs until run_queued() is called through the
+    client portal, then run them on a single worker; the in-memory test
+    database has a single connection, so jobs must not run concurrently with
+    a request or with each other
+    """
+    from app.services.analysis_jobs import ImageAnalysisWorkerPool, analysis_workers
+    
+    queued = []
+    monkeypatch.setattr(analysis_workers, "enqueue", lambda job_id, image_data=None: queued.append(job_id))
+    monkeypatch.setattr(analysis_workers, "workers", 1)
+    
+    async def run_queued():
+        # restart the pool with a single worker
+        await analysis_workers.stop()
+        for job_id in queued:
+            ImageAnalysisWorkerPool.enqueue(analysis_workers, job_id)
+        queued.clear()
+        await analysis_workers.join()
+    
+    return run_queued
+
+
+def test_image_analysis_jobs_claim_once_and_recover_expired_leases(test_property, test_db):
+    """Test that a job is claimed by one worker only and recovery leaves live leases alone"""
+    from datetime import datetime, timedelta
+    from app.models import ImageAnalysisJob
+    from app.services.analysis_jobs import ImageAnalysisWorkerPool
+    from tests.conftest import TestingSessionLocal
+    
+    now = datetime.utcnow()
+    jobs = {}
+    for name, status, lease in [
+        ("pending", "pending", None),
+        ("live", "running", now + timedelta(minutes=5)),
+        ("expired", "running", now - timedelta(minutes=5)),
+    ]:
+        image = PropertyImage(property_id=test_property.id, image_url=f"https://example.com/{name}.jpg")
+        test_db.add(image)
+        test_db.flush()
+        job = ImageAnalysisJob(property_image_id=image.id, status=status, attempts=1 if lease else 0, lease_expires_at=lease)
+        test_db.add(job)
+        test_db.flush()
+        jobs[name] = job.id
+    test_db.commit()
+    
+    pool = ImageAnalysisWorkerPool(session_factory=TestingSessionLocal, workers=1, lease_seconds=60)
+    # Another process restarting must not take over the job of a live worker
+    assert pool._recover_jobs() == [jobs["pending"], jobs["expired"]]
+    test_db.expire_all()
+    assert test_db.get(ImageAnalysisJob, jobs["live"]).status == "running"
+    
+    # Only the first of two concurrent claims wins
+    assert pool._claim_job(jobs["expired"]) == (2, "https://example.com/expired.jpg")
+    assert pool._claim_job(jobs["expired"]) is None
+    assert pool._renew_lease(jobs["expired"], 2)
+    
+    # A worker whose claim was superseded cannot overwrite the result
+    success = {"status": "success", "features": [{"name": "porch", "confidence": 0.9}]}
+    pool._finish_job(jobs["expired"], 1, success)
+    test_db.expire_all()
+    job = test_db.get(ImageAnalysisJob, jobs["expired"])
+    assert (job.status, job.property_image.labels) == ("running", None)
+    pool._finish_job(jobs["expired"], 2, success)
+    test_db.expire_all()
+    job = test_db.get(ImageAnalysisJob, jobs["expired"])
+    assert (job.status, job.lease_expires_at, job.property_image.labels) == ("done", None, success["features"])
+    assert not pool._renew_lease(jobs["expired"], 2)
+
+
+def test_upload_property_images_batch(client, test_property, test_landlord, test_db, monkeypatch, tmp_path):
+    """Test that a batch upload stores every image, picks one primary image and analyzes in the background"""
+    from app.services.analysis_jobs import analysis_workers
+    from app.services.storage_service import LocalStorageBackend, storage_service
+    from tests.conftest import TestingSessionLocal
+    
+    async def fake_analyze(image_data):
+        if not image_data.startswith(b"image"):
+            return {"status": "error", "message": "Could not parse JSON from response"}
+        return {"status": "success", "features": [{"name": image_data.decode(), "confidence": 0.9}]}
+    
+    monkeypatch.setattr(analysis_workers, "session_factory", TestingSessionLocal)
+    run_queued = defer_image_jobs(monkeypatch)
+    monkeypatch.setattr(analysis_workers.image_service, "analyze_property_listing_image", fake_analyze)
+    monkeypatch.setattr(storage_service, "backend", LocalStorageBackend(str(tmp_path)))
+    
+    token = get_auth_token(client)
+    files = [("files", (f"photo{i}.jpg", f"image {i}".encode(), "image/jpeg")) for i in range(5)]
+    response = client.post(
+        f"/api/v1/properties/{test_property.id}/images",
+        headers={"Authorization": f"Bearer {token}"},
+        files=files
+    )
+    assert response.status_code == 200
+    images = response.json()["images"]
+    assert all(image["image_url"].startswith("/media/properties/") for image in images)
+    assert [(tmp_path / image["image_url"][len("/media/"):]).read_bytes() for image in images] == [
+        f"image {i}".encode() for i in range(5)
+    ]
+    assert [image["is_primary"] for image in images] == [True, False, False, False, False]
+    assert all(image["analysis_status"] == "pending" for image in images)
+    
+    # A second batch requesting a new primary image demotes the old one
+    cover = io.BytesIO()
+    Image.new("RGB", (1200, 900), (200, 180, 150)).save(cover, format="JPEG")
+    cover_bytes = cover.getvalue()
+    response = client.post(
+        f"/api/v1/properties/{test_property.id}/images",
+        headers={"Authorization": f"Bearer {token}"},
+        files=[("files", ("cover.jpg", cover_bytes, "image/jpeg"))],
+        data={"is_primary": "true"}
+    )
+    assert response.status_code == 200
+    
+    stored = client.get(f"/api/v1/properties/{test_property.id}/images").json()
+    assert len(stored) == 6
+    primary_urls = [image["image_url"] for image in stored if image["is_primary"]]
+    assert primary_urls == [response.json()["images"][0]["image_url"]]
+    test_db.refresh(test_property)
+    assert test_property.image_url == primary_urls[0]
+    
+    # Labels are filled in as the background jobs complete
+    client.portal.call(run_queued)
+    statuses = client.get(f"/api/v1/properties/{test_property.id}/images/analysis").json()
+    assert [entry["status"] for entry in statuses] == ["done"] * 5 + ["failed"]
+    assert statuses[3]["labels"][0]["name"] == "image 3"
+    assert statuses[5]["error"] == "Could not parse JSON from response"
+    
+    # Resized variants are stored next to the original
+    prop = client.get(f"/api/v1/properties/{test_property.id}").json()
+    variants = prop["image_variants"]
+    assert set(variants) == {"thumbnail", "card", "full"}
+    assert set(variants["card"]) == {"webp", "jpeg"}
+    thumbnail = Image.open(tmp_path / variants["thumbnail"]["webp"][len("/media/"):])
+    assert thumbnail.format == "WEBP" and thumbnail.size == (320, 240)
+    full = Image.open(tmp_path / variants["full"]["jpeg"][len("/media/"):])
+    assert full.size == (1200, 900)
+    stored = client.get(f"/api/v1/properties/{test_property.id}/images").json()
+    assert stored[5]["variants"] == variants
+    assert stored[0]["variants"] is None
+
+
+def test_upload_duplicate_images_reuses_storage_and_labels(client, test_property, test_landlord, test_db, monkeypatch, tmp_path):
+    """Test that re-uploaded photos reuse the stored object and analysis of the original"""
+    from app.services.analysis_jobs import analysis_workers
+    from app.services.storage_service import LocalStorageBackend, storage_service
+    from tests.conftest import TestingSessionLocal
+    
+    analyzed = []
+    
+    async def fake_analyze(image_data):
+        analyzed.append(image_data)
+        return {"status": "success", "features": [{"name": "hardwood floors", "confidence": 0.8}]}
+    
+    monkeypatch.setattr(analysis_workers, "session_factory", TestingSessionLocal)
+    run_queued = defer_image_jobs(monkeypatch)
+    monkeypatch.setattr(analysis_workers.image_service, "analyze_property_listing_image", fake_analyze)
+    monkeypatch.setattr(storage_service, "backend", LocalStorageBackend(str(tmp_path)))
+    
+    def encode(image, quality):
+        buffer = io.BytesIO()
+        image.save(buffer, format="JPEG", quality=quality)
+        return buffer.getvalue()
+    
+    photo = Image.linear_gradient("L").convert("RGB").resize((640, 480))
+    other = Image.linear_gradient("L").rotate(90).convert("RGB").resize((640, 480))
+    
+    # The same photo twice in one batch is stored once
+    token = get_auth_token(client)
+    response = client.post(
+        f"/api/v1/properties/{test_property.id}/images",
+        headers={"Authorization": f"Bearer {token}"},
+        files=[
+            ("files", ("a.jpg", encode(photo, 90), "image/jpeg")),
+            ("files", ("b.jpg", encode(other, 90), "image/jpeg")),
+            ("files", ("c.jpg", encode(photo, 90), "image/jpeg")),
+        ]
+    )
+    assert response.status_code == 200
+    first = response.json()["images"]
+    assert first[0]["image_url"] == first[2]["image_url"] != first[1]["image_url"]
+    # ... and analyzed once, the copy follows its source's job
+    assert first[2]["analysis_job_id"] == first[0]["analysis_job_id"] is not None
+    assert first[2]["analysis_status"] == "pending"
+    client.portal.call(run_queued)
+    assert len(analyzed) == 2
+    stored = {image["id"]: image for image in client.get(f"/api/v1/properties/{test_property.id}/images").json()}
+    assert stored[first[2]["id"]]["labels"] == stored[first[0]["id"]]["labels"] == [
+        {"name": "hardwood floors", "confidence": 0.8}
+    ]
+    assert stored[first[2]["id"]]["variants"] == stored[first[0]["id"]]["variants"] is not None
+    statuses = client.get(f"/api/v1/properties/{test_property.id}/images/analysis").json()
+    assert {status["image_id"]: status["status"] for status in statuses}[first[2]["id"]] == "done"
+    
+    # A re-encoded copy uploaded to another property reuses the object and labels
+    second_property = Property(title="Second Property", price=1200.0, landlord_id=test_property.landlord_id)
+    test_db.add(second_property)
+    test_db.commit()
+    analyzed.clear()
+    
+    response = client.post(
+        f"/api/v1/properties/{second_property.id}/images",
+        headers={"Authorization": f"Bearer {token}"},
+        files=[("files", ("copy.jpg", encode(photo, 60), "image/jpeg"))]
+    )
+    assert response.status_code == 200
+    copy = response.json()["images"][0]
+    assert copy["image_url"] == first[0]["image_url"]
+    assert copy["duplicate_of"] == first[0]["id"]
+    assert copy["analysis_status"] == "done"
+    assert copy["analysis_job_id"] is None
+    
+    client.portal.call(run_queued)
+    assert analyzed == []
+    stored = client.get(f"/api/v1/properties/{second_property.id}/images").json()
+    assert stored[0]["labels"] == [{"name": "hardwood floors", "confidence": 0.8}]
+    assert stored[0]["variants"] is not None
+    assert len([path for path in tmp_path.rglob("*") if path.suffix == ".jpg"]) == 2
+
+
+def test_find_duplicate_images_looks_up_near_matches_by_hash_band(test_property, test_db):
+    """Test that near duplicates are found through the hash bands and far hashes are ignored"""
+    from app.routes.properties import _find_duplicate_images, _hash_band_values
+    
+    upload = "0123456789abcdef"
+    # 4 bits off, one in each of the last four bands
+    near = f"{int(upload, 16) ^ 0x0000_1001_0010_0100:016x}"
+    # 5 bits off, one in every band
+    far = f"{int(upload, 16) ^ 0x1000_1001_0010_0100:016x}"
+    images = {}
+    for name, image_hash in (("near", near), ("far", far)):
+        images[name] = PropertyImage(
+            property_id=test_property.id, image_url=f"https://example.com/{name}.jpg",
+            perceptual_hash=image_hash, **_hash_band_values(image_hash)
+        )
+    test_db.add_all(images.values())
+    test_db.commit()
+    
+    matches = _find_duplicate_images(test_db, test_property.landlord_id, [upload, "ffffffffffffffff", None])
+    assert {h: image.id for h, image in matches.items()} == {upload: images["near"].id}
+    # Other landlords' photos are never reused
+    assert _find_duplicate_images(test_db, test_property.landlord_id + 1, [upload]) == {}
+
+
+def test_property_reads_query_count(client, test_property, test_db, count_queries):
+    """Test that property reads load images eagerly instead of once per property"""
+    from app.models import PropertyImage
+    
+    for i in range(5):
+        prop = Property(title=f"Listing {i}", price=1000.0 + i, landlord_id=test_property.landlord_id)
+        test_db.add(prop)
+        test_db.flush()
+        test_db.add_all([
+            PropertyImage(property_id=prop.id, image_url=f"https://example.com/{i}/{j}.jpg", is_primary=j == 0)
+            for j in range(3)
+        ])
+    test_db.commit()
+    property_id = prop.id
+    test_db.expire_all()
+    
+    with count_queries() as counter:
+        response = client.get("/api/v1/properties/")
+    assert response.status_code == 200
+    assert sum(len(p["images"]) for p in response.json()) == 15
+    assert counter.count <= 2, counter.statements
+    
+    test_db.expire_all()
+    with count_queries() as counter:
+        response = client.get(f"/api/v1/properties/{property_id}")
+    assert response.status_code == 200
+    assert len(response.json()["images"]) == 3
+    assert counter.count <= 2, counter.statements
+
+
+def test_search_properties_filters_and_keyset_pages(client, test_property, test_db):
+    """Test that search applies filters and pages through all matches by cursor"""
+    landlord_id = test_property.landlord_id
+    test_db.add_all([
+        Property(
+            title=f"Listing {i}",
+            price=800.0 + 100 * (i % 5),
+            bedrooms=1 + i % 3,
+            city="Pittsburgh" if i % 4 else "Philadelphia",
+            latitude=40.40 + i * 0.01,
+            longitude=-79.95,
+            is_active=i != 7,
+            landlord_id=landlord_id
+        )
+        for i in range(12)
+    ])
+    test_db.commit()
+    
+    expected = sorted(
+        (p.price, p.id) for p in test_db.query(Property).all()
+        if p.is_active and p.city == "Pittsburgh" and p.bedrooms and p.bedrooms >= 2 and p.price <= 1100
+    )
+    
+    seen = []
+    cursor = None
+    while True:
+        params = {"city": "Pittsburgh", "min_bedrooms": 2, "max_price": 1100, "limit": 2}
+        if cursor:
+            params["cursor"] = cursor
+        response = client.get("/api/v1/properties/search", params=params)
+        assert response.status_code == 200
+        data = response.json()
+        assert len(data["items"]) <= 2
+        seen.extend((item["price"], item["id"]) for item in data["items"])
+        cursor = data["next_cursor"]
+        if cursor is None:
+            break
+    assert seen == expected
+    
+    # Descending order and bounding box
+    response = client.get(
+        "/api/v1/properties/search",
+        params={"sort": "-price", "bbox": "-80.0,40.40,-79.9,40.445", "limit": 50}
+    )
+    items = response.json()["items"]
+    assert {item["title"] for item in items} == {f"Listing {i}" for i in range(5) if i != 7}
+    assert [item["price"] for item in items] == sorted((item["price"] for item in items), reverse=True)
+    
+    # Cursors are bound to their sort order
+    response = client.get("/api/v1/properties/search", params={"limit": 1})
+    cursor = response.json()["next_cursor"]
+    response = client.get("/api/v1/properties/search", params={"sort": "-price", "cursor": cursor})
+    assert response.status_code == 400
+    assert client.get("/api/v1/properties/search", params={"bbox": "1,2,3"}).status_code == 400
+
+
+def test_search_properties_full_text_ranked_with_filters(client, test_property, test_db):
+    """Test that text search ranks title matches first and combines with filters"""
+    landlord_id = test_property.landlord_id
+    listings = [
+        ("Sunny brick townhouse", None, "Squirrel Hill", 1200.0, None),
+        ("Quiet studio", "Renovated brick townhouse unit near the park", None, 900.0, None),
+        ("Loft apartment", None, "Brick Street", 1000.0, [{"name": "townhouses", "value": "row", "confidence": 0.9}]),
+        ("Brick townhouse", "Cheap", None, 700.0, None),
+        ("Garden flat", "Wooden floors", None, 800.0, None),
+    ]
+    for title, description, address, price, labels in listings:
+        test_db.add(Property(
+            title=title, description=description, address=address, price=price,
+            labels=labels, landlord_id=landlord_id
+        ))
+    test_db.commit()
+    
+    response = client.get("/api/v1/properties/search", params={"q": "Brick Townhouses"})
+    assert response.status_code == 200
+    titles = [item["title"] for item in response.json()["items"]]
+    assert set(titles) == {"Sunny brick townhouse", "Quiet studio", "Loft apartment", "Brick townhouse"}
+    # Title matches rank above address/feature matches, which rank above description matches
+    assert set(titles[:2]) == {"Sunny brick townhouse", "Brick townhouse"}
+    assert titles[2:] == ["Loft apartment", "Quiet studio"]
+    
+    # Relevance pages follow the same order
+    pages = []
+    cursor = None
+    while True:
+        params = {"q": "brick townhouse", "limit": 1}
+        if cursor:
+            params["cursor"] = cursor
+        data = client.get("/api/v1/properties/search", params=params).json()
+        pages.extend(item["title"] for item in data["items"])
+        cursor = data["next_cursor"]
+        if cursor is None:
+            break
+    assert pages == titles
+    
+    # Combined with structured filters and another sort order
+    response = client.get(
+        "/api/v1/properties/search",
+        params={"q": "brick townhouse", "max_price": 1000, "sort": "price"}
+    )
+    assert [item["title"] for item in response.json()["items"]] == ["Brick townhouse", "Quiet studio", "Loft apartment"]
+    
+    # Edits are picked up by a background refresh, searches serve the last snapshot meanwhile
+    garden = test_db.query(Property).filter(Property.title == "Garden flat").first()
+    garden_id = garden.id
+    garden.description = "Brick townhouse with garden"
+    test_db.commit()
+    with property_text_index._lock:
+        assert property_text_index.search(test_db, "garden townhouse") == {}
+    property_text_index.wait()
+    assert list(property_text_index.search(test_db, "garden townhouse")) == [garden_id]
+    response = client.get("/api/v1/properties/search", params={"q": "garden townhouse"})
+    assert [item["title"] for item in response.json()["items"]] == ["Garden flat"]
+    
+    assert client.get("/api/v1/properties/search", params={"q": "nonexistentword"}).json()["items"] == []
+    assert client.get("/api/v1/properties/search", params={"sort": "relevance"}).status_code == 400
+
+
+def test_property_labels_are_normalized_and_searchable(client, test_property, test_db):
+    """Test that labels are mirrored into property_labels and filter searches"""
+    landlord_id = test_property.landlord_id
+    craftsman = Property(
+        title="Craftsman", price=1000.0, landlord_id=landlord_id,
+        labels=[
+            {"name": "architectural_style", "value": "craftsman", "confidence": 0.9, "type": "primary_attribute"},
+            {"name": "hardwood_floors", "confidence": 0.95, "type": "additional_feature"}
+        ]
+    )
+    unsure = Property(
+        title="Unsure", price=900.0, landlord_id=landlord_id,
+        labels=[{"name": "hardwood_floors", "confidence": 0.5, "type": "additional_feature"}]
+    )
+    test_db.add_all([craftsman, unsure])
+    test_db.flush()
+    image = PropertyImage(
+        property_id=unsure.id, image_url="https://example.com/a.jpg",
+        labels=[{"name": "fireplace", "confidence": 0.8, "type": "additional_feature"}]
+    )
+    test_db.add(image)
+    test_db.commit()
+    
+    rows = test_db.query(PropertyLabel).order_by(PropertyLabel.id).all()
+    assert [(r.property_id, r.name, r.value, r.confidence, r.source_image_id) for r in rows] == [
+        (craftsman.id, "architectural_style", "craftsman", 0.9, None),
+        (craftsman.id, "hardwood_floors", None, 0.95, None),
+        (unsure.id, "hardwood_floors", None, 0.5, None),
+        (unsure.id, "fireplace", None, 0.8, image.id),
+    ]
+    
+    def search(**params):
+        response = client.get("/api/v1/properties/search", params=params)
+        assert response.status_code == 200
+        return [item["title"] for item in response.json()["items"]]
+    
+    assert search(feature="hardwood_floors") == ["Unsure", "Craftsman"]
+    assert search(feature="hardwood_floors", min_confidence=0.8) == ["Craftsman"]
+    assert search(feature="architectural_style", feature_value="craftsman") == ["Craftsman"]
+    assert search(feature="fireplace") == ["Unsure"]
+    
+    # Edits of the JSON replace the rows, deleted images take theirs along
+    unsure.labels = [{"name": "hardwood_floors", "confidence": 0.85, "type": "additional_feature"}]
+    test_db.delete(image)
+    test_db.commit()
+    assert search(feature="hardwood_floors", min_confidence=0.8) == ["Unsure", "Craftsman"]
+    assert search(feature="fireplace") == []
+    assert test_db.query(PropertyLabel).count() == 3
+
+
+def test_similar_properties_nearest_neighbours(client, test_property, test_db):
+    """Test that similar listings rank by attributes and labels and follow edits"""
+    from app.services.similar_properties import SimilarPropertyIndex, similar_property_index
+    similar_property_index.invalidate()
+    landlord_id = test_property.landlord_id
+    craftsman = [{"name": "architectural_style", "value": "craftsman", "confidence": 0.9, "type": "primary_attribute"},
+                 {"name": "hardwood_floors", "confidence": 0.9, "type": "additional_feature"}]
+    modern = [{"name": "architectural_style", "value": "modern", "confidence": 0.9, "type": "primary_attribute"},
+              {"name": "floor_to_ceiling_windows", "confidence": 0.9, "type": "additional_feature"}]
+    listings = [
+        ("Craftsman A", 1400.0, 2, 1.5, 1000.0, craftsman, True),
+        ("Craftsman B", 1450.0, 2, 1.5, 1050.0, craftsman, True),
+        ("Craftsman inactive", 1400.0, 2, 1.5, 1000.0, craftsman, False),
+        ("Modern", 3000.0, 4, 3.0, 2500.0, modern, True),
+    ]
+    ids = {}
+    for title, price, bedrooms, bathrooms, area, labels, is_active in listings:
+        prop = Property(
+            title=title, price=price, bedrooms=bedrooms, bathrooms=bathrooms, area=area,
+            labels=labels, is_active=is_active, landlord_id=landlord_id
+        )
+        test_db.add(prop)
+        test_db.flush()
+        ids[title] = prop.id
+    test_db.commit()
+    
+    response = client.get(f"/api/v1/properties/{ids['Craftsman A']}/similar", params={"limit": 2})
+    assert response.status_code == 200
+    items = response.json()
+    # The inactive twin and the reference itself are never returned
+    assert [item["title"] for item in items] == ["Craftsman B", "Test Property"]
+    assert items[0]["similarity"] > items[1]["similarity"]
+    assert 0.9 < items[0]["similarity"] <= 1.0
+    
+    # Edits are re-embedded incrementally in the background, queries serve the last snapshot meanwhile
+    modern_listing = test_db.get(Property, ids["Modern"])
+    modern_listing.price, modern_listing.bedrooms, modern_listing.bathrooms, modern_listing.area = 1400.0, 2, 1.5, 1000.0
+    modern_listing.labels = craftsman
+    test_db.commit()
+    with similar_property_index._lock:
+        stale = similar_property_index.similar(test_db, ids["Craftsman A"], limit=2)
+        assert [pid for pid, _ in stale] == [ids["Craftsman B"], test_property.id]
+    similar_property_index.wait()
+    items = client.get(f"/api/v1/properties/{ids['Craftsman A']}/similar", params={"limit": 2}).json()
+    assert [item["title"] for item in items] == ["Modern", "Craftsman B"]
+    
+    # The ball tree returns the same neighbours as the brute-force search
+    tree = SimilarPropertyIndex(algorithm="ball_tree")
+    brute = similar_property_index.similar(test_db, ids["Craftsman B"], limit=3)
+    assert [pid for pid, _ in tree.similar(test_db, ids["Craftsman B"], limit=3)] == [pid for pid, _ in brute]
+    
+    assert client.get("/api/v1/properties/999999/similar").status_code == 404
+
+
+def test_similar_properties_of_a_listing_created_after_the_last_refresh(client, test_property, test_db):
+    """Test that a new listing is embedded on demand instead of answering 404"""
+    from sqlalchemy import insert
+    from app.services.similar_properties import similar_property_index
+    assert client.get(f"/api/v1/properties/{test_property.id}/similar").json() == []
+    
+    # Created by another worker, so nothing marks it dirty here
+    new_id = test_db.execute(insert(Property).values(
+        title="Brand new", price=1000.0, is_active=True, landlord_id=test_property.landlord_id
+    )).inserted_primary_key[0]
+    test_db.commit()
+    assert new_id not in similar_property_index.row_of
+    
+    response = client.get(f"/api/v1/properties/{new_id}/similar")
+    assert response.status_code == 200
+    assert [item["title"] for item in response.json()] == ["Test Property"]
+    assert client.get(f"/api/v1/properties/{test_property.id}/similar").json()[0]["title"] == "Brand new"
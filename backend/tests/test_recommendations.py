@@ -1,8 +1,17 @@
+import numpy as np
 import pytest
 from fastapi.testclient import TestClient
 from app.main import app
 from app.auth import get_password_hash
-from app.models import User, Property, UserPreference, TenantProfile, LandlordProfile
+from app.config import settings
+from app.models import User, Property, UserPreference, TenantProfile, LandlordProfile, Interaction
+from app.recommendations import RecommendationEngine
+from app.services.collaborative_filtering import (
+    CollaborativeFilteringModel,
+    build_interaction_matrix,
+    train_collaborative_filtering_model,
+)
+from app.services.roommate_matching import RoommateCompatibilityIndex
 
 @pytest.fixture
 def client(override_get_db):
@@ -290,4 +299,139 @@ def test_get_roommate_recommendations_as_landlord(client, test_db):
     )
     
     # This should fail with a 403 Forbidden
-    assert response.status_code == 403
\ No newline at end of file
+    assert response.status_code == 403
+
+def test_vectorized_property_scores_match_scalar(test_db, test_tenant, test_properties):
+    """Test that the batched scoring path returns the same scores as the per-property scorer"""
+    engine = RecommendationEngine(test_db)
+    tenant_profile = test_db.query(TenantProfile).filter(TenantProfile.user_id == test_tenant.id).first()
+    pref_map = {
+        p.preference_key: p.preference_value
+        for p in test_db.query(UserPreference).filter(UserPreference.user_id == test_tenant.id).all()
+    }
+    
+    candidates = engine._load_property_candidates()
+    scores = engine._score_property_candidates(candidates, tenant_profile, pref_map)
+    
+    for prop_id, score in zip(candidates["id"].tolist(), scores.tolist()):
+        prop = test_db.query(Property).filter(Property.id == prop_id).first()
+        assert score == engine._calculate_property_score(prop, tenant_profile, pref_map)
+    
+    # Top-k selection returns the best properties in descending score order
+    recommendations = engine.get_property_recommendations_for_user(test_tenant.id, limit=2)
+    assert len(recommendations) == 2
+    assert recommendations[0][1] >= recommendations[1][1]
+    assert recommendations[0][0].title == "Matching Apartment 1"
+
+
+def test_roommate_index_matches_pairwise_scores(test_db, test_tenant, test_roommates):
+    """Test that the cached compatibility matrix matches the pairwise scorer and follows updates"""
+    roommate1, roommate2 = test_roommates
+    for user, value in [(test_tenant, "quiet"), (roommate1, "quiet"), (roommate2, "lively")]:
+        test_db.add(UserPreference(
+            user_id=user.id,
+            preference_key="noise_level",
+            preference_value=value,
+            preference_category="lifestyle",
+            source="test"
+        ))
+    test_db.commit()
+    
+    engine = RecommendationEngine(test_db)
+    index = RoommateCompatibilityIndex()
+    
+    def assert_matches_pairwise():
+        candidate_ids, scores = index.get_compatibility_row(test_db, test_tenant.id)
+        assert sorted(candidate_ids.tolist()) == sorted([roommate1.id, roommate2.id])
+        for candidate_id, score in zip(candidate_ids.tolist(), scores.tolist()):
+            assert score == pytest.approx(engine._calculate_roommate_compatibility(test_tenant.id, candidate_id))
+    
+    assert_matches_pairwise()
+    
+    # Changing a profile only recomputes that tenant's row and column
+    profile = test_db.query(TenantProfile).filter(TenantProfile.user_id == roommate2.id).first()
+    profile.preferred_location = "pittsburgh"
+    test_db.commit()
+    index.mark_dirty([roommate2.id])
+    assert_matches_pairwise()
+    
+    # A bulk delete that bypasses the ORM is picked up by the fingerprint check
+    test_db.query(UserPreference).filter(UserPreference.user_id == roommate1.id).delete()
+    test_db.commit()
+    assert_matches_pairwise()
+
+
+@pytest.fixture
+def co_interactions(test_db, test_tenant, test_properties):
+    """Tenants who looked at the second apartment went on to save the house"""
+    _, apartment2, house, _ = test_properties
+    for i in range(3):
+        other = User(
+            email=f"other{i}@example.com", username=f"other{i}",
+            password_hash=get_password_hash("Test1234"), user_type="tenant"
+        )
+        test_db.add(other)
+        test_db.flush()
+        test_db.add_all([
+            Interaction(user_id=other.id, property_id=apartment2.id, action="view"),
+            Interaction(user_id=other.id, property_id=house.id, action="save"),
+            Interaction(user_id=other.id, property_id=house.id, action="click"),
+        ])
+    test_db.add(Interaction(user_id=test_tenant.id, property_id=apartment2.id, action="view"))
+    test_db.commit()
+
+
+@pytest.fixture
+def collaborative_model(test_db, co_interactions, tmp_path):
+    # One factor so the tenant has to share the other tenants' taste on this tiny catalog
+    return train_collaborative_filtering_model(
+        test_db, path=str(tmp_path / "collaborative_model.npz"), factors=1, iterations=10
+    )
+
+
+def test_interaction_matrix_weights_actions(test_db, test_properties, co_interactions):
+    """Test that interactions are summed per user and property with their action weights"""
+    _, apartment2, house, _ = test_properties
+    user_ids, property_ids, matrix = build_interaction_matrix(test_db)
+    assert matrix.shape == (4, 2) and matrix.nnz == 7
+    assert property_ids.tolist() == sorted([apartment2.id, house.id])
+    # save (5) + click (1) of the same user and property are summed
+    assert matrix[1, property_ids.tolist().index(house.id)] == 6.0
+
+
+def test_collaborative_model_save_load_round_trip(test_tenant, test_properties, collaborative_model, tmp_path):
+    """Test that a saved model predicts like the trained one and lifts co-interacted properties"""
+    apartment1, apartment2, house, _ = test_properties
+    loaded = CollaborativeFilteringModel.load(str(tmp_path / "collaborative_model.npz"))
+    assert loaded.params["interactions"] == 7
+    
+    candidates = np.array([apartment1.id, apartment2.id, house.id])
+    predicted = loaded.score_properties(test_tenant.id, candidates)
+    assert np.allclose(predicted, collaborative_model.score_properties(test_tenant.id, candidates))
+    # No interactions with the first apartment, a strong prediction for the house
+    assert predicted[0] == 0.0
+    assert predicted[2] > 0.5
+    assert loaded.score_properties(999999, candidates) is None
+
+
+def test_recommendations_blend_collaborative_scores(test_db, test_tenant, test_properties, collaborative_model, tmp_path, monkeypatch):
+    """Test that a trained model shifts content scores and that no model leaves them unchanged"""
+    apartment1, _, house, _ = test_properties
+    # Without a trained model the engine keeps the pure content scores
+    monkeypatch.setattr(settings, "COLLABORATIVE_MODEL_PATH", str(tmp_path / "missing.npz"))
+    engine = RecommendationEngine(test_db)
+    content = {prop.id: score for prop, score in engine.get_property_recommendations_for_user(test_tenant.id)}
+    tenant_profile = test_db.query(TenantProfile).filter(TenantProfile.user_id == test_tenant.id).first()
+    pref_map = {
+        p.preference_key: p.preference_value
+        for p in test_db.query(UserPreference).filter(UserPreference.user_id == test_tenant.id).all()
+    }
+    for prop in test_db.query(Property).filter(Property.id.in_(list(content))):
+        assert content[prop.id] == pytest.approx(engine._calculate_property_score(prop, tenant_profile, pref_map))
+    
+    blended = {
+        prop.id: score for prop, score in
+        RecommendationEngine(test_db, collaborative_model=collaborative_model).get_property_recommendations_for_user(test_tenant.id)
+    }
+    assert blended[house.id] > content[house.id]
+    assert blended[apartment1.id] < content[apartment1.id]
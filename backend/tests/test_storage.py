@@ -0,0 +1,37 @@
+import io
+
+import pytest
+
+from app.services.storage_service import LocalStorageBackend, S3StorageBackend
+
+
+def test_local_storage_backend(tmp_path):
+    backend = LocalStorageBackend(str(tmp_path), base_url="/media/", chunk_size=4)
+    data = b"0123456789" * 10
+
+    url = backend.save(io.BytesIO(data), "properties/1/2/photo.jpg", "image/jpeg")
+    assert url == "/media/properties/1/2/photo.jpg"
+    assert backend.key_from_url(url) == "properties/1/2/photo.jpg"
+    assert backend.key_from_url("https://elsewhere.example.com/photo.jpg") is None
+    assert backend.read("properties/1/2/photo.jpg") == data
+    assert list(tmp_path.rglob("*.tmp")) == []
+
+    backend.delete("properties/1/2/photo.jpg")
+    backend.delete("properties/1/2/photo.jpg")
+    assert not (tmp_path / "properties/1/2/photo.jpg").exists()
+
+    with pytest.raises(ValueError):
+        backend.save(io.BytesIO(data), "../outside.jpg", "image/jpeg")
+
+
+def test_s3_storage_backend_urls():
+    aws = S3StorageBackend("images", "us-east-2")
+    assert aws.url_for("properties/a.jpg") == "https://images.s3.us-east-2.amazonaws.com/properties/a.jpg"
+
+    minio = S3StorageBackend("images", "us-east-1", endpoint_url="http://minio:9000")
+    url = minio.url_for("properties/a.jpg")
+    assert url == "http://minio:9000/images/properties/a.jpg"
+    assert minio.key_from_url(url) == "properties/a.jpg"
+
+    cdn = S3StorageBackend("images", "us-east-1", public_base_url="https://cdn.example.com/")
+    assert cdn.url_for("properties/a.jpg") == "https://cdn.example.com/properties/a.jpg"